@@ -1,38 +1,51 @@
-from fastapi import FastAPI, UploadFile, File
-import shutil, os, time
+from fastapi import FastAPI, UploadFile, File, Form
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import asyncio, contextvars, json, shutil, os, tempfile, time, uuid, zipfile
 import fitz  # PyMuPDF
 import numpy as np
-from PIL import Image
 
-from api.ocr_engine import extract_single_page
-from api.parsers import detect_doc_type
-from api.ner_parser import extract_with_ner
+from api import imaging, memguard, metrics, orientation, page_store, templates, word
+from api.imaging import IMAGE_EXTS, OCR_WIDTH, load_image, to_ocr_array
+from api.metrics import stage
+from api.ocr_engine import REOCR_SCALE, apply_doc_type_threshold, extract_single_page
+from api.parsers import detect_doc_type, table_row_item
+from api.native import SCANNED_THRESHOLD, NativePage
+from api.ner_parser import EXTRACTION_STRATEGY, FIELD_SPECS, STRATEGIES, extract_with_ner
+from api.word import read_docx
 
 app = FastAPI(title="OCR Extraction API", version="6.0.0", docs_url="/docs")
 
 UPLOAD_DIR = "temp"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
-SCANNED_THRESHOLD = 50
 
-SUPPORTED = (".pdf", ".png", ".jpg", ".jpeg", ".docx", ".doc")
+# Extraction is CPU-bound — run it off the event loop on a bounded pool so
+# /health and /metrics stay responsive and waiting requests show up as queue depth
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "1"))
+_executor   = ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix="extract")
+metrics.WORKERS.set(OCR_WORKERS)
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "500"))
+
+SUPPORTED = (".pdf",) + IMAGE_EXTS + word.WORD_EXTS
 
 
 # ── PyMuPDF table → items ─────────────────────────────────────────────────────
-def pymupdf_table_to_items(page) -> list:
+def pymupdf_table_to_items(page, native: NativePage = None, table_before: bool = False) -> list:
+    """native: the page's NativePage — find_tables is skipped when it shows no sign of a
+    table, unless table_before (an earlier page of the document had line items)."""
     items = []
     try:
-        finder = page.find_tables()
+        with stage("table_find"):
+            if native is not None and not table_before and not native.may_have_table():
+                return items
+            finder = page.find_tables()
         for tbl in finder.tables:
             df = tbl.to_pandas()
             if df.empty or len(df) < 2:
                 continue
             for _, row in df.iterrows():
-                item = {str(k).strip(): str(v).strip()
-                        for k, v in row.items()
-                        if str(v) not in ("nan", "None", "")}
-                vals_lower = str(list(item.values())).lower()
-                if any(h in vals_lower for h in ["description","item","hsn","qty","amount","rate"]):
-                    continue
+                item = table_row_item(row.index, row.values)
                 if item:
                     items.append(item)
     except Exception:
@@ -40,152 +53,666 @@ def pymupdf_table_to_items(page) -> list:
     return items
 
 
-# ── DOCX text extractor ───────────────────────────────────────────────────────
-def extract_docx_text(file_path: str) -> str:
+# ── Page selection ────────────────────────────────────────────────────────────
+def parse_pages(spec: str) -> list:
+    """"1-3,10" → [(1, 3), (10, 10)]; an open end ("5-") runs to the last page."""
+    ranges = []
+    for part in spec.replace(" ", "").split(","):
+        if not part:
+            continue
+        first, dash, last = part.partition("-")
+        if not first.isdigit() or (last and not last.isdigit()) or int(first) < 1:
+            raise ValueError(f"Bad page range: {part!r} (expected e.g. 1-3,10)")
+        start = int(first)
+        end   = int(last) if last else (None if dash else start)
+        if end is not None and end < start:
+            raise ValueError(f"Bad page range: {part!r} (end before start)")
+        ranges.append((start, end))
+    if not ranges:
+        raise ValueError("Empty page range")
+    return ranges
+
+
+def select_pages(page_count: int, pages: str = None, max_pages: int = None) -> list:
+    """0-based page indices to extract, ascending, without ever touching the others."""
+    if pages:
+        wanted = set()
+        for start, end in parse_pages(pages):
+            wanted.update(range(start - 1, min(end or page_count, page_count)))
+        indices = sorted(wanted)
+    else:
+        indices = range(page_count)
+    return list(indices[:max_pages] if max_pages else indices)
+
+
+def header_complete(doc_type: str, fields: dict) -> bool:
+    """Every single-valued field of doc_type found — the stop_when condition."""
+    return all(fields.get(f.name) for f in FIELD_SPECS.get(doc_type, ()) if not f.many)
+
+
+def collect_pages(results, low_memory: bool = False, stop_when: str = None):
+    """Drain a (page output, confidence) generator → (pages, last page's confidence).
+
+    stop_when=<doc_type> ends the walk at the first such page with its header complete.
+    low_memory spills page results to a memguard.PageSpill and releases MuPDF's
+    store after every page, so memory stays flat however long the document is.
+    """
+    pages_output = memguard.PageSpill() if low_memory else []
+    confidence   = 1.0
     try:
-        from docx import Document
-        doc = Document(file_path)
-        lines = []
-        for para in doc.paragraphs:
-            if para.text.strip():
-                lines.append(para.text.strip())
-        # Extract tables too
-        for table in doc.tables:
-            for row in table.rows:
-                row_text = " | ".join(cell.text.strip() for cell in row.cells if cell.text.strip())
-                if row_text:
-                    lines.append(row_text)
-        return "\n".join(lines)
-    except Exception as e:
-        return f"Error reading docx: {e}"
+        for page_output, confidence in results:
+            pages_output.append(page_output)
+            doc_type = page_output["doc_type"]
+            if stop_when and doc_type == stop_when and header_complete(doc_type, page_output["fields"]):
+                break
+            if low_memory:
+                # Nothing from this page may outlive it — the spill holds the result
+                scanned     = "confidence_stats" in page_output
+                page_output = None
+                memguard.release(collect=scanned)
+    except BaseException:
+        if low_memory:
+            pages_output.close()
+        raise
+    finally:
+        results.close()
+    return pages_output, round(confidence, 3)
 
 
-# ── PDF text extractor ────────────────────────────────────────────────────────
-def extract_pdf_pages(file_path: str):
-    doc = fitz.open(file_path)
-    pages_output = []
+def page_fields(page_num: int, strategy: str, layout, text: str = None, res: dict = None,
+                native: NativePage = None, lookup=None, table_before: bool = False):
+    """One page (native text, or an extract_single_page result) → (page output, confidence).
+
+    table_before: an earlier page of the document had line items, so a native page's
+    tables are searched even without a heading row (continuation pages).
+    """
+    sources = {}
+    doc_type, fields, template_id = extract_fields(
+        text if res is None else res["formatted_text"], layout, strategy, sources, res, lookup)
     confidence = 1.0
+    if res is not None:
+        # The doc type's confidence threshold may have dropped lines
+        text, confidence = res["formatted_text"], res["confidence_score"]
 
-    for page_num, page in enumerate(doc, start=1):
-        native_text = page.get_text("text").strip()
-        is_scanned  = len(native_text) < SCANNED_THRESHOLD
+    if native is not None and doc_type in ("invoice", "purchase_order"):
+        pymupdf_items = pymupdf_table_to_items(native.page, native, table_before)
+        if pymupdf_items:
+            fields["items"] = pymupdf_items
 
-        if not is_scanned:
-            page_text  = native_text
-            confidence = 1.0
+    page_output = {
+        "page":          page_num,
+        "doc_type":      doc_type,
+        "fields":        fields,
+        "field_sources": sources,
+        "text":          text,
+    }
+    if res is not None:
+        page_output["confidence_stats"] = res["confidence_stats"]
+        page_output.update({k: res[k] for k in ("rotation", "reocr", "preprocess") if k in res})
+    if template_id:
+        page_output["template_id"] = template_id
+    return page_output, confidence
+
+
+# ── PDF text extractor ────────────────────────────────────────────────────────
+def extract_pdf_pages(file_path: str, strategy: str = None, pages: str = None,
+                      max_pages: int = None, stop_when: str = None, low_memory: bool = False):
+    """(pages, confidence, page count) — see collect_pages for stop_when / low_memory."""
+    with stage("open"):
+        doc = fitz.open(file_path)
+    try:
+        indices = select_pages(doc.page_count, pages, max_pages)
+        pages_output, confidence = collect_pages(_pdf_pages(doc, indices, strategy),
+                                                 low_memory, stop_when)
+        return pages_output, confidence, doc.page_count
+    finally:
+        doc.close()
+
+
+def read_pdf_page(page):
+    """(NativePage, native text, None) for a native page, (NativePage, text, OCR result) for a
+    scanned one — rendered upright, with the page behind re-read crops. Templates learn
+    from exactly what extraction later sees."""
+    with stage("native_text"):
+        native      = NativePage(page)
+        native_text = native.text().strip()
+    if len(native_text) >= SCANNED_THRESHOLD:
+        return native, native_text, None
+    with memguard.page_slot():
+        angle, _ = orientation.page_angle(page, native.textpage)
+        res = extract_single_page(render_page(page, angle), page_region(page, angle))
+    if angle:
+        res["rotation"] = angle
+    return native, native_text, res
+
+
+def _pdf_pages(doc, indices: list, strategy: str):
+    store = page_store.store if page_store.store.enabled else None
+    if store is not None:
+        # A page read after one with line items may search tables it would otherwise skip
+        scopes, memo = {after: page_store.scope(strategy, after) for after in (False, True)}, {}
+    table_before = False
+    for index in indices:
+        page = doc.load_page(index)
+        if store is not None:
+            # An unchanged page of a re-uploaded PDF comes back from the store
+            with stage("page_store"):
+                fingerprint = page_store.fingerprint(page, memo)
+                stored      = store.get(fingerprint, scopes[table_before])
+            if stored:
+                stored[0]["page"] = index + 1
+                table_before = table_before or bool(stored[0]["fields"].get("items"))
+                yield stored
+                continue
+        native, native_text, res = read_pdf_page(page)
+        if res is None:
+            result = page_fields(index + 1, strategy, lambda: templates.native_layout(page, native.words()),
+                                 text=native_text, native=native, lookup=native.label_snippets,
+                                 table_before=table_before)
         else:
-            mat = fitz.Matrix(150/72, 150/72)
-            pix = page.get_pixmap(matrix=mat)
-            import cv2
-            arr     = np.frombuffer(pix.tobytes("png"), dtype=np.uint8)
-            img     = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-            pil_img = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
-            res        = extract_single_page(pil_img)
-            page_text  = res["formatted_text"]
-            confidence = res["confidence_score"]
-
-        doc_type = detect_doc_type(page_text)
-        fields   = extract_with_ner(page_text, doc_type)
-
-        if doc_type in ("invoice", "purchase_order") and not is_scanned:
-            pymupdf_items = pymupdf_table_to_items(page)
-            if pymupdf_items:
-                fields["items"] = pymupdf_items
-
-        pages_output.append({
-            "page":     page_num,
-            "doc_type": doc_type,
-            "fields":   fields,
-            "text":     page_text,
-        })
-
-    doc.close()
-    return pages_output, round(confidence, 3)
+            result = page_fields(index + 1, strategy, lambda: templates.ocr_layout(res["line_items"]),
+                                 res=res)
+        if store is not None:
+            store.put(fingerprint, scopes[table_before], *result)
+        table_before = table_before or bool(result[0]["fields"].get("items"))
+        yield result
+        page = native = res = result = None
 
 
-# ── Universal /extract endpoint ───────────────────────────────────────────────
-@app.post("/extract")
-async def extract_any(file: UploadFile = File(...)):
-    fname = file.filename.lower()
-    ext   = os.path.splitext(fname)[1]
+def extract_image_pages(file_path: str, strategy: str = None, pages: str = None,
+                        max_pages: int = None, stop_when: str = None, low_memory: bool = False):
+    """Multi-frame TIFF / WebP / AVIF through the same page walk as a scanned PDF.
 
-    if ext not in SUPPORTED:
-        return {"error": f"Unsupported format: {ext}. Supported: {', '.join(SUPPORTED)}"}
+    Frames are decoded lazily, one step ahead on a helper thread, so the next
+    frame's decode + resize runs while this one is in OCR.
+    """
+    with stage("open"):
+        frame_count = imaging.frame_count(file_path)
+    frames = imaging.prefetch(imaging.iter_frames(file_path, select_pages(frame_count, pages, max_pages)))
+    pages_output, confidence = collect_pages(_frame_pages(frames, strategy), low_memory, stop_when)
+    return pages_output, confidence, frame_count
 
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
 
-    start = time.time()
+def _frame_pages(frames, strategy: str):
+    try:
+        for index, image in frames:
+            with memguard.page_slot():
+                res = extract_single_page(image)
+            image = None
+            yield page_fields(index + 1, strategy, lambda: templates.ocr_layout(res["line_items"]),
+                              res=res)
+            res = None
+    finally:
+        frames.close()      # stops the decode thread when the walk ends early
 
-    # ── PDF ──
-    if ext == ".pdf":
-        pages_output, confidence = extract_pdf_pages(file_path)
+
+def page_matrix(page, angle: int = 0):
+    """Render matrix: OCR_WIDTH wide once turned clockwise by angle."""
+    width = page.rect.height if angle in (90, 270) else page.rect.width
+    zoom  = OCR_WIDTH / width
+    return fitz.Matrix(zoom, zoom).prerotate(angle)
+
+
+def render_page(page, angle: int = 0) -> np.ndarray:
+    # Rendered straight at OCR width (and already upright) from the pixmap's RGB
+    # samples — no PNG round trip, BGR copy, second resize or array rotation
+    with stage("rasterize"):
+        pix  = page.get_pixmap(matrix=page_matrix(page, angle), alpha=False)
+        img  = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 3)
+        pix  = None
+    return to_ocr_array(img)
+
+
+def page_region(page, angle: int = 0):
+    """hires() for extract_single_page: re-render one region of the page at REOCR_SCALE.
+
+    reocr_band asks for a single region per page — every clip render decodes the
+    page's whole scan image again.
+    """
+    mat    = page_matrix(page, angle)
+    origin = (page.rect * mat).tl           # a turned page's pixmap does not start at (0, 0)
+    to_pdf = ~mat
+    hi_mat = mat * fitz.Matrix(REOCR_SCALE, REOCR_SCALE)
+
+    def hires(x0, y0, x1, y1):
+        clip = fitz.Rect(x0 + origin.x, y0 + origin.y, x1 + origin.x, y1 + origin.y) * to_pdf
+        pix  = page.get_pixmap(matrix=hi_mat, alpha=False, clip=clip)
+        return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 3)
+    return hires
+
+
+def extract_fields(text: str, layout, strategy: str, sources: dict, ocr: dict = None,
+                   lookup=None):
+    """(doc_type, fields, template id) — a learned vendor template skips classify + NER.
+
+    layout is a callable so the page is only fingerprinted when templates exist.
+    ocr (an extract_single_page result) is re-filtered in place at the classified
+    doc type's confidence threshold before NER sees its text. lookup is a native
+    page's label_snippets, for fields the text regexes miss.
+    """
+    if layout is not None and templates.store.active():
+        hit = templates.store.apply(layout())
+        if hit:
+            template, values = hit
+            return template.doc_type, templates.template_fields(template, values, text, sources), template.id
+    with stage("classify"):
+        doc_type = detect_doc_type(text)
+    if ocr is not None:
+        text = apply_doc_type_threshold(ocr, doc_type)["formatted_text"]
+    return doc_type, extract_with_ner(text, doc_type, strategy, sources, lookup), None
+
+
+# ── Worker pool ─────────────────────────────────────────────────────────────
+async def run_in_worker(fn, *args, **kwargs):
+    """Queue fn on the extraction pool; spans inside it land in the caller's timings."""
+    metrics.QUEUE_DEPTH.inc()
+
+    def job():
+        memguard.wait_for_memory()   # over RSS_CEILING_MB → stay queued behind pages in flight
+        metrics.QUEUE_DEPTH.dec()
+        metrics.IN_FLIGHT.inc()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            metrics.IN_FLIGHT.dec()
+
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_executor, ctx.run, job)
+
+
+# ── Per-file extraction (runs on the worker pool) ─────────────────────────────
+def extract_file(file_path: str, ext: str, file_name: str, strategy: str = None,
+                 pages: str = None, max_pages: int = None, stop_when: str = None,
+                 low_memory: bool = False) -> dict:
+    """pages / max_pages / stop_when narrow PDFs and multi-frame images — the rest are one page.
+
+    With low_memory a paged response's "pages" is a memguard.PageSpill; the caller
+    streams and closes it.
+    """
+    start    = time.time()
+    strategy = strategy or EXTRACTION_STRATEGY
+
+    # ── PDF / MULTI-FRAME IMAGE ──
+    multi_frame = ext in imaging.PAGED_EXTS and imaging.frame_count(file_path) > 1
+    if ext == ".pdf" or multi_frame:
+        walk = extract_image_pages if multi_frame else extract_pdf_pages
+        pages_output, confidence, page_count = walk(
+            file_path, strategy, pages, max_pages, stop_when, low_memory)
         elapsed = round(time.time() - start, 2)
         return {
-            "status":      "success",
-            "file_type":   "pdf",
-            "total_pages": len(pages_output),
-            "confidence":  confidence,
-            "pages":       pages_output,
+            "status":         "success",
+            "file_type":      "image" if multi_frame else "pdf",
+            "total_pages":    len(pages_output),
+            "document_pages": page_count,
+            "confidence":     confidence,
+            "pages":          pages_output,
             "meta": {
-                "file_name":           file.filename,
+                "file_name":           file_name,
                 "processing_time_sec": elapsed,
-                "extraction_method":   "spacy_ner + pymupdf",
+                "extraction_method":   "spacy_ner + " + ("paddleocr" if multi_frame else "pymupdf"),
+                "extraction_strategy": strategy,
             },
         }
 
     # ── IMAGE ──
-    elif ext in (".png", ".jpg", ".jpeg"):
-        image    = Image.open(file_path)
-        result   = extract_single_page(image)
+    elif ext in IMAGE_EXTS:
+        with stage("open"):
+            image = load_image(file_path)
+        with memguard.page_slot():
+            result = extract_single_page(image)
+        text     = result["formatted_text"]
+        layout   = lambda: templates.ocr_layout(result["line_items"])
+        sources  = {}
+        doc_type, fields, template_id = extract_fields(text, layout, strategy, sources, result)
         text     = result["formatted_text"]
-        doc_type = detect_doc_type(text)
-        fields   = extract_with_ner(text, doc_type)
         elapsed  = round(time.time() - start, 2)
-        return {
-            "status":     "success",
-            "file_type":  "image",
-            "doc_type":   doc_type,
-            "confidence": round(result["confidence_score"], 3),
-            "fields":     fields,
-            "raw_text":   text,
+        response = {
+            "status":           "success",
+            "file_type":        "image",
+            "doc_type":         doc_type,
+            "confidence":       round(result["confidence_score"], 3),
+            "confidence_stats": result["confidence_stats"],
+            "fields":           fields,
+            "field_sources":    sources,
+            "raw_text":         text,
             "meta": {
-                "file_name":           file.filename,
+                "file_name":           file_name,
                 "processing_time_sec": elapsed,
                 "extraction_method":   "spacy_ner + paddleocr",
+                "extraction_strategy": strategy,
             },
         }
+        response.update({k: result[k] for k in ("reocr", "preprocess") if k in result})
+        if template_id:
+            response["template_id"] = template_id
+        return response
 
     # ── WORD DOCUMENT ──
     elif ext in (".docx", ".doc"):
-        text     = extract_docx_text(file_path)
-        doc_type = detect_doc_type(text)
-        fields   = extract_with_ner(text, doc_type)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with stage("open"):
+                docx_path, text = word.open_word(file_path, tmpdir)
+            items, images, skipped, method = [], [], [], "antiword"
+            if docx_path:
+                # Embedded images are OCR'd on a helper thread while the XML is parsed
+                media = imaging.prefetch(_media_pages(docx_path, skipped), depth=word.MEDIA_MAX)
+                try:
+                    with stage("native_text"):
+                        text, items = read_docx(docx_path)
+                    images = list(media)
+                finally:
+                    media.close()
+                method = "docx_xml + paddleocr" if images else "docx_xml"
+        ocr_text = [res["formatted_text"] for _, res in images if res["formatted_text"]]
+        full     = "\n".join([text.strip()] + ocr_text).strip()
+        sources  = {}
+        doc_type, fields, _ = extract_fields(full, None, strategy, sources)
+        if doc_type in ("invoice", "purchase_order") and items:
+            fields["items"] = items
+        confidence = 1.0
+        if not text.strip():
+            # A scan pasted into Word — as good as its OCR
+            confidence = float(np.mean([res["confidence_score"] for _, res in images])) if images else 0.0
         elapsed  = round(time.time() - start, 2)
-        return {
-            "status":     "success",
-            "file_type":  "word",
-            "doc_type":   doc_type,
-            "confidence": 1.0,
-            "fields":     fields,
-            "raw_text":   text,
+        response = {
+            "status":        "success",
+            "file_type":     "word",
+            "doc_type":      doc_type,
+            "confidence":    round(confidence, 3),
+            "fields":        fields,
+            "field_sources": sources,
+            "raw_text":      full,
             "meta": {
-                "file_name":           file.filename,
+                "file_name":           file_name,
                 "processing_time_sec": elapsed,
-                "extraction_method":   "spacy_ner + python-docx",
+                "extraction_method":   "spacy_ner + " + method,
+                "extraction_strategy": strategy,
             },
         }
+        if images or skipped:
+            response["images"] = [{"name": name, "confidence": round(res["confidence_score"], 3),
+                                   "confidence_stats": res["confidence_stats"],
+                                   "text": res["formatted_text"]} for name, res in images] + skipped
+        return response
+
+
+def _media_pages(docx_path: str, skipped: list = None):
+    for name, image in word.media_images(docx_path, skipped):
+        with memguard.page_slot():
+            res = extract_single_page(image)
+        yield name, res
+
+
+# ── Upload handling ───────────────────────────────────────────────────────────
+def unsupported(ext: str) -> dict:
+    return {"error": f"Unsupported format: {ext}. Supported: {', '.join(SUPPORTED)}"}
+
+
+def invalid_options(strategy: str = None, pages: str = None, max_pages: int = None,
+                    stop_when: str = None):
+    """Error dict for a bad extraction query parameter, else None."""
+    if strategy and strategy not in STRATEGIES:
+        return {"error": f"Unknown strategy: {strategy}. Supported: {', '.join(STRATEGIES)}"}
+    if pages:
+        try:
+            parse_pages(pages)
+        except ValueError as e:
+            return {"error": str(e)}
+    if max_pages is not None and max_pages < 1:
+        return {"error": "max_pages must be at least 1"}
+    if stop_when and stop_when not in FIELD_SPECS:
+        return {"error": f"Unknown stop_when: {stop_when}. Supported: {', '.join(FIELD_SPECS)}"}
+    return None
+
+
+def save_upload(src, file_name: str) -> str:
+    # Unique name — concurrent uploads of the same file must not share a path
+    file_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex[:12]}_{os.path.basename(file_name)}")
+    with stage("upload_write"):
+        with open(file_path, "wb") as buffer:
+            shutil.copyfileobj(src, buffer)
+    return file_path
+
+
+async def extract_saved(file_path: str, file_name: str, **options) -> dict:
+    """Extract a saved upload on the worker pool, then delete it; errors come back as dicts.
+
+    options are extract_file's keyword arguments (strategy, pages, max_pages, stop_when).
+    """
+    ext   = os.path.splitext(file_name.lower())[1]
+    start = time.perf_counter()
+    try:
+        response = await run_in_worker(extract_file, file_path, ext, file_name, **options)
+    except Exception as e:
+        return {"error": f"Failed to process {file_name}: {e}"}
+    finally:
+        os.remove(file_path)
+    metrics.REQUEST_SECONDS.observe(response["file_type"], time.perf_counter() - start)
+    return response
+
+
+# ── Universal /extract endpoint ───────────────────────────────────────────────
+@app.post("/extract")
+async def extract_any(file: UploadFile = File(...), timings: bool = False, strategy: str = None,
+                      pages: str = None, max_pages: int = None, stop_when: str = None,
+                      low_memory: bool = False):
+    """PDF page selection: pages="1-3,10", max_pages=N, stop_when=<doc_type>.
+
+    low_memory=true spills PDF pages to disk during extraction and streams them back.
+    """
+    fname = file.filename.lower()
+    ext   = os.path.splitext(fname)[1]
+
+    if ext not in SUPPORTED:
+        return unsupported(ext)
+    options = {"strategy": strategy, "pages": pages, "max_pages": max_pages, "stop_when": stop_when}
+    error   = invalid_options(**options)
+    if error:
+        return error
+
+    with metrics.collect() as spans:
+        file_path = save_upload(file.file, file.filename)
+        response  = await extract_saved(file_path, file.filename, low_memory=low_memory, **options)
+
+    if timings and "meta" in response:
+        response["meta"]["timings"] = metrics.rounded(spans)
+    if isinstance(response.get("pages"), memguard.PageSpill):
+        return stream_spilled(response)
+    return response
+
+
+def stream_spilled(response: dict) -> StreamingResponse:
+    """Same JSON document as a normal response, written page by page from the spill file."""
+    spill = response.pop("pages")
+    head  = json.dumps(response, ensure_ascii=False)[:-1]
+
+    def body():
+        try:
+            yield head + ', "pages": ['
+            for i, line in enumerate(spill):
+                yield ("," if i else "") + line
+            yield "]}"
+        finally:
+            spill.close()
+    return StreamingResponse(body(), media_type="application/json")
+
+
+# ── Multi-file /extract/batch endpoint ────────────────────────────────────────
+async def _batch_item(index: int, file_name: str, file_path: str, timings: bool,
+                      options: dict) -> dict:
+    start = time.perf_counter()
+    with metrics.collect() as spans:
+        response = await extract_saved(file_path, file_name, **options)
+    item = {
+        "index":       index,
+        "file_name":   file_name,
+        "status":      "error" if "error" in response else "success",
+        "elapsed_sec": round(time.perf_counter() - start, 3),
+    }
+    if "error" in response:
+        item["error"] = response["error"]
+    else:
+        if timings:
+            response["meta"]["timings"] = metrics.rounded(spans)
+        item["result"] = response
+    return item
+
+
+def _rejected(index: int, file_name: str, error: str) -> dict:
+    return {"index": index, "file_name": file_name, "status": "error",
+            "elapsed_sec": 0.0, "error": error}
+
+
+@app.post("/extract/batch")
+async def extract_batch(files: List[UploadFile] = File(...), stream: bool = False,
+                        timings: bool = False, strategy: str = None, pages: str = None,
+                        max_pages: int = None, stop_when: str = None):
+    """Many files (or zips of files) in one request, fanned out over the worker pool.
+
+    stream=true returns NDJSON — one line per file as it finishes, then a summary line.
+    """
+    options = {"strategy": strategy, "pages": pages, "max_pages": max_pages, "stop_when": stop_when}
+    error   = invalid_options(**options)
+    if error:
+        return error
+    start, jobs, items = time.time(), [], []
+
+    def add(file_name: str, src):
+        index = len(jobs) + len(items)
+        if index >= BATCH_MAX_FILES:
+            raise ValueError(f"Batch exceeds {BATCH_MAX_FILES} files")
+        ext = os.path.splitext(file_name.lower())[1]
+        if ext not in SUPPORTED:
+            items.append(_rejected(index, file_name, unsupported(ext)["error"]))
+        else:
+            jobs.append((index, file_name, save_upload(src, file_name)))
+
+    try:
+        for upload in files:
+            if upload.filename.lower().endswith(".zip"):
+                try:
+                    with zipfile.ZipFile(upload.file) as zf:
+                        for info in zf.infolist():
+                            if info.is_dir() or info.filename.startswith("__MACOSX/"):
+                                continue
+                            with zf.open(info) as src:
+                                add(info.filename, src)
+                except zipfile.BadZipFile as e:
+                    items.append(_rejected(len(jobs) + len(items), upload.filename, f"Bad zip: {e}"))
+            else:
+                add(upload.filename, upload.file)
+    except ValueError as e:
+        for _, _, path in jobs:
+            os.remove(path)
+        return {"error": str(e)}
+
+    tasks = [asyncio.create_task(_batch_item(i, name, path, timings, options)) for i, name, path in jobs]
+
+    def summary(results: list) -> dict:
+        ok = sum(1 for r in results if r["status"] == "success")
+        return {
+            "total_files": len(results),
+            "succeeded":   ok,
+            "failed":      len(results) - ok,
+            "meta": {
+                "processing_time_sec": round(time.time() - start, 2),
+                "workers":             OCR_WORKERS,
+            },
+        }
+
+    if stream:
+        async def ndjson():
+            results = list(items)
+            for item in items:
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+            for fut in asyncio.as_completed(tasks):
+                item = await fut
+                results.append(item)
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+            yield json.dumps({"status": "done", **summary(results)}) + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    results = sorted(items + list(await asyncio.gather(*tasks)), key=lambda r: r["index"])
+    return {"status": "success", **summary(results), "results": results}
 
 
 # ── Keep old endpoints for backward compatibility ─────────────────────────────
 @app.post("/extract/pdf")
-async def extract_pdf_api(file: UploadFile = File(...)):
-    return await extract_any(file)
+async def extract_pdf_api(file: UploadFile = File(...), timings: bool = False, strategy: str = None,
+                          pages: str = None, max_pages: int = None, stop_when: str = None,
+                          low_memory: bool = False):
+    return await extract_any(file, timings, strategy, pages, max_pages, stop_when, low_memory)
 
 @app.post("/extract/image")
-async def extract_image_api(file: UploadFile = File(...)):
-    return await extract_any(file)
+async def extract_image_api(file: UploadFile = File(...), timings: bool = False, strategy: str = None,
+                            pages: str = None, max_pages: int = None, stop_when: str = None,
+                            low_memory: bool = False):
+    return await extract_any(file, timings, strategy, pages, max_pages, stop_when, low_memory)
+
+
+# ── Vendor templates ──────────────────────────────────────────────────────────
+def learn_template(file_path: str, ext: str, doc_type: str, confirmed: dict,
+                   vendor: str = None, page_no: int = 1) -> dict:
+    if ext == ".pdf":
+        doc = fitz.open(file_path)
+        try:
+            if not 1 <= page_no <= doc.page_count:
+                return {"error": f"Page {page_no} out of range (1-{doc.page_count})"}
+            page           = doc.load_page(page_no - 1)
+            native, _, res = read_pdf_page(page)
+            layout         = (templates.native_layout(page, native.words()) if res is None
+                              else templates.ocr_layout(res["line_items"]))
+        finally:
+            doc.close()
+    elif ext in IMAGE_EXTS:
+        res    = extract_single_page(load_image(file_path))
+        layout = templates.ocr_layout(res["line_items"])
+    else:
+        return {"error": f"Templates need a PDF or image, got {ext}"}
+    return templates.store.learn(layout, doc_type, confirmed, vendor)
+
+
+@app.post("/templates/learn")
+async def learn_template_api(file: UploadFile = File(...), fields: str = Form(...),
+                             doc_type: str = Form(...), vendor: str = Form(None),
+                             page: int = Form(1)):
+    """Learn a vendor layout from one document and its confirmed field values (JSON object)."""
+    try:
+        confirmed = json.loads(fields)
+    except ValueError as e:
+        return JSONResponse({"error": f"fields must be a JSON object: {e}"}, status_code=400)
+    if not isinstance(confirmed, dict) or not confirmed:
+        return JSONResponse({"error": "fields must be a non-empty JSON object"}, status_code=400)
+    error = templates.check_fields(doc_type, confirmed)
+    if error:
+        return JSONResponse({"error": error}, status_code=400)
+    ext       = os.path.splitext(file.filename.lower())[1]
+    file_path = save_upload(file.file, file.filename)
+    try:
+        return await run_in_worker(learn_template, file_path, ext, doc_type, confirmed, vendor, page)
+    except Exception as e:
+        return {"error": f"Failed to learn from {file.filename}: {e}"}
+    finally:
+        os.remove(file_path)
+
+
+@app.get("/templates")
+def list_templates():
+    return {"templates": templates.store.list()}
+
+
+@app.delete("/templates/{template_id}")
+def delete_template(template_id: str):
+    if not templates.store.delete(template_id):
+        return {"error": f"No template {template_id}"}
+    return {"status": "deleted", "id": template_id}
+
+
+# ── Prometheus scrape ─────────────────────────────────────────────────────────
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    metrics.RSS_BYTES.set(memguard.rss_bytes())
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 
 # ── Health check ──────────────────────────────────────────────────────────────
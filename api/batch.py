@@ -0,0 +1,281 @@
+"""
+batch.py - Bulk extraction CLI for directories, globs and zip/tar archives
+Run:    python -m api.batch INPUT [INPUT ...] --out results.jsonl [--workers 4]
+Resume: python -m api.batch INPUT --out results.jsonl --resume
+Parquet (needs pyarrow): --format parquet --out results/   (one part file per flush)
+
+Each file goes through api.extract_file — the same extract_pdf_pages /
+extract_single_page / read_docx path as POST /extract — on a process
+pool. Models load lazily once per worker process.
+"""
+
+import argparse, glob, itertools, json, os, shutil, sys, tarfile, tempfile, time, zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+
+from api.imaging import IMAGE_EXTS
+from api.word import WORD_EXTS
+
+SUPPORTED    = (".pdf",) + IMAGE_EXTS + WORD_EXTS
+FLUSH_EVERY  = 200     # rows per Parquet part / JSONL fsync
+PENDING_MULT = 4       # in-flight tasks per worker — bounds spooled archive members
+
+
+# ── Inputs ────────────────────────────────────────────────────────────────────
+def _is_archive(path: str) -> bool:
+    return os.path.isfile(path) and (zipfile.is_zipfile(path) or tarfile.is_tarfile(path))
+
+
+def _supported(name: str) -> bool:
+    return os.path.splitext(name.lower())[1] in SUPPORTED
+
+
+_spool_ids = itertools.count()
+
+
+def _spool_path(spool_dir: str, member: str) -> str:
+    return os.path.join(spool_dir, f"{next(_spool_ids)}_{os.path.basename(member)}")
+
+
+def iter_archive(archive: str, spool_dir: str):
+    """Yield (key, spooled path) per member — members are extracted one at a time."""
+    if zipfile.is_zipfile(archive):
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not _supported(info.filename):
+                    continue
+                dst = _spool_path(spool_dir, info.filename)
+                with zf.open(info) as src, open(dst, "wb") as out:
+                    shutil.copyfileobj(src, out)
+                yield f"{archive}!{info.filename}", dst
+    else:
+        # Streaming mode — tar.gz has no random access, so walk it exactly once
+        with tarfile.open(archive, "r|*") as tf:
+            for member in tf:
+                if not member.isfile() or not _supported(member.name):
+                    continue
+                dst = _spool_path(spool_dir, member.name)
+                with tf.extractfile(member) as src, open(dst, "wb") as out:
+                    shutil.copyfileobj(src, out)
+                yield f"{archive}!{member.name}", dst
+
+
+def iter_inputs(inputs: list, spool_dir: str):
+    """Yield (key, path, spooled) for every supported document under inputs."""
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    if _supported(name):
+                        yield path, path, False
+                    elif _is_archive(path):
+                        for key, spooled in iter_archive(path, spool_dir):
+                            yield key, spooled, True
+        elif _is_archive(item):
+            for key, spooled in iter_archive(item, spool_dir):
+                yield key, spooled, True
+        else:
+            for path in sorted(glob.glob(item, recursive=True)):
+                if os.path.isfile(path) and _supported(path):
+                    yield path, path, False
+
+
+# ── Worker ────────────────────────────────────────────────────────────────────
+def process_one(key: str, path: str, options: dict = None) -> dict:
+    """options are extract_file keyword arguments (strategy, pages, max_pages, stop_when)."""
+    from api.api import extract_file
+    start = time.perf_counter()
+    try:
+        name   = os.path.basename(key.split("!")[-1])
+        result = extract_file(path, os.path.splitext(name.lower())[1], name, **(options or {}))
+        row    = {"source": key, "status": "success", "result": result}
+    except Exception as e:
+        row = {"source": key, "status": "error", "error": f"{type(e).__name__}: {e}"}
+    row["elapsed_sec"] = round(time.perf_counter() - start, 3)
+    return row
+
+
+# ── Output sinks ──────────────────────────────────────────────────────────────
+class JsonlSink:
+    def __init__(self, path: str):
+        self.path = path
+        self._f   = None
+        self._n   = 0
+
+    def done_keys(self) -> set:
+        keys = set()
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        keys.add(json.loads(line)["source"])
+                    except (ValueError, KeyError):
+                        pass   # torn last line from an interrupted run
+        return keys
+
+    def open(self, resume: bool):
+        self._f = open(self.path, "a" if resume else "w", encoding="utf-8")
+
+    def write(self, row: dict):
+        self._f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self._n += 1
+        if self._n % FLUSH_EVERY == 0:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+
+    def close(self):
+        if self._f:
+            self._f.close()
+
+
+class ParquetSink:
+    """Directory of part files — a Parquet file cannot be appended to, parts can."""
+
+    def __init__(self, path: str):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow: pip install pyarrow")
+        self.path  = path
+        self._rows = []
+
+    def _parts(self) -> list:
+        return sorted(glob.glob(os.path.join(self.path, "part-*.parquet")))
+
+    def done_keys(self) -> set:
+        import pyarrow.parquet as pq
+        keys = set()
+        for part in self._parts():
+            keys.update(pq.read_table(part, columns=["source"]).column("source").to_pylist())
+        return keys
+
+    def open(self, resume: bool):
+        os.makedirs(self.path, exist_ok=True)
+        if not resume:
+            for part in self._parts():
+                os.remove(part)
+
+    def write(self, row: dict):
+        result = row.get("result") or {}
+        pages  = result.get("pages") or [{}]
+        self._rows.append({
+            "source":      row["source"],
+            "status":      row["status"],
+            "error":       row.get("error"),
+            "file_type":   result.get("file_type"),
+            "doc_type":    result.get("doc_type") or pages[0].get("doc_type"),
+            "elapsed_sec": row["elapsed_sec"],
+            "result_json": json.dumps(result, ensure_ascii=False) if result else None,
+        })
+        if len(self._rows) >= FLUSH_EVERY:
+            self._flush()
+
+    def _flush(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if not self._rows:
+            return
+        parts = self._parts()
+        n     = int(os.path.basename(parts[-1])[5:10]) + 1 if parts else 0
+        tmp   = os.path.join(self.path, f".part-{n:05d}.tmp")
+        pq.write_table(pa.Table.from_pylist(self._rows), tmp)
+        os.replace(tmp, os.path.join(self.path, f"part-{n:05d}.parquet"))   # atomic checkpoint
+        self._rows = []
+
+    def close(self):
+        self._flush()
+
+
+# ── Driver ────────────────────────────────────────────────────────────────────
+def run_batch(inputs: list, out: str, fmt: str = "jsonl", workers: int = None,
+              resume: bool = False, progress_every: float = 10.0, options: dict = None) -> dict:
+    sink    = ParquetSink(out) if fmt == "parquet" else JsonlSink(out)
+    done    = sink.done_keys() if resume else set()
+    workers = workers or os.cpu_count() or 1
+    counts  = {"success": 0, "error": 0, "skipped": 0}
+    spool   = tempfile.mkdtemp(prefix="ocr_batch_")
+    start   = last_report = time.perf_counter()
+
+    sink.open(resume)
+    # spawn — paddle/spaCy state must never be inherited through fork
+    pool    = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+    pending = {}
+
+    def drain(block: bool):
+        nonlocal last_report
+        if not pending:
+            return
+        finished, _ = wait(pending, return_when=FIRST_COMPLETED, timeout=None if block else 0)
+        for fut in finished:
+            key, path, spooled = pending.pop(fut)
+            try:
+                row = fut.result()
+            except Exception as e:            # worker died (OOM, segfault in a codec…)
+                row = {"source": key, "status": "error", "error": repr(e), "elapsed_sec": 0.0}
+            sink.write(row)
+            counts[row["status"]] += 1
+            if spooled and os.path.exists(path):
+                os.remove(path)
+        now = time.perf_counter()
+        if now - last_report >= progress_every:
+            n = counts["success"] + counts["error"]
+            print(f"  {n} docs  {n / (now - start):.2f} docs/sec  ({counts['error']} errors)",
+                  flush=True)
+            last_report = now
+
+    try:
+        for key, path, spooled in iter_inputs(inputs, spool):
+            if key in done:
+                counts["skipped"] += 1
+                if spooled:
+                    os.remove(path)
+                continue
+            while len(pending) >= workers * PENDING_MULT:
+                drain(block=True)
+            fut = pool.submit(process_one, key, path, options)
+            pending[fut] = (key, path, spooled)
+            drain(block=False)
+        while pending:
+            drain(block=True)
+    finally:
+        pool.shutdown(cancel_futures=True)
+        sink.close()
+        shutil.rmtree(spool, ignore_errors=True)
+
+    elapsed   = time.perf_counter() - start
+    processed = counts["success"] + counts["error"]
+    return {
+        **counts,
+        "processed":    processed,
+        "elapsed_sec":  round(elapsed, 2),
+        "docs_per_sec": round(processed / elapsed, 3) if elapsed else 0.0,
+        "output":       out,
+    }
+
+
+def main(argv=None):
+    from api.ner_parser import STRATEGIES
+    parser = argparse.ArgumentParser(prog="python -m api.batch")
+    parser.add_argument("inputs", nargs="+", help="directories, globs, or .zip/.tar(.gz) archives")
+    parser.add_argument("--out", required=True, help="JSONL file, or directory for parquet")
+    parser.add_argument("--format", choices=("jsonl", "parquet"), default="jsonl")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--resume", action="store_true", help="skip sources already in --out")
+    parser.add_argument("--strategy", choices=STRATEGIES,
+                        help="field extraction strategy (default: EXTRACTION_STRATEGY or ner_first)")
+    parser.add_argument("--pages", help='PDF pages to extract, e.g. "1-3,10"')
+    parser.add_argument("--max-pages", type=int, help="extract at most N pages per PDF")
+    parser.add_argument("--stop-when", metavar="DOC_TYPE",
+                        help="stop a PDF at the first DOC_TYPE page with all header fields")
+    args = parser.parse_args(argv)
+
+    summary = run_batch(args.inputs, args.out, args.format, args.workers, args.resume,
+                        options={"strategy": args.strategy, "pages": args.pages,
+                                 "max_pages": args.max_pages, "stop_when": args.stop_when})
+    print(json.dumps(summary, indent=2))
+    return 1 if summary["error"] and not summary["success"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
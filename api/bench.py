@@ -0,0 +1,420 @@
+"""
+bench.py - Reproducible benchmark suite over the bundled sample documents
+Run:     python -m api.bench run [--repeat 5] [--synthetic] [--out bench.json]
+Compare: python -m api.bench compare base.json head.json [--threshold 0.15]
+NER:     python -m api.bench ner --models default fast fast:invoice [--data dev.jsonl]
+Native:  python -m api.bench textpage [--pages 300] [--source "sample datas/sample_invoice.pdf"] [--filler]
+
+Every case goes through the full /extract path (in-process TestClient) with
+?timings=true, so per-stage numbers come from the same spans as /metrics.
+"""
+
+import argparse, gc, glob, json, os, platform, random, subprocess
+import sys, tempfile, threading, time, tracemalloc
+import numpy as np
+
+from api.memguard import rss_bytes
+
+ROOT        = os.path.join(os.path.dirname(__file__), "..")
+SAMPLE_DIRS = [os.path.join(ROOT, "sample datas"), os.path.join(ROOT, "temp")]
+SAMPLE_EXTS = (".pdf", ".png", ".jpg", ".jpeg", ".docx")
+SEED        = 1234
+
+
+# ── Synthetic corpora ─────────────────────────────────────────────────────────
+INVOICE_HEADER = [
+    "TAX INVOICE",
+    "Invoice No: INV/2025/{n:04d}",
+    "Invoice Date: 05 Feb 2025",
+    "Bill To: Priya Textiles Ltd.",
+    "GSTIN: 33AABCP1234F1Z5",
+]
+ITEM_NAMES = ["Cotton Fabric - White (50m Roll)", "Polyester Blend Thread - Black",
+              "Silk Lining - Maroon", "Denim Roll - Indigo", "Linen Sheet - Beige"]
+
+
+def synthetic_pages_pdf(path: str, n_pages: int = 100):
+    """n native invoice pages — scales the per-page native path."""
+    import fitz
+    rng = random.Random(SEED)
+    doc = fitz.open()
+    for n in range(1, n_pages + 1):
+        page  = doc.new_page()
+        lines = [l.format(n=n) for l in INVOICE_HEADER]
+        lines += [f"{i}. {rng.choice(ITEM_NAMES)}  520811  {rng.randint(1, 50)} Roll  3,500.00"
+                  for i in range(1, 16)]
+        lines += ["IGST (12%): Rs. 9,534.00", "Grand Total: Rs. 88,983.50"]
+        page.insert_text((50, 60), "\n".join(lines), fontsize=10)
+    doc.save(path)
+    doc.close()
+
+
+def synthetic_invoice_pdf(path: str, n_rows: int = 1000, rows_per_page: int = 45):
+    """One invoice with n_rows ruled line items — scales table finding + NER."""
+    import fitz
+    rng  = random.Random(SEED)
+    cols = [("S.No", 40), ("Item Description", 200), ("HSN", 60), ("Qty", 40),
+            ("Rate (Rs.)", 70), ("Amount (Rs.)", 80)]
+    doc, row = fitz.open(), 0
+    while row < n_rows:
+        page = doc.new_page()
+        y    = 50
+        if row == 0:
+            page.insert_text((50, y), "\n".join(l.format(n=1) for l in INVOICE_HEADER), fontsize=10)
+            y += 70
+        body = [[c for c, _ in cols]]
+        for _ in range(min(rows_per_page, n_rows - row)):
+            row += 1
+            qty, rate = rng.randint(1, 50), rng.choice([350, 1200, 3500])
+            body.append([str(row), rng.choice(ITEM_NAMES), "520811", str(qty),
+                         f"{rate:,.2f}", f"{qty * rate:,.2f}"])
+        h = 15
+        for r, cells in enumerate(body):
+            x = 40
+            for (_, w), cell in zip(cols, cells):
+                page.draw_rect(fitz.Rect(x, y + r * h, x + w, y + (r + 1) * h), width=0.5)
+                page.insert_text((x + 2, y + r * h + 11), cell, fontsize=7)
+                x += w
+    page.insert_text((50, min(y + (len(body) + 1) * 15, 820)),
+                     "Grand Total: Rs. 88,983.50", fontsize=10)
+    doc.save(path)
+    doc.close()
+
+
+def collect_cases(synthetic: bool, workdir: str) -> list:
+    cases = []
+    for d in SAMPLE_DIRS:
+        for path in sorted(glob.glob(os.path.join(d, "*"))):
+            if path.lower().endswith(SAMPLE_EXTS):
+                name = f"{os.path.basename(d)}/{os.path.basename(path)}"
+                cases.append((name, path))
+    if synthetic:
+        pages = os.path.join(workdir, "synthetic_100_pages.pdf")
+        rows  = os.path.join(workdir, "synthetic_1000_rows.pdf")
+        synthetic_pages_pdf(pages, 100)
+        synthetic_invoice_pdf(rows, 1000)
+        cases += [("synthetic/100_pages.pdf", pages), ("synthetic/1000_rows.pdf", rows)]
+    return cases
+
+
+# ── Measurement ───────────────────────────────────────────────────────────────
+class PeakRSS:
+    """Samples RSS on a background thread — ru_maxrss never resets between cases."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval, self.peak = interval, 0
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        self.peak = rss_bytes()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_bytes())
+
+
+def percentile(values, q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def _post(client, path: str):
+    name = os.path.basename(path)
+    with open(path, "rb") as f:
+        resp = client.post("/extract?timings=true", files={"file": (name, f.read())})
+    body = resp.json()
+    if "error" in body:
+        raise RuntimeError(body["error"])
+    return body
+
+
+def run_case(client, path: str, repeat: int) -> dict:
+    latencies, stages, pages = [], {}, 1
+    with PeakRSS() as rss:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            body  = _post(client, path)
+            latencies.append(time.perf_counter() - start)
+            pages = body.get("total_pages", 1)
+            for name, sec in body["meta"].get("timings", {}).items():
+                stages.setdefault(name, []).append(sec)
+
+    # One extra traced run — tracemalloc distorts latency, so it is kept separate
+    gen0 = gc.get_stats()[0]["collections"]
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    _post(client, path)
+    _, alloc_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50 = percentile(latencies, 50)
+    return {
+        "pages":            pages,
+        "runs":             repeat,
+        "p50_ms":           round(p50 * 1000, 2),
+        "p95_ms":           round(percentile(latencies, 95) * 1000, 2),
+        "pages_per_sec":    round(pages / p50, 2) if p50 else 0.0,
+        "peak_rss_mb":      round(rss.peak / 2**20, 1),
+        "py_alloc_peak_kb": round(alloc_peak / 1024, 1),
+        "py_blocks_delta":  sys.getallocatedblocks() - blocks,
+        "gc_gen0_runs":     gc.get_stats()[0]["collections"] - gen0,
+        "stages": {
+            name: {"p50_ms": round(percentile(v, 50) * 1000, 2),
+                   "p95_ms": round(percentile(v, 95) * 1000, 2)}
+            for name, v in sorted(stages.items())
+        },
+    }
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def run_suite(repeat: int = 5, synthetic: bool = False, match: str = None) -> dict:
+    from fastapi.testclient import TestClient
+    from api.api import app
+
+    client  = TestClient(app)
+    workdir = tempfile.mkdtemp(prefix="ocr_bench_")
+    results = {}
+    for name, path in collect_cases(synthetic, workdir):
+        if match and match not in name:
+            continue
+        try:
+            _post(client, path)                       # warm-up: model loads excluded
+            results[name] = run_case(client, path, repeat)
+            print(f"  {name:<45} p50 {results[name]['p50_ms']:>9.1f} ms  "
+                  f"{results[name]['pages_per_sec']:>7.2f} pages/s")
+        except Exception as e:
+            results[name] = {"error": str(e)}
+            print(f"  {name:<45} ERROR {e}")
+
+    return {
+        "meta": {
+            "commit":    _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python":    platform.python_version(),
+            "platform":  platform.platform(),
+            "repeat":    repeat,
+            "seed":      SEED,
+        },
+        "cases": results,
+    }
+
+
+# ── NER model variants ────────────────────────────────────────────────────────
+def _dir_mb(path: str) -> float:
+    total = sum(os.path.getsize(os.path.join(root, f))
+                for root, _, files in os.walk(path) for f in files)
+    return round(total / 2**20, 2)
+
+
+def bench_ner(models: list, data_path: str = None, repeat: int = 3) -> dict:
+    """entities/sec (line by line, as extract_with_ner calls it) and P/R/F1 per model.
+
+    Gold entities are restricted to each model's own labels, so a doc-type
+    model ("fast:invoice") is scored on the fields it is meant to find.
+    """
+    import spacy
+    from spacy.training import Example
+    from api.ner_parser import model_path
+    from api.ner_trainer import TRAIN_DATA, iter_jsonl
+
+    data = list(iter_jsonl(data_path)) if data_path else list(TRAIN_DATA)
+    if not data_path:
+        print("  (no --data: scoring on built-in TRAIN_DATA, i.e. in-sample)")
+    texts   = [t for t, _ in data]
+    results = {}
+    for name in models:
+        variant, _, doc_type = name.partition(":")
+        path = model_path(variant, doc_type or None)
+        if not os.path.exists(path):
+            results[name] = {"error": f"model not found: {path}"}
+            print(f"  {name:<20} missing ({path})")
+            continue
+        start  = time.perf_counter()
+        nlp    = spacy.load(path)
+        load_s = time.perf_counter() - start
+        labels = set(nlp.get_pipe("ner").labels)
+
+        runs, n_ents = [], 0
+        for _ in range(repeat):
+            start  = time.perf_counter()
+            n_ents = sum(len(nlp(t).ents) for t in texts)
+            runs.append(time.perf_counter() - start)
+        best = min(runs)
+
+        examples = []
+        for text, ann in data:
+            ents = [e for e in ann["entities"] if e[2] in labels]
+            examples.append(Example.from_dict(nlp.make_doc(text), {"entities": ents}))
+        scores = nlp.evaluate(examples)
+
+        results[name] = {
+            "path":          os.path.relpath(path, ROOT),
+            "labels":        len(labels),
+            "size_mb":       _dir_mb(path),
+            "load_sec":      round(load_s, 3),
+            "lines_per_sec": round(len(texts) / best, 1),
+            "ents_per_sec":  round(n_ents / best, 1),
+            "precision":     round(scores["ents_p"] or 0.0, 4),
+            "recall":        round(scores["ents_r"] or 0.0, 4),
+            "f1":            round(scores["ents_f"] or 0.0, 4),
+        }
+        r = results[name]
+        print(f"  {name:<20} {r['labels']:>3} labels  {r['size_mb']:>6} MB  "
+              f"{r['lines_per_sec']:>9,.0f} lines/s  {r['ents_per_sec']:>9,.0f} ents/s  F1 {r['f1']:.3f}")
+    return {"meta": {"commit": _git_commit(), "data": data_path or "TRAIN_DATA",
+                     "lines": len(texts), "repeat": repeat},
+            "models": results}
+
+
+# ── Native text: separate reads vs one shared TextPage ─────────────────────────
+def textpage_pdf(path: str, source: str, n_pages: int, filler: bool = False):
+    """source's pages repeated up to n_pages; filler puts a table-less page after each copy."""
+    import fitz
+    plain = os.path.join(os.path.dirname(path), "plain.pdf")
+    synthetic_pages_pdf(plain, n_pages=1)
+    doc = fitz.open()
+    with fitz.open(source) as src, fitz.open(plain) as extra:
+        while len(doc) < n_pages:
+            doc.insert_pdf(src, to_page=min(len(src), n_pages - len(doc)) - 1)
+            if filler and len(doc) < n_pages:
+                doc.insert_pdf(extra)
+    doc.save(path)
+    doc.close()
+
+
+def _separate(page):
+    """The walk before NativePage: each read parses the page again; tables always searched."""
+    page.get_text("text")
+    page.get_text("words")
+    page.find_tables()
+
+
+def _shared(page):
+    from api.native import NativePage
+    native = NativePage(page)
+    native.text()
+    native.words()
+    if native.may_have_table():
+        page.find_tables()
+
+
+def bench_textpage(source: str, n_pages: int = 300, repeat: int = 3, filler: bool = False) -> dict:
+    """ms/page of an invoice/PO page's native reads, best of repeat, separate vs shared TextPage."""
+    import fitz
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "scaled.pdf")
+        textpage_pdf(path, source, n_pages, filler)
+        with fitz.open(path) as doc:
+            for name, walk in (("separate", _separate), ("shared", _shared)):
+                runs = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    for page in doc:
+                        walk(page)
+                    runs.append(time.perf_counter() - start)
+                results[name] = round(min(runs) * 1000 / len(doc), 3)
+                print(f"  {name:<10} {results[name]:>8.3f} ms/page")
+    saved = results["separate"] - results["shared"]
+    print(f"  saved      {saved:>8.3f} ms/page  ({saved / results['separate']:.0%}) "
+          f"→ {saved * n_pages / 1000:.2f} s over {n_pages} pages")
+    return {"meta": {"commit": _git_commit(), "source": os.path.relpath(source, ROOT),
+                     "pages": n_pages, "filler": filler, "repeat": repeat},
+            "ms_per_page": results, "saved_ms_per_page": round(saved, 3)}
+
+
+# ── Regression check ──────────────────────────────────────────────────────────
+def compare(base: dict, head: dict, threshold: float = 0.15) -> list:
+    """Return (case, metric, base, head) for every metric that got worse than threshold."""
+    regressions = []
+    for name, h in head["cases"].items():
+        b = base["cases"].get(name)
+        if not b or "error" in b or "error" in h:
+            continue
+        for metric in ("p50_ms", "p95_ms", "peak_rss_mb"):
+            if b[metric] and h[metric] > b[metric] * (1 + threshold):
+                regressions.append((name, metric, b[metric], h[metric]))
+        if b["pages_per_sec"] and h["pages_per_sec"] < b["pages_per_sec"] * (1 - threshold):
+            regressions.append((name, "pages_per_sec", b["pages_per_sec"], h["pages_per_sec"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m api.bench")
+    sub    = parser.add_subparsers(dest="cmd", required=True)
+
+    run = sub.add_parser("run", help="benchmark sample documents")
+    run.add_argument("--repeat", type=int, default=5)
+    run.add_argument("--synthetic", action="store_true", help="add 100-page and 1,000-row corpora")
+    run.add_argument("--match", help="only run cases whose name contains this")
+    run.add_argument("--out", help="results JSON (default bench_<commit>.json)")
+
+    cmp_ = sub.add_parser("compare", help="flag regressions between two result files")
+    cmp_.add_argument("base")
+    cmp_.add_argument("head")
+    cmp_.add_argument("--threshold", type=float, default=0.15)
+
+    ner = sub.add_parser("ner", help="entities/sec and F1 per NER model variant")
+    ner.add_argument("--models", nargs="+", default=["default", "fast"],
+                     help="variant or variant:doc_type, e.g. default fast fast:invoice")
+    ner.add_argument("--data", help="JSONL gold set (default: built-in TRAIN_DATA)")
+    ner.add_argument("--repeat", type=int, default=3)
+    ner.add_argument("--out", help="results JSON")
+
+    tp = sub.add_parser("textpage", help="native page reads: separate vs one shared TextPage")
+    tp.add_argument("--source", default=os.path.join(ROOT, "sample datas", "sample_invoice.pdf"))
+    tp.add_argument("--pages", type=int, default=300)
+    tp.add_argument("--repeat", type=int, default=3)
+    tp.add_argument("--filler", action="store_true",
+                    help="interleave table-less pages (find_tables is skipped on those)")
+    tp.add_argument("--out", help="results JSON")
+
+    args = parser.parse_args(argv)
+
+    if args.cmd in ("ner", "textpage"):
+        results = (bench_ner(args.models, args.data, args.repeat) if args.cmd == "ner" else
+                   bench_textpage(args.source, args.pages, args.repeat, args.filler))
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(results, f, indent=2)
+        return 0
+
+    if args.cmd == "run":
+        results = run_suite(args.repeat, args.synthetic, args.match)
+        out = args.out or f"bench_{results['meta']['commit']}.json"
+        with open(out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to: {out}")
+        return 0
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    regressions = compare(base, head, args.threshold)
+    print(f"{base['meta']['commit']} → {head['meta']['commit']}  "
+          f"(threshold {args.threshold:.0%})")
+    for name, metric, b, h in regressions:
+        print(f"  REGRESSION {name:<45} {metric:<14} {b:>10} → {h}")
+    if not regressions:
+        print("  no regressions")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
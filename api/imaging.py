@@ -0,0 +1,185 @@
+"""
+imaging.py - Image ingestion for OCR: fast decode, EXIF orientation, 8-bit RGB, one resize
+Every page image reaches PaddleOCR upright, as an RGB uint8 array OCR_WIDTH pixels wide.
+Multi-frame TIFF / WebP / AVIF: frame_count() + iter_frames(), decoded ahead by prefetch().
+AVIF decodes through pillow-avif-plugin (requirements.txt) or natively from Pillow 11.2.
+"""
+
+import contextvars, queue, threading
+import numpy as np
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from api import orientation
+from api.metrics import stage
+
+OCR_WIDTH  = 1200    # detector input width — boxes and templates are relative to it
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".webp", ".avif")
+PAGED_EXTS = (".tif", ".tiff", ".webp", ".avif")   # formats whose extra frames are pages
+
+# AVIF — native from Pillow 11.2, otherwise whichever optional plugin is installed
+AVIF_SUPPORT = bool(features.check_module("avif")) if "avif" in features.modules else False
+if not AVIF_SUPPORT:
+    try:
+        import pillow_avif  # noqa: F401  (registers the AVIF plugin on import)
+        AVIF_SUPPORT = True
+    except ImportError:
+        try:
+            from pillow_heif import register_avif_opener
+            register_avif_opener()
+            AVIF_SUPPORT = True
+        except ImportError:
+            pass
+
+# EXIF orientations that swap width and height (transpose / rotate 90 / 270)
+_SWAPS_AXES = {5, 6, 7, 8}
+
+
+def open_image(path) -> Image.Image:
+    try:
+        return Image.open(path)
+    except UnidentifiedImageError:
+        if isinstance(path, str) and path.lower().endswith(".avif") and not AVIF_SUPPORT:
+            raise RuntimeError("AVIF needs Pillow >= 11.2 or: pip install pillow-avif-plugin")
+        raise
+
+
+def load_image(path, width: int = OCR_WIDTH) -> np.ndarray:
+    """Decode an upload straight to OCR size.
+
+    JPEGs use draft mode, so libjpeg's DCT scaling decodes a 12 MP phone photo at
+    1/2-1/8 size instead of decoding it at full size and then shrinking it.
+    """
+    with stage("image_decode"):
+        img = open_image(path)
+        if img.format in ("JPEG", "MPO"):      # MPO: a phone camera's JPEG + preview
+            swap = img.getexif().get(0x0112) in _SWAPS_AXES
+            src_w, src_h = (img.height, img.width) if swap else img.size
+            scale = width / src_w
+            if scale < 1:
+                size = (int(img.width * scale) + 1, int(img.height * scale) + 1)
+                img.draft("RGB", size)    # never goes below size, so only one downscale follows
+        img = ImageOps.exif_transpose(img)
+        img = to_rgb(img)
+    img = orientation.upright(img)
+    return to_ocr_array(img, width)
+
+
+def to_rgb(img: Image.Image) -> Image.Image:
+    """Any PIL mode → 8-bit RGB; transparency is flattened onto white."""
+    if img.mode == "RGB":
+        return img
+    if img.mode in ("I;16", "I;16B", "I;16L", "I", "F"):
+        # 16-bit / 32-bit greyscale — stretch the used range into 0-255
+        arr = np.asarray(img, dtype=np.float32)
+        lo, hi = float(arr.min()), float(arr.max())
+        arr = (arr - lo) * (255.0 / (hi - lo)) if hi > lo else np.zeros_like(arr)
+        return Image.fromarray(arr.astype(np.uint8), "L").convert("RGB")
+    if img.mode == "P":
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+    if img.mode in ("RGBA", "LA", "PA", "RGBa"):
+        img = img.convert("RGBA")
+        canvas = Image.new("RGB", img.size, (255, 255, 255))
+        canvas.paste(img, mask=img.getchannel("A"))
+        return canvas
+    return img.convert("RGB")
+
+
+def to_ocr_array(img, width: int = OCR_WIDTH) -> np.ndarray:
+    """RGB PIL image or array → uint8 (h, width, 3), resized once into a fresh buffer."""
+    import cv2
+    src = np.asarray(to_rgb(img) if isinstance(img, Image.Image) else img)
+    h, w = src.shape[:2]
+    if w == width:
+        return src
+    out = np.empty((max(1, round(h * width / w)), width, 3), dtype=np.uint8)
+    # AREA averages when shrinking (keeps thin strokes); CUBIC when a small scan is enlarged
+    interp = cv2.INTER_AREA if width < w else cv2.INTER_CUBIC
+    cv2.resize(src, (width, out.shape[0]), dst=out, interpolation=interp)
+    return out
+
+
+# ── Multi-frame images ────────────────────────────────────────────────────────
+def frame_count(path: str) -> int:
+    """Pages in a multi-frame image; 1 for MPO (a phone photo's second frame is a preview)."""
+    with open_image(path) as img:
+        return 1 if img.format == "MPO" else getattr(img, "n_frames", 1)
+
+
+def iter_frames(path: str, indices):
+    """(index, OCR array) for the selected frames only — one frame decoded at a time."""
+    with open_image(path) as img:
+        for i in indices:
+            with stage("image_decode"):
+                img.seek(i)
+                frame = to_rgb(ImageOps.exif_transpose(img))
+            yield i, to_ocr_array(orientation.upright(frame))
+
+
+_DONE = object()
+
+
+class Prefetch:
+    """Iterator over iterable run on a helper thread, up to depth items ahead of the consumer.
+
+    The thread starts on construction, so work begins before the first item is
+    asked for. close() stops it and waits for it, consumed or not.
+    """
+
+    def __init__(self, iterable, depth: int = 2):
+        self._iterable = iterable
+        self._items    = queue.Queue(maxsize=depth)
+        self._stop     = threading.Event()
+        self._done     = False
+        ctx            = contextvars.copy_context()    # stage() spans land in the request's timings
+        self._thread   = threading.Thread(target=ctx.run, args=(self._produce,), daemon=True)
+        self._thread.start()
+
+    def _offer(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _produce(self):
+        try:
+            for item in self._iterable:
+                if not self._offer(item):
+                    break
+            else:
+                self._offer(_DONE)
+        except BaseException as e:      # re-raised on the consumer side
+            self._offer(e)
+        finally:
+            if hasattr(self._iterable, "close"):
+                self._iterable.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+        item = self._items.get()
+        if item is _DONE or isinstance(item, BaseException):
+            self.close()
+            if item is _DONE:
+                raise StopIteration
+            raise item
+        return item
+
+    def close(self):
+        self._done = True
+        self._stop.set()
+        self._thread.join()
+
+
+def prefetch(iterable, depth: int = 2) -> Prefetch:
+    """Run iterable on a helper thread, started now, up to depth items ahead of the consumer.
+
+    Decoding frame n + 1 overlaps OCR of frame n — Paddle inference releases the GIL —
+    and a DOCX's embedded images are OCR'd while its XML is still being parsed.
+    """
+    return Prefetch(iterable, depth)
@@ -0,0 +1,221 @@
+"""
+loadtest.py - Load generator for the extraction API
+In-process: python -m api.loadtest --asgi --concurrency 4 --duration 30
+uvicorn:    python -m api.loadtest --url http://127.0.0.1:8000 --rps 2 --duration 60
+Mix:        --mix pdf=6,image=2,docx=2   (weights over files in 'sample datas/')
+
+--concurrency N  closed loop: N clients, each sends its next request on reply
+--rps R          open loop:   one request every 1/R s, whether or not replies came back
+
+Server-side saturation comes from polling /metrics (queue depth, in-flight
+vs ocr_workers) while the load runs.
+"""
+
+import argparse, asyncio, glob, json, os, pathlib, random, re, sys, time
+import numpy as np
+
+ROOT       = os.path.join(os.path.dirname(__file__), "..")
+SAMPLE_DIR = os.path.join(ROOT, "sample datas")
+KINDS      = {
+    "pdf":   (".pdf",),
+    "image": (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".webp", ".avif"),
+    "docx":  (".docx",),
+}
+DEFAULT_MIX = "pdf=6,image=2,docx=2"
+SEED        = 1234
+
+
+# ── Workload ──────────────────────────────────────────────────────────────────
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in KINDS:
+            raise ValueError(f"Unknown kind in --mix: {kind}. Choose from {', '.join(KINDS)}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def load_corpus(sample_dir: str, mix: dict) -> dict:
+    """kind → [(file name, bytes)] — read once so disk I/O is not part of the load."""
+    corpus = {}
+    for kind in mix:
+        files = sorted(p for p in glob.glob(os.path.join(sample_dir, "*"))
+                       if p.lower().endswith(KINDS[kind]))
+        if files:
+            corpus[kind] = [(os.path.basename(p), pathlib.Path(p).read_bytes()) for p in files]
+    if not corpus:
+        raise FileNotFoundError(f"No sample files for mix {mix} in {sample_dir}")
+    return corpus
+
+
+class Workload:
+    def __init__(self, corpus: dict, mix: dict, seed: int = SEED):
+        self.corpus  = corpus
+        self.kinds   = [k for k in mix if k in corpus]
+        self.weights = [mix[k] for k in self.kinds]
+        self.rng     = random.Random(seed)
+
+    def next(self):
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        name, data = self.rng.choice(self.corpus[kind])
+        return kind, name, data
+
+
+# ── Client ────────────────────────────────────────────────────────────────────
+def make_client(url: str = None, timeout: float = 300.0):
+    import httpx
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=timeout)
+    from api.api import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                             base_url="http://loadtest", timeout=timeout)
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = []   # (kind, latency sec, ok)
+        self.gauges  = []   # (queue depth, in flight, workers)
+
+    def add(self, kind: str, latency: float, ok: bool):
+        self.samples.append((kind, latency, ok))
+
+
+async def send_one(client, workload: Workload, rec: Recorder):
+    kind, name, data = workload.next()
+    start = time.perf_counter()
+    try:
+        resp = await client.post("/extract", files={"file": (name, data)})
+        ok = resp.status_code == 200 and "error" not in resp.json()
+    except Exception:
+        ok = False
+    rec.add(kind, time.perf_counter() - start, ok)
+
+
+async def closed_loop(client, workload, rec, concurrency: int, deadline: float, limit: int):
+    sent = 0
+
+    async def user():
+        nonlocal sent
+        while time.perf_counter() < deadline and (not limit or sent < limit):
+            sent += 1
+            await send_one(client, workload, rec)
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+
+
+async def open_loop(client, workload, rec, rps: float, deadline: float, limit: int):
+    tasks, sent, start = [], 0, time.perf_counter()
+    while time.perf_counter() < deadline and (not limit or sent < limit):
+        tasks.append(asyncio.create_task(send_one(client, workload, rec)))
+        sent += 1
+        # Fixed schedule — late replies must not slow the arrival rate down
+        await asyncio.sleep(max(0.0, start + sent / rps - time.perf_counter()))
+    await asyncio.gather(*tasks)
+
+
+_GAUGE_RE = re.compile(r"^(ocr_queue_depth|ocr_requests_in_flight|ocr_workers) (\S+)$", re.M)
+
+
+async def poll_metrics(client, rec: Recorder, interval: float, stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            text   = (await client.get("/metrics")).text
+            values = {k: float(v) for k, v in _GAUGE_RE.findall(text)}
+            rec.gauges.append((values.get("ocr_queue_depth", 0.0),
+                               values.get("ocr_requests_in_flight", 0.0),
+                               values.get("ocr_workers", 0.0)))
+        except Exception:
+            pass
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+# ── Report ────────────────────────────────────────────────────────────────────
+def _latency(values) -> dict:
+    if not values:
+        return {}
+    ms  = np.array(values) * 1000
+    out = {f"p{q}_ms": round(float(np.percentile(ms, q)), 1) for q in (50, 90, 95, 99)}
+    out["max_ms"] = round(float(ms.max()), 1)
+    return out
+
+
+def summarize(rec: Recorder, elapsed: float) -> dict:
+    ok      = [lat for _, lat, good in rec.samples if good]
+    errors  = sum(1 for _, _, good in rec.samples if not good)
+    total   = len(rec.samples)
+    report  = {
+        "requests":       total,
+        "errors":         errors,
+        "error_rate":     round(errors / total, 4) if total else 0.0,
+        "duration_sec":   round(elapsed, 2),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else 0.0,
+        "latency":        _latency(ok),
+        "by_kind": {
+            kind: _latency([lat for k, lat, good in rec.samples if k == kind and good])
+            for kind in sorted({k for k, _, _ in rec.samples})
+        },
+    }
+    if rec.gauges:
+        queue    = [q for q, _, _ in rec.gauges]
+        busy     = [w and f >= w for _, f, w in rec.gauges]
+        report["server"] = {
+            "workers":          int(rec.gauges[-1][2]),
+            "queue_depth_max":  int(max(queue)),
+            "queue_depth_mean": round(sum(queue) / len(queue), 2),
+            "saturated_frac":   round(sum(busy) / len(busy), 3),   # all workers busy
+        }
+    return report
+
+
+async def run(url=None, concurrency=None, rps=None, duration=30.0, requests=0,
+              mix=DEFAULT_MIX, sample_dir=SAMPLE_DIR, poll=0.5) -> dict:
+    mix      = parse_mix(mix)
+    workload = Workload(load_corpus(sample_dir, mix), mix)
+    rec      = Recorder()
+    stop     = asyncio.Event()
+
+    async with make_client(url) as client:
+        poller   = asyncio.create_task(poll_metrics(client, rec, poll, stop))
+        start    = time.perf_counter()
+        deadline = start + duration
+        if rps:
+            await open_loop(client, workload, rec, rps, deadline, requests)
+        else:
+            await closed_loop(client, workload, rec, concurrency or 1, deadline, requests)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await poller
+
+    return summarize(rec, elapsed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m api.loadtest")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="running server, e.g. http://127.0.0.1:8000")
+    target.add_argument("--asgi", action="store_true", help="drive api.api:app in-process")
+    shape = parser.add_mutually_exclusive_group()
+    shape.add_argument("--concurrency", type=int, help="closed loop with N clients (default 1)")
+    shape.add_argument("--rps", type=float, help="open loop at a fixed arrival rate")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds (default 30)")
+    parser.add_argument("--requests", type=int, default=0, help="stop after N requests")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--samples", default=SAMPLE_DIR, help="directory of sample files")
+    parser.add_argument("--out", help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args.url, args.concurrency, args.rps, args.duration,
+                             args.requests, args.mix, args.samples))
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+memguard.py - Memory-bounded extraction: RSS ceiling with backpressure + page spill
+Enable: RSS_CEILING_MB=1500  (above it, pages are rendered and OCR'd one at a time)
+        /extract?low_memory=true  (pages spilled to disk and streamed back)
+"""
+
+import gc, json, os, resource, tempfile, threading, time
+from contextlib import contextmanager
+
+from api import metrics
+from api.metrics import stage
+
+RSS_CEILING_MB = float(os.getenv("RSS_CEILING_MB", "0"))    # 0 = no ceiling
+RSS_WAIT_SEC   = float(os.getenv("RSS_WAIT_SEC", "30"))     # longest wait for in-flight pages
+SPILL_DIR      = os.getenv("SPILL_DIR") or None             # default: system temp dir
+
+
+# ── RSS ───────────────────────────────────────────────────────────────────────
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def release(collect: bool = True):
+    """Drop MuPDF's object/glyph store; collect=True also frees cycles holding pixmaps."""
+    import fitz
+    fitz.TOOLS.store_shrink(100)
+    if collect:
+        gc.collect()
+
+
+def wait_for_memory(ceiling_mb: float = None, timeout: float = None):
+    """Backpressure before new work: over the ceiling, wait for the pages in flight.
+
+    RSS rarely falls once the allocator and the MuPDF/Paddle arenas have grown, so
+    it only decides whether to wait. What is waited on is the pages in flight
+    (page_slot) finishing — their pixmaps and OCR buffers are what falls, and what
+    the next page reuses. With none in flight the work runs at once.
+    """
+    _admit(ceiling_mb, timeout, take=False)
+
+
+@contextmanager
+def page_slot(ceiling_mb: float = None, timeout: float = None):
+    """Hold while a page is rendered and OCR'd; over the ceiling, pages run one at a time."""
+    global _in_flight
+    _admit(ceiling_mb, timeout, take=True)
+    try:
+        yield
+    finally:
+        with _pages:
+            _in_flight -= 1
+            _pages.notify_all()
+
+
+_pages     = threading.Condition()
+_in_flight = 0          # pages inside page_slot, across every worker thread
+
+
+def _admit(ceiling_mb: float, timeout: float, take: bool):
+    global _in_flight
+    ceiling = (RSS_CEILING_MB if ceiling_mb is None else ceiling_mb) * 1024 * 1024
+    rss     = rss_bytes()
+    metrics.RSS_BYTES.set(rss)
+    over    = bool(ceiling) and rss >= ceiling
+    if over:
+        release()
+    with _pages:
+        if over and _in_flight:
+            with stage("memory_wait"):
+                deadline = time.perf_counter() + (RSS_WAIT_SEC if timeout is None else timeout)
+                while _in_flight and deadline > time.perf_counter():
+                    _pages.wait(deadline - time.perf_counter())
+        if take:
+            _in_flight += 1
+
+
+# ── Page spill ────────────────────────────────────────────────────────────────
+class PageSpill:
+    """Page results as NDJSON on disk — only the page being extracted stays in memory."""
+
+    def __init__(self, dir: str = SPILL_DIR):
+        fd, self.path = tempfile.mkstemp(prefix="pages_", suffix=".ndjson", dir=dir)
+        self._f = os.fdopen(fd, "w", encoding="utf-8")
+        self._n = 0
+
+    def append(self, page: dict):
+        self._f.write(json.dumps(page, ensure_ascii=False) + "\n")
+        self._n += 1
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        """Raw NDJSON lines — already serialized, so streaming never re-encodes."""
+        self._f.flush()
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                yield line.rstrip("\n")
+
+    def pages(self):
+        for line in self:
+            yield json.loads(line)
+
+    def close(self):
+        if not self._f.closed:
+            self._f.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
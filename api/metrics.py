@@ -0,0 +1,157 @@
+"""
+metrics.py - per-stage timing spans + Prometheus text exposition
+Usage:  with stage("rasterize"): ...
+Scrape: GET /metrics
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Seconds — covers a 5 ms regex pass up to a multi-minute scanned archive
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_lock = threading.Lock()
+_registry = []
+
+
+# ── Metric types ──────────────────────────────────────────────────────────────
+class Histogram:
+    def __init__(self, name: str, doc: str, label: str, buckets=BUCKETS):
+        self.name, self.doc, self.label, self.buckets = name, doc, label, buckets
+        self._series = {}   # label value → [bucket counts..., sum, count]
+        _registry.append(self)
+
+    def observe(self, value: str, seconds: float):
+        with _lock:
+            s = self._series.get(value)
+            if s is None:
+                s = self._series[value] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    s[i] += 1
+            s[-2] += seconds
+            s[-1] += 1
+
+    def render(self) -> list:
+        out = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for value, s in sorted(series.items()):
+            lbl = f'{self.label}="{value}"'
+            for i, bound in enumerate(self.buckets):
+                out.append(f'{self.name}_bucket{{{lbl},le="{bound}"}} {s[i]}')
+            out.append(f'{self.name}_bucket{{{lbl},le="+Inf"}} {s[-1]}')
+            out.append(f"{self.name}_sum{{{lbl}}} {s[-2]:.6f}")
+            out.append(f"{self.name}_count{{{lbl}}} {s[-1]}")
+        return out
+
+
+class Gauge:
+    def __init__(self, name: str, doc: str):
+        self.name, self.doc = name, doc
+        self.value = 0
+        _registry.append(self)
+
+    def inc(self, n: int = 1):
+        with _lock:
+            self.value += n
+
+    def dec(self, n: int = 1):
+        with _lock:
+            self.value -= n
+
+    def set(self, value):
+        with _lock:
+            self.value = value
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} gauge",
+                f"{self.name} {self.value}"]
+
+
+class Counter:
+    def __init__(self, name: str, doc: str, label: str):
+        self.name, self.doc, self.label = name, doc, label
+        self._series = {}   # label value → count
+        _registry.append(self)
+
+    def inc(self, value: str, n: int = 1):
+        with _lock:
+            self._series[value] = self._series.get(value, 0) + n
+
+    def get(self, value: str) -> int:
+        return self._series.get(value, 0)
+
+    def render(self) -> list:
+        out = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        with _lock:
+            series = dict(self._series)
+        for value, n in sorted(series.items()):
+            out.append(f'{self.name}{{{self.label}="{value}"}} {n}')
+        return out
+
+
+STAGE_SECONDS    = Histogram("ocr_stage_duration_seconds",
+                             "Time spent in each extraction pipeline stage", "stage")
+REQUEST_SECONDS  = Histogram("ocr_request_duration_seconds",
+                             "End-to-end /extract latency", "file_type")
+QUEUE_DEPTH      = Gauge("ocr_queue_depth", "Requests waiting for an extraction worker")
+IN_FLIGHT        = Gauge("ocr_requests_in_flight", "Requests currently being extracted")
+WORKERS          = Gauge("ocr_workers", "Size of the extraction worker pool")
+RSS_BYTES        = Gauge("ocr_process_rss_bytes", "Resident memory of the API process")
+NER_CACHE        = Counter("ocr_ner_cache_lookups_total",
+                           "NER line cache lookups by outcome (hit, disk_hit, miss)", "result")
+TEMPLATE_LOOKUPS = Counter("ocr_template_lookups_total",
+                           "Vendor template lookups by outcome (hit, miss)", "result")
+ROTATIONS        = Counter("ocr_page_rotations_total",
+                           "Pages turned upright before OCR, by clockwise angle", "angle")
+PREPROCESS_RUNS  = Counter("ocr_preprocess_runs_total",
+                           "Low-confidence pages re-checked by preprocessing, by outcome "
+                           "(clean, kept, discarded)", "result")
+PAGE_STORE_HITS  = Counter("ocr_page_store_lookups_total",
+                           "Stored page results looked up by fingerprint (hit, miss)", "result")
+
+
+# ── Spans ─────────────────────────────────────────────────────────────────────
+# Per-request accumulator; None when the caller did not ask for meta.timings
+_timings = ContextVar("ocr_timings", default=None)
+
+
+def observe(name: str, seconds: float):
+    STAGE_SECONDS.observe(name, seconds)
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+@contextmanager
+def collect():
+    """Accumulate stage seconds (summed across pages) into the yielded dict."""
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def rounded(timings: dict) -> dict:
+    return {k: round(v, 4) for k, v in timings.items()}
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,168 @@
+"""
+native.py - Structured native PDF text: one TextPage per page, lines with boxes and fonts
+Plain text, words (templates), the structured lines and label searches all come
+from the same TextPage, so MuPDF parses the page's content stream once; the
+costly find_tables (~50 ms a page, with its own TextPage) only runs on pages
+that look like they hold a table: a row of line-item column headings, ruled
+cells, or columns of aligned numbers (a continuation page whose table does not
+repeat its header).
+
+Label/value lookup works on the lines' geometry: the value of "Invoice No:" may
+sit to its right in another column, or on the line below — places the
+block-ordered plain text puts far away from the label.
+"""
+
+import re
+
+from api.parsers import ITEM_HEADER_HINTS
+
+SCANNED_THRESHOLD = 50   # native characters under which a PDF page is OCR'd as a scan
+ROW_OVERLAP       = 0.5  # share of the shorter line's height two lines must share to be one row
+BELOW_GAP         = 1.5  # how far below a label (in label heights) its value may start
+# Line-item column headings, as words lowercased with punctuation dropped ("S.No" → "sno")
+TABLE_HEADERS = frozenset(ITEM_HEADER_HINTS) | {
+    "items", "particulars", "product", "products", "goods", "services", "quantity", "units",
+    "unit", "uom", "sac", "price", "cost", "value", "total", "sno", "slno", "srno", "sl", "sr",
+    "discount", "disc", "mrp", "weight", "taxable",
+}
+_NON_WORD = re.compile(r"[^a-z]")
+_NUMBER   = re.compile(r"^\(?[₹$]?\d[\d,]*(\.\d+)?\)?%?$")
+ALIGN     = 3.0        # pt — numbers whose right edges are this close form one column
+NUM_ROWS  = 3          # a column of numbers this many rows long…
+NUM_COLS  = 2          # …this many times over reads as a table body
+RULES_MIN = 3          # rules both across and down the page needed for a grid
+
+
+def _columns(edges) -> int:
+    """Runs of NUM_ROWS or more rows among (x, row) edges lying within ALIGN of each other."""
+    columns = 0
+    rows, start = set(), None
+    for x, row in sorted(edges):
+        if start is None or x - start > ALIGN:
+            columns += len(rows) >= NUM_ROWS
+            rows, start = set(), x
+        rows.add(row)
+    return columns + (len(rows) >= NUM_ROWS)
+
+
+class Line:
+    __slots__ = ("text", "x0", "y0", "x1", "y1", "size", "bold")
+
+    def __init__(self, text, bbox, size, bold):
+        self.text = text
+        self.x0, self.y0, self.x1, self.y1 = bbox
+        self.size = size
+        self.bold = bold
+
+    def same_row(self, other) -> bool:
+        overlap = min(self.y1, other.y1) - max(self.y0, other.y0)
+        return overlap > ROW_OVERLAP * min(self.y1 - self.y0, other.y1 - other.y0)
+
+    def looks_like_label(self, label) -> bool:
+        # Forms set labels in one font and values in another
+        return self.text.endswith(":") or (label.bold and self.bold and self.size == label.size)
+
+
+class NativePage:
+    """A fitz.Page plus the single TextPage every native read of it goes through."""
+
+    def __init__(self, page):
+        self.page      = page
+        self.textpage  = page.get_textpage()
+        self._words    = None
+        self._lines    = None
+        self._drawings = None
+
+    def text(self) -> str:
+        return self.page.get_text("text", textpage=self.textpage)
+
+    def words(self) -> list:
+        if self._words is None:
+            self._words = self.page.get_text("words", textpage=self.textpage)
+        return self._words
+
+    def has_item_table(self) -> bool:
+        """Two or more different line-item column headings side by side on one row."""
+        hits = []
+        for x0, y0, x1, y1, word, *_ in self.words():
+            term = _NON_WORD.sub("", word.lower())
+            if term in TABLE_HEADERS:
+                hits.append((term, y0, y1))
+        return any(a != b and min(a1, b1) - max(a0, b0) > ROW_OVERLAP * (a1 - a0)
+                   for i, (a, a0, a1) in enumerate(hits) for b, b0, b1 in hits[i + 1:])
+
+    def has_number_columns(self) -> bool:
+        """NUM_COLS columns of NUM_ROWS or more numbers, left- or right-aligned — a table body."""
+        numbers = [(x0, x1, round(y0)) for x0, y0, x1, y1, word, *_ in self.words()
+                   if _NUMBER.match(word)]
+        return any(_columns((edge[side], edge[2]) for edge in numbers) >= NUM_COLS
+                   for side in (0, 1))
+
+    def drawings(self) -> list:
+        if self._drawings is None:
+            self._drawings = self.page.get_cdrawings()
+        return self._drawings
+
+    def has_ruling(self) -> bool:
+        """Cell borders or grid lines — drawn or filled — running both across and down."""
+        across = down = 0
+        for path in self.drawings():
+            for item in path["items"]:
+                if item[0] == "re":
+                    x0, y0, x1, y1 = item[1]
+                    across += 2 * (x1 - x0 > 8)
+                    down   += 2 * (y1 - y0 > 8)
+                elif item[0] == "l":
+                    (x0, y0), (x1, y1) = item[1], item[2]
+                    across += abs(y1 - y0) < 1 and abs(x1 - x0) > 8
+                    down   += abs(x1 - x0) < 1 and abs(y1 - y0) > 8
+        return across >= RULES_MIN and down >= RULES_MIN
+
+    def may_have_table(self) -> bool:
+        """Worth a find_tables: a heading row, or a headerless table's grid or number columns.
+
+        find_tables builds cells from the page's vector paths only, so without a
+        heading row a page with no drawings has nothing for it to find.
+        """
+        if self.has_item_table():
+            return True
+        return bool(self.drawings()) and (self.has_ruling() or self.has_number_columns())
+
+    def lines(self) -> list:
+        """Text lines in reading order, each with its box, font size and boldness."""
+        if self._lines is None:
+            import fitz
+            self._lines = []
+            for block in self.page.get_text("dict", textpage=self.textpage)["blocks"]:
+                for line in block.get("lines", ()):
+                    spans = [s for s in line["spans"] if s["text"].strip()]
+                    if not spans:
+                        continue
+                    text = " ".join("".join(s["text"] for s in line["spans"]).split())
+                    main = max(spans, key=lambda s: len(s["text"]))
+                    self._lines.append(Line(text, line["bbox"], round(main["size"], 1),
+                                            bool(main["flags"] & fitz.TEXT_FONT_BOLD)))
+        return self._lines
+
+    def label_snippets(self, pattern: str) -> str:
+        """Each line matching pattern, its row neighbours and the value line under it.
+
+        One "label value" line per hit — the shape the field regexes expect — so a
+        field's regex fallback runs over this instead of the block-ordered text.
+        """
+        lines, out = self.lines(), []
+        for label in lines:
+            if not re.search(pattern, label.text, re.IGNORECASE):
+                continue
+            right = sorted((l for l in lines if l is not label and l.x0 >= label.x1 - 2
+                            and label.same_row(l)), key=lambda l: l.x0)
+            if right and not right[0].looks_like_label(label):
+                out.append(f"{label.text} {right[0].text}")
+            height = label.y1 - label.y0
+            below  = [l for l in lines if label.y1 - 1 <= l.y0 <= label.y1 + BELOW_GAP * height
+                      and l.x0 < label.x1 and l.x1 > label.x0]
+            if below:
+                value = min(below, key=lambda l: l.y0)
+                if not value.looks_like_label(label):
+                    out.append(f"{label.text}\n{value.text}")
+        return "\n".join(out)
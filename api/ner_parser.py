@@ -5,45 +5,263 @@ ner_parser.py - spaCy NER based document field extractor
 import re
 import spacy
 import os
+import json, sqlite3, threading
+from collections import OrderedDict
 
-MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "models", "ocr_ner_model")
-_nlp = None
+from api import metrics
+from api.metrics import stage
 
-def load_model():
-    global _nlp
-    if _nlp is None:
-        if os.path.exists(MODEL_PATH):
-            _nlp = spacy.load(MODEL_PATH)
+MODEL_DIR  = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "models"))
+MODEL_PATH = os.path.join(MODEL_DIR, "ocr_ner_model")
+
+# "default" = models/ocr_ner_model, "fast" = models/ocr_ner_model_fast (see ner_trainer)
+MODEL_VARIANT = os.getenv("NER_MODEL_VARIANT", "default")
+# Route each doc type to its own pruned component when one has been trained
+NER_ROUTING   = os.getenv("NER_ROUTING", "on").lower() != "off"
+_models   = {}   # (variant, doc_type or None) → nlp
+_versions = {}   # id(nlp) → "<model dir>@<meta version>" — line cache namespace
+
+# Line text → entities memo; vendor headers, GSTINs and bank details repeat verbatim
+NER_CACHE_SIZE   = int(os.getenv("NER_CACHE_SIZE", "20000"))     # lines; 0 disables the cache
+NER_CACHE_DB     = os.getenv("NER_CACHE_DB")                      # sqlite file shared by workers
+NER_CACHE_DB_MAX = int(os.getenv("NER_CACHE_DB_MAX", "500000"))   # rows kept in the sqlite tier
+
+# Labels FIELD_SPECS actually reads — the pruned set per doc type
+DOC_TYPE_LABELS = {
+    "invoice":        ["INVOICE_NO", "DATE", "VENDOR", "TOTAL_AMOUNT", "GST_AMOUNT"],
+    "purchase_order": ["PO_NUMBER", "DATE", "DELIVERY_DATE", "VENDOR", "PAYMENT_TERMS",
+                       "TOTAL_AMOUNT", "GST_AMOUNT"],
+    "resume":         ["PERSON", "EMAIL", "PHONE", "SCORE", "JOB_TITLE", "ORGANIZATION",
+                       "DEGREE", "INSTITUTION"],
+    "id_card":        ["PERSON", "EMPLOYEE_ID", "DESIGNATION", "DEPARTMENT", "VALIDITY",
+                       "BLOOD_GROUP"],
+}
+
+
+def model_path(variant: str = "default", doc_type: str = None) -> str:
+    name = "ocr_ner_model"
+    if variant and variant != "default":
+        name += f"_{variant}"
+    if doc_type:
+        name += f"_{doc_type}"
+    return os.path.join(MODEL_DIR, name)
+
+
+def load_model(variant: str = None):
+    variant = variant or MODEL_VARIANT
+    key = (variant, None)
+    if key not in _models:
+        path = model_path(variant)
+        if os.path.exists(path):
+            _models[key] = _load(path)
         else:
             raise FileNotFoundError(
-                f"NER model not found at {MODEL_PATH}\n"
-                "Run: python api/ner_trainer.py"
+                f"NER model not found at {path}\n"
+                f"Run: python -m api.ner_trainer --variant {variant}"
             )
-    return _nlp
+    return _models[key]
 
 
-def extract_with_ner(text: str, doc_type: str) -> dict:
-    nlp = load_model()
-    all_entities = []
+def load_routed_model(doc_type: str, variant: str = None):
+    """The doc type's own component (only its DOC_TYPE_LABELS) if trained, else the all-label model."""
+    variant = variant or MODEL_VARIANT
+    key = (variant, doc_type)
+    if key not in _models:
+        path = model_path(variant, doc_type)
+        if NER_ROUTING and doc_type in DOC_TYPE_LABELS and os.path.exists(path):
+            _models[key] = _load(path)
+        else:
+            _models[key] = load_model(variant)
+    return _models[key]
 
-    for line in text.split("\n"):
-        line = line.strip()
-        if not line:
-            continue
-        doc = nlp(line)
-        for ent in doc.ents:
-            all_entities.append((ent.text, ent.label_))
-
-    if doc_type == "invoice":
-        return _map_invoice_fields(all_entities, text)
-    elif doc_type == "purchase_order":
-        return _map_po_fields(all_entities, text)
-    elif doc_type == "resume":
-        return _map_resume_fields(all_entities, text)
-    elif doc_type == "id_card":
-        return _map_id_fields(all_entities, text)
+
+# ── Extraction strategies ─────────────────────────────────────────────────────
+# ner_first   — NER over every line, regex fallback for fields NER missed (original)
+# regex_first — regex first; NER only on lines near the labels of unresolved fields
+# ner_missing — regex first; one full NER pass only if any field is still unresolved
+STRATEGIES          = ("ner_first", "regex_first", "ner_missing")
+EXTRACTION_STRATEGY = os.getenv("EXTRACTION_STRATEGY", "ner_first")
+NEAR_WINDOW         = 2     # lines after a label line that may carry its value
+HEAD_LINES          = 3     # where a resume/ID name lives
+
+
+def _load(path: str):
+    with stage("ner_model_load"):
+        nlp = spacy.load(path)
+    _versions[id(nlp)] = model_version(path, nlp.meta)
+    return nlp
+
+
+def model_version(path: str, meta: dict) -> str:
+    """ner_trainer stamps meta.json's version; older models fall back to its mtime."""
+    version = meta.get("version", "0.0.0")
+    if version == "0.0.0":
+        version = str(int(os.path.getmtime(os.path.join(path, "meta.json"))))
+    return f"{os.path.basename(os.path.normpath(path))}@{version}"
+
+
+# ── Line cache ────────────────────────────────────────────────────────────────
+class LineCache:
+    """Bounded LRU of (model version, line) → entity tuples, with an optional sqlite tier."""
+
+    def __init__(self, size: int, db_path: str = None, db_max: int = NER_CACHE_DB_MAX):
+        self.size    = size
+        self.db_max  = db_max
+        self._mem    = OrderedDict()
+        self._lock   = threading.Lock()
+        self._db     = None
+        self._writes = 0
+        if db_path and size:
+            # One connection shared by the worker threads; other processes open their own
+            self._db = sqlite3.connect(db_path, timeout=5.0, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS ner_lines ("
+                             "model TEXT, line TEXT, ents TEXT, PRIMARY KEY (model, line))")
+
+    def get(self, model: str, line: str):
+        key = (model, line)
+        with self._lock:
+            ents = self._mem.get(key)
+            if ents is not None:
+                self._mem.move_to_end(key)
+                metrics.NER_CACHE.inc("hit")
+                return ents
+            if self._db is not None:
+                row = self._db.execute("SELECT ents FROM ner_lines WHERE model = ? AND line = ?",
+                                       key).fetchone()
+                if row:
+                    ents = tuple(tuple(e) for e in json.loads(row[0]))
+                    self._remember(key, ents)
+                    metrics.NER_CACHE.inc("disk_hit")
+                    return ents
+        metrics.NER_CACHE.inc("miss")
+        return None
+
+    def put(self, model: str, line: str, ents: tuple):
+        key = (model, line)
+        with self._lock:
+            self._remember(key, ents)
+            if self._db is not None:
+                try:
+                    self._db.execute("INSERT OR REPLACE INTO ner_lines VALUES (?, ?, ?)",
+                                     (model, line, json.dumps(ents)))
+                    self._writes += 1
+                    if self._writes % 1000 == 0:
+                        # Oldest rows out first — keeps the shared file bounded
+                        self._db.execute("DELETE FROM ner_lines WHERE rowid <= "
+                                         "(SELECT MAX(rowid) FROM ner_lines) - ?", (self.db_max,))
+                    self._db.commit()
+                except sqlite3.OperationalError:
+                    pass   # database locked by another worker — the memory tier still has it
+
+    def _remember(self, key, ents):
+        self._mem[key] = ents
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.size:
+            self._mem.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+
+    def __len__(self):
+        return len(self._mem)
+
+
+line_cache = LineCache(NER_CACHE_SIZE, NER_CACHE_DB)
+
+
+def extract_with_ner(text: str, doc_type: str, strategy: str = None, sources: dict = None,
+                     lookup=None) -> dict:
+    """Map text to doc_type's fields. If sources is given it receives field → "ner" | "regex" | None.
+
+    lookup(label pattern) → "label value" snippets from the page layout (native.NativePage);
+    a field's regex runs over them when it found nothing in text (source "layout").
+    """
+    strategy = strategy or EXTRACTION_STRATEGY
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {strategy}. Choose from {', '.join(STRATEGIES)}")
+    nlp   = load_routed_model(doc_type)
+    lines = [l.strip() for l in text.split("\n") if l.strip()]
+    specs = FIELD_SPECS.get(doc_type)
+    src   = {} if sources is None else sources
+
+    if specs is None:
+        with stage("ner"):
+            entities = _ner_entities(nlp, lines)
+        fields = _map_general_fields(entities)
+        src.update(dict.fromkeys(fields, "ner"))
+        return fields
+
+    fields = {}
+    if strategy == "ner_first":
+        with stage("ner"):
+            entities = _ner_entities(nlp, lines)
+        # Field mapping — NER hits first, regex fallback for whatever is missing
+        with stage("regex_fallback"):
+            for f in specs:
+                fields[f.name], src[f.name] = _from_ner(f, entities), "ner"
+                if not fields[f.name] and f.fallback:
+                    fields[f.name], src[f.name] = _fallback(f, text, lookup)
     else:
-        return _map_general_fields(all_entities)
+        with stage("regex_fallback"):
+            for f in specs:
+                fields[f.name], src[f.name] = _fallback(f, text, lookup)
+        missing = [f for f in specs if not fields[f.name]]
+        if missing:
+            ner_lines = lines if strategy == "ner_missing" else _lines_near(lines, missing)
+            with stage("ner"):
+                entities = _ner_entities(nlp, ner_lines)
+            for f in missing:
+                fields[f.name], src[f.name] = _from_ner(f, entities), "ner"
+
+    for f in specs:
+        if not fields[f.name]:
+            src[f.name] = None
+            if f.many:
+                fields[f.name] = []
+    if doc_type in ("invoice", "purchase_order"):
+        fields["items"] = []
+    return fields
+
+
+def _fallback(f, text, lookup):
+    value = f.fallback(text) if f.fallback else None
+    if value or lookup is None or not f.fallback or f.near in (None, HEAD):
+        return value, "regex"
+    value = f.fallback(lookup(f.near))
+    return value, "layout" if value else "regex"
+
+
+def _ner_entities(nlp, lines):
+    version  = _versions.get(id(nlp)) if line_cache.size else None
+    entities = []
+    for line in lines:
+        ents = line_cache.get(version, line) if version else None
+        if ents is None:
+            ents = tuple((ent.text, ent.label_) for ent in nlp(line).ents)
+            if version:
+                line_cache.put(version, line, ents)
+        entities.extend(ents)
+    return entities
+
+
+def _from_ner(field, entities):
+    return _all(entities, field.label) if field.many else _first(entities, field.label)
+
+
+def _lines_near(lines, fields):
+    """Lines matching an unresolved field's label, plus the value lines that follow."""
+    keep = set()
+    for f in fields:
+        if f.near == HEAD:
+            keep.update(range(min(HEAD_LINES, len(lines))))
+            continue
+        window = NEAR_WINDOW * 4 if f.many else NEAR_WINDOW
+        for i, line in enumerate(lines):
+            if re.search(f.near, line, re.IGNORECASE):
+                keep.update(range(i, min(i + window + 1, len(lines))))
+    return [lines[i] for i in sorted(keep)]
 
 
 def _first(entities, label):
@@ -60,94 +278,89 @@ def _regex(text, pattern):
     return m.group(1).strip() if m else None
 
 
-def _map_invoice_fields(entities, text):
-    invoice_no  = _first(entities, "INVOICE_NO") or _regex(text, r"Invoice\s*(?:No|Number)[:\s#]*([A-Za-z0-9/\-]+)")
-    date_val    = _first(entities, "DATE")        or _regex(text, r"(?:Invoice\s*)?Date[:\s]*(\d{1,2}[\s\-][A-Za-z]{3,}[\s\-]\d{4})")
-    vendor      = _first(entities, "VENDOR")      or _regex(text, r"(?:Bill\s*To|Vendor)[:\s]*\n?([A-Za-z][\w\s\.,&]+(?:Ltd|Pvt|Inc|Co)\.?)")
-    total       = _first(entities, "TOTAL_AMOUNT") or _regex(text, r"Grand\s*Total[:\s\n]*(?:Rs\.?|INR)?\s*([\d,]+\.?\d*)")
-    gst         = _first(entities, "GST_AMOUNT")  or _regex(text, r"(?:IGST|CGST|GST)[^:\n]*[:\s]*(?:Rs\.?)?\s*([\d,]+\.?\d*)")
-    return {
-        "invoice_number": invoice_no,
-        "date":           date_val,
-        "vendor":         vendor,
-        "total_amount":   total,
-        "gst":            gst,
-        "items":          [],
-    }
-
-
-def _map_po_fields(entities, text):
-    po_num   = _first(entities, "PO_NUMBER")    or _regex(text, r"PO[-\s]*(?:Number|No)?[:\s]*\n?(PO[-\w]+)")
-    date_val = _first(entities, "DATE")          or _regex(text, r"PO\s*Date[:\s]*\n?(\d{1,2}[\s\-][A-Za-z]{3,}[\s\-]\d{4})")
-    delivery = _first(entities, "DELIVERY_DATE") or _regex(text, r"Delivery\s*Date[:\s]*\n?(\d{1,2}[\s\-][A-Za-z]{3,}[\s\-]\d{4})")
-    payment  = _first(entities, "PAYMENT_TERMS") or _regex(text, r"Payment\s*Terms[:\s]*\n?([^\n]{3,30})")
-    total    = _first(entities, "TOTAL_AMOUNT")  or _regex(text, r"Grand\s*Total[:\s\n]*(?:Rs\.?)[\s\n]*([\d,]+\.?\d*)")
-    gst      = _first(entities, "GST_AMOUNT")    or _regex(text, r"GST[^:\n]*[:\s]*(?:Rs\.?)\s*([\d,]+\.?\d*)")
+# ── Field specs ───────────────────────────────────────────────────────────────
+# name, NER label, regex/rule fallback (text → value), label-line pattern for
+# regex_first NER windows, many (list of every NER hit)
+class Field:
+    __slots__ = ("name", "label", "fallback", "near", "many")
 
+    def __init__(self, name, label, fallback=None, near=None, many=False):
+        self.name, self.label, self.fallback, self.near, self.many = name, label, fallback, near, many
+
+
+HEAD = "head"   # near= value for fields found at the top of the document
+
+
+def _rx(pattern):
+    return lambda text: _regex(text, pattern)
+
+
+def _po_vendor(text):
     # Vendor — skip label lines
-    vendor = _first(entities, "VENDOR")
-    if not vendor:
-        SKIP = re.compile(r"^(po |invoice|date|delivery|payment|shipping|gstin|gst)", re.IGNORECASE)
-        lines = [l.strip() for l in text.split("\n") if l.strip()]
-        for i, line in enumerate(lines):
-            if re.search(r"vendor\s*:", line, re.IGNORECASE):
-                for nxt in lines[i+1:i+6]:
-                    if SKIP.search(nxt) or nxt.endswith(":"):
-                        continue
-                    if re.search(r"[A-Za-z]{3,}", nxt) and len(nxt) > 4:
-                        vendor = nxt
-                        break
-                break
-
-    return {
-        "po_number":      po_num,
-        "date":           date_val,
-        "delivery_date":  delivery,
-        "vendor":         vendor,
-        "payment_terms":  payment,
-        "total_amount":   total,
-        "gst":            gst,
-        "items":          [],
-    }
-
-
-def _map_resume_fields(entities, text):
-    name  = _first(entities, "PERSON")
-    email = _first(entities, "EMAIL")   or _regex(text, r"[\w.\-]+@[\w.\-]+\.\w+")
-    phone = _first(entities, "PHONE")   or _regex(text, r"(?:\+91[\s\-]?)?[6-9]\d{4}[\s\-]?\d{5}")
-    score = _first(entities, "SCORE")   or _regex(text, r"CGPA[:\s]*([\d.]+/\d+)")
+    SKIP = re.compile(r"^(po |invoice|date|delivery|payment|shipping|gstin|gst)", re.IGNORECASE)
+    lines = [l.strip() for l in text.split("\n") if l.strip()]
+    for i, line in enumerate(lines):
+        if re.search(r"vendor\s*:", line, re.IGNORECASE):
+            for nxt in lines[i+1:i+6]:
+                if SKIP.search(nxt) or nxt.endswith(":"):
+                    continue
+                if re.search(r"[A-Za-z]{3,}", nxt) and len(nxt) > 4:
+                    return nxt
+            break
+    return None
+
 
+def _resume_name(text):
     # Name fallback — first line of resume
-    if not name:
-        lines = [l.strip() for l in text.split("\n") if l.strip()]
-        if lines and re.match(r"^[A-Z][a-z]+\s+[A-Z][a-z]+", lines[0]):
-            name = lines[0]
-
-    return {
-        "name":          name,
-        "email":         email,
-        "phone":         phone,
-        "job_title":     _first(entities, "JOB_TITLE"),
-        "organizations": _all(entities, "ORGANIZATION"),
-        "degrees":       _all(entities, "DEGREE"),
-        "institutions":  _all(entities, "INSTITUTION"),
-        "score":         score,
-    }
-
-
-def _map_id_fields(entities, text):
-    def after_label(label):
+    lines = [l.strip() for l in text.split("\n") if l.strip()]
+    if lines and re.match(r"^[A-Z][a-z]+\s+[A-Z][a-z]+", lines[0]):
+        return lines[0]
+    return None
+
+
+def _after_label(label):
+    def find(text):
         m = re.search(label + r"\s*:\s*\n([^\n]+)", text, re.IGNORECASE)
         return m.group(1).strip() if m else None
+    return find
+
 
-    return {
-        "name":           _first(entities, "PERSON")      or after_label(r"Employee\s*Name"),
-        "employee_id":    _first(entities, "EMPLOYEE_ID") or after_label(r"Employee\s*ID"),
-        "designation":    _first(entities, "DESIGNATION") or after_label(r"Designation"),
-        "department":     _first(entities, "DEPARTMENT")  or after_label(r"Department"),
-        "valid_until":    _first(entities, "VALIDITY")    or after_label(r"Valid\s*Until"),
-        "blood_group":    _first(entities, "BLOOD_GROUP") or after_label(r"Blood\s*Group"),
-    }
+FIELD_SPECS = {
+    "invoice": [
+        Field("invoice_number", "INVOICE_NO",   _rx(r"Invoice\s*(?:No|Number)[:\s#]*([A-Za-z0-9/\-]+)"), r"invoice\s*(?:no|number)"),
+        Field("date",           "DATE",         _rx(r"(?:Invoice\s*)?Date[:\s]*(\d{1,2}[\s\-][A-Za-z]{3,}[\s\-]\d{4})"), r"date"),
+        Field("vendor",         "VENDOR",       _rx(r"(?:Bill\s*To|Vendor)[:\s]*\n?([A-Za-z][\w\s\.,&]+(?:Ltd|Pvt|Inc|Co)\.?)"), r"bill\s*to|vendor"),
+        Field("total_amount",   "TOTAL_AMOUNT", _rx(r"Grand\s*Total[:\s\n]*(?:Rs\.?|INR)?\s*([\d,]+\.?\d*)"), r"total"),
+        Field("gst",            "GST_AMOUNT",   _rx(r"(?:IGST|CGST|GST)[^:\n]*[:\s]*(?:Rs\.?)?\s*([\d,]+\.?\d*)"), r"gst"),
+    ],
+    "purchase_order": [
+        Field("po_number",     "PO_NUMBER",     _rx(r"PO[-\s]*(?:Number|No)?[:\s]*\n?(PO[-\w]+)"), r"po[-\s]*(?:number|no)"),
+        Field("date",          "DATE",          _rx(r"PO\s*Date[:\s]*\n?(\d{1,2}[\s\-][A-Za-z]{3,}[\s\-]\d{4})"), r"date"),
+        Field("delivery_date", "DELIVERY_DATE", _rx(r"Delivery\s*Date[:\s]*\n?(\d{1,2}[\s\-][A-Za-z]{3,}[\s\-]\d{4})"), r"delivery"),
+        Field("vendor",        "VENDOR",        _po_vendor, r"vendor"),
+        Field("payment_terms", "PAYMENT_TERMS", _rx(r"Payment\s*Terms[:\s]*\n?([^\n]{3,30})"), r"payment"),
+        Field("total_amount",  "TOTAL_AMOUNT",  _rx(r"Grand\s*Total[:\s\n]*(?:Rs\.?)[\s\n]*([\d,]+\.?\d*)"), r"total"),
+        Field("gst",           "GST_AMOUNT",    _rx(r"GST[^:\n]*[:\s]*(?:Rs\.?)\s*([\d,]+\.?\d*)"), r"gst"),
+    ],
+    "resume": [
+        Field("name",          "PERSON",       _resume_name, HEAD),
+        Field("email",         "EMAIL",        _rx(r"([\w.\-]+@[\w.\-]+\.\w+)"), r"@|e-?mail"),
+        Field("phone",         "PHONE",        _rx(r"((?:\+91[\s\-]?)?[6-9]\d{4}[\s\-]?\d{5})"), r"phone|mobile|\+91|\d{5}"),
+        Field("job_title",     "JOB_TITLE",    None, HEAD),
+        Field("organizations", "ORGANIZATION", None, r"experience|employment|work", many=True),
+        Field("degrees",       "DEGREE",       None, r"education|qualification", many=True),
+        Field("institutions",  "INSTITUTION",  None, r"education|qualification|university|college", many=True),
+        Field("score",         "SCORE",        _rx(r"CGPA[:\s]*([\d.]+/\d+)"), r"cgpa|gpa|percentage"),
+    ],
+    "id_card": [
+        Field("name",        "PERSON",      _after_label(r"Employee\s*Name"), r"name"),
+        Field("employee_id", "EMPLOYEE_ID", _after_label(r"Employee\s*ID"),   r"employee\s*id"),
+        Field("designation", "DESIGNATION", _after_label(r"Designation"),      r"designation"),
+        Field("department",  "DEPARTMENT",  _after_label(r"Department"),       r"department"),
+        Field("valid_until", "VALIDITY",    _after_label(r"Valid\s*Until"),    r"valid"),
+        Field("blood_group", "BLOOD_GROUP", _after_label(r"Blood\s*Group"),    r"blood"),
+    ],
+}
 
 
 def _map_general_fields(entities):
@@ -156,4 +369,4 @@ def _map_general_fields(entities):
         key = label.lower()
         if key not in result:
             result[key] = text
-    return result
\ No newline at end of file
+    return result
@@ -1,13 +1,28 @@
 """
 ner_trainer.py - spaCy NER Model Trainer for OCR documents
 Train: python -m api.ner_trainer
-Output: models/ocr_ner_model
+       python -m api.ner_trainer --train labelled.jsonl [--dev dev.jsonl] [--patience 5] [--workers 8]
+       python -m api.ner_trainer --variant fast [--doc-type invoice | --all-doc-types]
+Output: models/ocr_ner_model[_<variant>][_<doc_type>]
+
+External corpora are JSONL, one example per line, streamed from disk:
+    {"text": "Invoice No: INV/2025/0118", "entities": [[12, 25, "INVOICE_NO"]]}
+They are serialized once to sharded .spacy DocBin files under <output>_corpus
+(tokenized on a process pool, one shard per task) and training reads the shards
+back epoch by epoch. The nlp.update loop itself runs in one process — spaCy's
+CPU training has no data-parallel mode; minibatching is where its speed comes from.
 """
 
 import spacy
 from spacy.tokens import DocBin
 from spacy.training import Example
-import json, os, random
+from spacy.util import minibatch
+from thinc.api import compounding
+import argparse, collections, glob, itertools, json, os, random, time, zlib
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from api.ner_parser import DOC_TYPE_LABELS, model_path
 
 # ── Training Data ─────────────────────────────────────────────────────────────
 TRAIN_DATA = [
@@ -68,41 +83,269 @@ TRAIN_DATA = [
     ("Date of Joining: 15 June 2022", {"entities": [(17, 29, "DATE")]}),
 ]
 
-def train_ner_model(output_dir="models/ocr_ner_model", n_iter=30):
-    """Train spaCy NER model on OCR document entities."""
+SHARD_SIZE = 5000   # docs per .spacy file — bounds memory while converting/reading
+SEED       = 0
+
+# ── Model variants ────────────────────────────────────────────────────────────
+# "fast": narrower/shallower hash-embed CNN and a smaller state layer, and no
+# vocab/vectors on disk — a blank-en model never uses static vectors anyway
+FAST_NER_MODEL = {
+    "@architectures":     "spacy.TransitionBasedParser.v2",
+    "state_type":         "ner",
+    "extra_state_tokens": False,
+    "hidden_width":       32,
+    "maxout_pieces":      2,
+    "use_upper":          True,
+    "nO":                 None,
+    "tok2vec": {
+        "@architectures":     "spacy.HashEmbedCNN.v2",
+        "pretrained_vectors": None,
+        "width":              64,
+        "depth":              2,
+        "embed_size":         1000,
+        "window_size":        1,
+        "maxout_pieces":      2,
+        "subword_features":   True,
+    },
+}
+VARIANTS = {
+    "default": {"model": None,           "vectors": True},
+    "fast":    {"model": FAST_NER_MODEL, "vectors": False},
+}
+
+
+def prune_labels(examples, labels):
+    """Keep only entities in labels; lines left without any stay as negatives."""
+    keep = set(labels)
+    for text, ann in examples:
+        yield text, {"entities": [e for e in ann["entities"] if e[2] in keep]}
+
+
+# ── Corpus ────────────────────────────────────────────────────────────────────
+def iter_jsonl(path: str):
+    """Stream (text, {"entities": [...]}) from a JSONL file without loading it whole."""
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            if isinstance(row, list):           # spaCy v2 style: [text, {"entities": ...}]
+                text, ann = row
+            else:
+                text, ann = row["text"], {"entities": row.get("entities", [])}
+            yield text, {"entities": [tuple(e) for e in ann["entities"]]}
+
+
+def _is_dev(text: str, dev_ratio: float) -> bool:
+    # Hash split — stable across runs and needs no second pass over a streamed corpus
+    return dev_ratio > 0 and zlib.crc32(text.encode("utf-8")) % 1000 < dev_ratio * 1000
+
+
+def _source_id(path: str, dev_ratio: float, doc_type: str = None):
+    return [os.path.abspath(path), os.path.getmtime(path), dev_ratio, doc_type] if path else None
+
+
+def load_corpus_stats(out_dir: str, source) -> dict:
+    """Stats of an existing conversion of the same source file, else None."""
+    try:
+        with open(os.path.join(out_dir, "labels.json")) as f:
+            stats = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return stats if source and stats.get("source") == source else None
+
+
+def _convert(nlp, chunk: list, dev_ratio: float):
+    """One shard of (text, annotations) → (train DocBin bytes, dev DocBin bytes, stats)."""
+    bins  = {"train": DocBin(), "dev": DocBin()}
+    stats = {"train": 0, "dev": 0, "skipped_spans": 0, "labels": set()}
+    for text, ann in chunk:
+        doc, spans = nlp.make_doc(text), []
+        for start, end, label in ann["entities"]:
+            span = doc.char_span(start, end, label=label, alignment_mode="contract")
+            if span is None:
+                stats["skipped_spans"] += 1
+                continue
+            spans.append(span)
+        try:
+            doc.ents = spans
+        except ValueError:                        # overlapping spans — the doc is dropped
+            stats["skipped_spans"] += len(spans)
+            continue
+        stats["labels"].update(span.label_ for span in spans)
+        split = "dev" if _is_dev(text, dev_ratio) else "train"
+        bins[split].add(doc)
+        stats[split] += 1
+    return bins["train"].to_bytes(), bins["dev"].to_bytes(), stats
+
+
+_tokenizers = {}   # lang → blank pipeline, one per worker process
+
+
+def _convert_in_worker(lang: str, chunk: list, dev_ratio: float):
+    if lang not in _tokenizers:
+        _tokenizers[lang] = spacy.blank(lang)
+    return _convert(_tokenizers[lang], chunk, dev_ratio)
+
+
+def build_docbins(examples, nlp, out_dir: str, dev_ratio: float = 0.0, source=None,
+                  workers: int = 1) -> dict:
+    """Serialize (text, annotations) pairs once into sharded train/dev DocBin files.
+
+    The stream is cut into SHARD_SIZE chunks; with workers > 1 and more than one
+    chunk, they are tokenized on a process pool and written back in order.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    for old in glob.glob(os.path.join(out_dir, "*.spacy")):
+        os.remove(old)
+
+    shards = {"train": 0, "dev": 0}
+    stats  = {"train": 0, "dev": 0, "skipped_spans": 0, "labels": set(), "source": source}
+
+    def write(result):
+        for split, data in zip(("train", "dev"), result[:2]):
+            if result[2][split]:
+                with open(os.path.join(out_dir, f"{split}-{shards[split]:04d}.spacy"), "wb") as f:
+                    f.write(data)
+                shards[split] += 1
+        for key in ("train", "dev", "skipped_spans"):
+            stats[key] += result[2][key]
+        stats["labels"] |= result[2]["labels"]
+
+    examples = iter(examples)
+    chunks   = iter(lambda: list(itertools.islice(examples, SHARD_SIZE)), [])
+    first    = next(chunks, [])
+    if workers <= 1 or len(first) < SHARD_SIZE:
+        for chunk in itertools.chain([first], chunks):
+            write(_convert(nlp, chunk, dev_ratio))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+            pending = collections.deque()
+            for chunk in itertools.chain([first], chunks):
+                pending.append(pool.submit(_convert_in_worker, nlp.lang, chunk, dev_ratio))
+                if len(pending) >= 2 * workers:           # bounds chunks held in memory
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+
+    stats["labels"] = sorted(stats["labels"])
+    with open(os.path.join(out_dir, "labels.json"), "w") as f:
+        json.dump(stats, f, indent=2)
+    return stats
+
+
+def read_docbins(nlp, out_dir: str, split: str, shuffle: bool = False, rng=None):
+    """Yield Examples shard by shard; shard order and docs within a shard are shuffled."""
+    paths = sorted(glob.glob(os.path.join(out_dir, f"{split}-*.spacy")))
+    if shuffle:
+        rng.shuffle(paths)
+    for path in paths:
+        docs = list(DocBin().from_disk(path).get_docs(nlp.vocab))
+        if shuffle:
+            rng.shuffle(docs)
+        for doc in docs:
+            yield Example(nlp.make_doc(doc.text), doc)
+
+
+# ── Training ──────────────────────────────────────────────────────────────────
+def prepare_corpus(nlp, corpus_dir: str, train_path=None, dev_path=None, dev_ratio=0.0,
+                   doc_type=None, workers: int = 1):
+    """Convert train (and dev) JSONL to DocBin shards, reusing an up-to-date conversion."""
+    def load(path):
+        examples = iter_jsonl(path) if path else list(TRAIN_DATA)
+        return prune_labels(examples, DOC_TYPE_LABELS[doc_type]) if doc_type else examples
+
+    source = _source_id(train_path, dev_ratio, doc_type)
+    stats  = load_corpus_stats(corpus_dir, source)
+    if stats is None:
+        stats = build_docbins(load(train_path), nlp, corpus_dir, dev_ratio, source, workers)
+    dev_dir = corpus_dir
+    if dev_path:
+        dev_dir   = os.path.join(corpus_dir, "dev")
+        dev_src   = _source_id(dev_path, 1.0, doc_type)
+        dev_stats = load_corpus_stats(dev_dir, dev_src) or \
+            build_docbins(load(dev_path), nlp, dev_dir, 1.0, dev_src, workers)
+        stats = dict(stats, dev=dev_stats["dev"],
+                     labels=sorted(set(stats["labels"]) | set(dev_stats["labels"])))
+    return stats, dev_dir
+
+
+def train_ner_model(output_dir=None, n_iter=30, train_path=None, dev_path=None,
+                    dev_ratio=None, patience=5, dropout=0.3, corpus_dir=None,
+                    variant="default", doc_type=None, workers=1):
+    """Train spaCy NER model on OCR document entities.
+
+    With a dev set (dev_path, or dev_ratio of the train corpus) the best epoch
+    by ents_f is kept and training stops after `patience` epochs without gain.
+    variant picks the architecture (VARIANTS); doc_type prunes the label set
+    to DOC_TYPE_LABELS[doc_type]. workers processes convert the corpus to DocBin.
+    """
+    rng  = random.Random(SEED)
+    spec = VARIANTS[variant]
+    output_dir = output_dir or model_path(variant, doc_type)
+    spacy.util.fix_random_seed(SEED)
 
     # Create blank English model
     nlp = spacy.blank("en")
 
     # Add NER pipeline
-    ner = nlp.add_pipe("ner")
+    ner = nlp.add_pipe("ner", config={"model": spec["model"]} if spec["model"] else {})
+
+    # Serialize the corpus once — every epoch reads the .spacy shards back
+    corpus_dir = corpus_dir or output_dir.rstrip("/\\") + "_corpus"
+    if dev_ratio is None:
+        dev_ratio = 0.1 if train_path and not dev_path else 0.0
+    stats, dev_dir = prepare_corpus(nlp, corpus_dir, train_path, dev_path, dev_ratio, doc_type,
+                                    workers)
 
     # Add all entity labels
-    labels = set()
-    for _, ann in TRAIN_DATA:
-        for start, end, label in ann["entities"]:
-            labels.add(label)
-            ner.add_label(label)
+    for label in stats["labels"]:
+        ner.add_label(label)
 
-    print(f"Training with {len(labels)} entity types: {sorted(labels)}")
+    print(f"Training with {len(stats['labels'])} entity types: {stats['labels']}")
+    print(f"Corpus: {stats['train']} train / {stats['dev']} dev docs "
+          f"({stats['skipped_spans']} misaligned spans skipped)")
 
     # Training
-    optimizer = nlp.begin_training()
+    sample    = list(zip(range(100), read_docbins(nlp, corpus_dir, "train")))
+    optimizer = nlp.initialize(lambda: (ex for _, ex in sample))
+    dev       = list(read_docbins(nlp, dev_dir, "dev")) if stats["dev"] else []
+    best_f, best_bytes, stale = -1.0, None, 0
+    # One schedule across epochs — batches keep growing instead of restarting at 4
+    sizes = compounding(4.0, 128.0, 1.01)
 
     for iteration in range(n_iter):
-        random.shuffle(TRAIN_DATA)
-        losses = {}
-        for text, annotations in TRAIN_DATA:
-            doc = nlp.make_doc(text)
-            example = Example.from_dict(doc, annotations)
-            nlp.update([example], drop=0.3, losses=losses)
+        losses, words, start = {}, 0, time.perf_counter()
+        batches = minibatch(read_docbins(nlp, corpus_dir, "train", shuffle=True, rng=rng),
+                            size=sizes)
+        for batch in batches:
+            nlp.update(batch, drop=dropout, losses=losses, sgd=optimizer)
+            words += sum(len(ex.reference) for ex in batch)
+        wps = words / max(time.perf_counter() - start, 1e-9)
 
-        if (iteration + 1) % 10 == 0:
-            print(f"Iteration {iteration + 1}/{n_iter} - Loss: {losses.get('ner', 0):.3f}")
+        line = f"Iteration {iteration + 1}/{n_iter} - Loss: {losses.get('ner', 0):.3f} - {wps:,.0f} words/sec"
+        if dev:
+            score = nlp.evaluate(dev)["ents_f"] or 0.0
+            line += f" - dev F1: {score:.3f}"
+            if score > best_f:
+                best_f, best_bytes, stale = score, nlp.to_bytes(), 0
+            else:
+                stale += 1
+        if dev or (iteration + 1) % 10 == 0:
+            print(line)
+        if dev and stale >= patience:
+            print(f"Early stop — no dev improvement in {patience} epochs (best F1 {best_f:.3f})")
+            break
 
-    # Save model
+    if best_bytes is not None:
+        nlp.from_bytes(best_bytes)
+
+    # Save model — a fresh meta version invalidates ner_parser's line cache
+    nlp.meta["name"]    = os.path.basename(output_dir.rstrip("/\\"))
+    nlp.meta["version"] = time.strftime("%Y.%m.%d.%H%M%S")
     os.makedirs(output_dir, exist_ok=True)
-    nlp.to_disk(output_dir)
+    nlp.to_disk(output_dir, exclude=[] if spec["vectors"] else ["vectors"])
     print(f"\nModel saved to: {output_dir}")
 
     # Quick test
@@ -121,5 +364,34 @@ def train_ner_model(output_dir="models/ocr_ner_model", n_iter=30):
 
     return nlp
 
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m api.ner_trainer")
+    parser.add_argument("--train", help="JSONL corpus (default: built-in TRAIN_DATA)")
+    parser.add_argument("--dev", help="JSONL dev set (default: 10%% hash split of --train)")
+    parser.add_argument("--dev-ratio", type=float)
+    parser.add_argument("--output", help="default: models/ocr_ner_model[_<variant>][_<doc_type>]")
+    parser.add_argument("--variant", choices=sorted(VARIANTS), default="default")
+    parser.add_argument("--doc-type", choices=sorted(DOC_TYPE_LABELS),
+                        help="prune labels to the fields this doc type maps")
+    parser.add_argument("--all-doc-types", action="store_true",
+                        help="train one routed component per doc type (ner_parser.load_routed_model)")
+    parser.add_argument("--corpus-dir", help="DocBin shards (default: <output>_corpus)")
+    parser.add_argument("--n-iter", type=int, default=30)
+    parser.add_argument("--patience", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="processes converting the corpus to DocBin shards (default: CPU count)")
+    args = parser.parse_args(argv)
+    if args.all_doc_types and (args.output or args.corpus_dir or args.doc_type):
+        parser.error("--all-doc-types writes to the default per-type paths")
+
+    for doc_type in (sorted(DOC_TYPE_LABELS) if args.all_doc_types else [args.doc_type]):
+        if doc_type:
+            print(f"\n=== {doc_type} ===")
+        train_ner_model(args.output, args.n_iter, args.train, args.dev, args.dev_ratio,
+                        args.patience, corpus_dir=args.corpus_dir, variant=args.variant,
+                        doc_type=doc_type, workers=args.workers)
+
+
 if __name__ == "__main__":
-    train_ner_model()
\ No newline at end of file
+    main()
@@ -1,55 +1,261 @@
+import json
+import os
+import threading
 import time
 import numpy as np
-from paddleocr import PaddleOCR
 from pdf2image import convert_from_path
 
+from api import metrics, preprocess
+from api.imaging import to_ocr_array
+from api.metrics import observe, stage
+from api.ocr_lines import OCRLines
+
 # ---------- CONFIG ----------
 POPPLER_PATH = r"C:\Users\Asus\Downloads\ocr-project\poppler\poppler-25.12.0\Library\bin"
 
-ocr = PaddleOCR(
-    lang="en",
-    use_angle_cls=False,
-    show_log=False
-)
+_ocr = None
+_ocr_lock = threading.Lock()   # one predictor, shared by all extraction workers
+
+
+# ---------- MODEL ----------
+def load_ocr():
+    global _ocr
+    with _ocr_lock:
+        if _ocr is None:
+            with stage("ocr_model_load"):
+                from paddleocr import PaddleOCR
+                _ocr = PaddleOCR(
+                    lang="en",
+                    use_angle_cls=False,
+                    show_log=False,
+                    # keep the weak reads — the re-OCR band starts below the usual 0.5
+                    drop_score=min(REOCR_BAND[0], CONF_FLOOR)
+                )
+    return _ocr
+
+
+def run_ocr(img):
+    """Det + rec in one pass → (float32 (n, 4, 2) boxes, texts, float32 scores)."""
+    from paddleocr.paddleocr import alpha_to_color, check_img
+    engine = load_ocr()
+    img = alpha_to_color(check_img(img))
+    with _ocr_lock:
+        dt_boxes, rec_res, time_dict = engine(img, cls=False)
+    observe("ocr_detect", time_dict["det"])
+    observe("ocr_recognize", time_dict["rec"])
+    if dt_boxes is None or not len(dt_boxes):
+        return np.zeros((0, 4, 2), dtype=np.float32), [], np.zeros(0, dtype=np.float32)
+    boxes  = np.asarray(dt_boxes, dtype=np.float32).reshape(-1, 4, 2)
+    texts  = [text for text, _ in rec_res]
+    scores = np.fromiter((score for _, score in rec_res), dtype=np.float32, count=len(rec_res))
+    return boxes, texts, scores
+
+
+def recognize(crops: list) -> list:
+    """Recognition only, on already-cropped line images → [(text, score)]."""
+    engine = load_ocr()
+    with _ocr_lock:
+        rec_res, elapse = engine.text_recognizer(crops)
+    observe("ocr_recognize", elapse)
+    return rec_res
+
+
+# ---------- POST-PROCESSING ----------
+# Minimum recognition confidence per doc type, e.g. OCR_CONF_THRESHOLDS='{"id_card": 0.7}'
+CONF_THRESHOLDS = {"default": 0.5, **json.loads(os.getenv("OCR_CONF_THRESHOLDS", "{}"))}
+CONF_FLOOR      = min(CONF_THRESHOLDS.values())   # OCR keeps this much until the type is known
+DEDUP_IOU       = 0.5                             # same text + this much overlap = one line
+
+
+def conf_threshold(doc_type: str = None) -> float:
+    return CONF_THRESHOLDS.get(doc_type, CONF_THRESHOLDS["default"])
+
+
+def dedup_mask(boxes, texts) -> np.ndarray:
+    """False for a line repeating the text of an overlapping, better-scored earlier line.
+
+    Boxes must be sorted by descending score.
+    """
+    n    = len(texts)
+    keep = np.ones(n, dtype=bool)
+    if n < 2:
+        return keep
+    _, codes = np.unique(np.asarray(texts, dtype=object).astype(str), return_inverse=True)
+    same = codes[:, None] == codes[None, :]
+    if not np.triu(same, 1).any():
+        return keep
+    lo, hi = boxes.min(axis=1), boxes.max(axis=1)
+    inter  = np.clip(np.minimum(hi[:, None], hi[None]) - np.maximum(lo[:, None], lo[None]), 0, None)
+    inter  = inter[..., 0] * inter[..., 1]
+    area   = np.prod(hi - lo, axis=1)
+    iou    = inter / np.maximum(area[:, None] + area[None] - inter, 1e-6)
+    dup    = np.triu(same & (iou > DEDUP_IOU), 1)   # j duplicates an earlier (better) i
+    keep[dup.any(axis=0)] = False
+    return keep
+
+
+def confidence_stats(scores) -> dict:
+    if not len(scores):
+        return {"mean": 0.0, "min": 0.0, "p10": 0.0, "p50": 0.0}
+    p10, p50 = np.percentile(scores, (10, 50))
+    return {"mean": round(float(scores.mean()), 4), "min": round(float(scores.min()), 4),
+            "p10": round(float(p10), 4), "p50": round(float(p50), 4)}
+
+
+def postprocess(boxes, texts, scores, size, threshold: float = None) -> OCRLines:
+    """Clip boxes to the image, drop low-confidence and duplicate lines — all array ops."""
+    threshold = CONF_FLOOR if threshold is None else threshold
+    w, h  = size
+    boxes = np.clip(boxes, 0, (w, h)).astype(np.float32, copy=False)
+    idx   = np.flatnonzero(scores > threshold)
+    # Best score first so dedup keeps the stronger reading, then back to detection order
+    idx   = idx[np.argsort(-scores[idx], kind="stable")]
+    idx   = np.sort(idx[dedup_mask(boxes[idx], [texts[i] for i in idx])])
+    return OCRLines.from_lines([texts[i] for i in idx], boxes[idx], scores[idx], size)
+
+
+def page_result(lines: OCRLines, start: float) -> dict:
+    return {
+        "extracted_text": lines.text,
+        "formatted_text": lines.text,
+        "confidence_score": float(lines.confidence.mean()) if len(lines) else 0.0,
+        "confidence_stats": confidence_stats(lines.confidence),
+        "line_items": lines,               # ← OCRLines; .to_dicts() for JSON
+        "image_size": lines.size,          # bbox coordinate space
+        "processing_time_sec": round(time.time() - start, 2)
+    }
+
+
+def apply_doc_type_threshold(result: dict, doc_type: str) -> dict:
+    """Re-filter a page OCR'd at CONF_FLOOR once its doc type is known (in place)."""
+    lines = result["line_items"]
+    if conf_threshold(doc_type) > CONF_FLOOR and len(lines):
+        result.update(page_result(lines.select(lines.confidence > conf_threshold(doc_type)),
+                                  time.time() - result["processing_time_sec"]))
+    return result
+
+
+# ---------- SELECTIVE RE-OCR ----------
+# Lines read with a confidence inside the band are cropped again at REOCR_SCALE x the
+# OCR resolution and re-recognized — detection is not re-run. One region covering
+# every band line is fetched per page (a PDF page renders it once: MuPDF decodes a
+# page's scan image on every render) and each line is cut from that.
+# OCR_REOCR_BAND="0.3,0.8"; OCR_REOCR_BAND=off disables it.
+_band       = os.getenv("OCR_REOCR_BAND", "0.3,0.8")
+REOCR_BAND  = (1.0, 1.0) if _band == "off" else tuple(float(v) for v in _band.split(","))
+REOCR_SCALE = float(os.getenv("OCR_REOCR_SCALE", "2.0"))   # 1200 px wide A4 ≈ 145 DPI → ≈ 290
+REOCR_MAX   = 40                                            # lines re-read per page
+
+
+def upscaled(arr):
+    """hires() for a plain image: the OCR array's own pixels, enlarged."""
+    import cv2
+
+    def hires(x0, y0, x1, y1):
+        return cv2.resize(arr[y0:y1, x0:x1], None, fx=REOCR_SCALE, fy=REOCR_SCALE,
+                          interpolation=cv2.INTER_CUBIC)
+    return hires
+
+
+def reocr_band(boxes, texts: list, scores, size, hires) -> dict:
+    """Re-read band lines from hires(x0, y0, x1, y1) → region at REOCR_SCALE (in place).
+
+    hires is called once, for the bounding box of all the lines re-read. A new
+    reading replaces the old one only when it scores higher.
+    """
+    from paddleocr.tools.infer.utility import get_rotate_crop_image
+    lo, hi = REOCR_BAND
+    idx    = np.flatnonzero((scores >= lo) & (scores < hi))
+    idx    = idx[np.argsort(scores[idx], kind="stable")][:REOCR_MAX]   # weakest first
+    if not len(idx):
+        return {"lines": 0, "improved": 0}
+    w, h   = size
+    quads  = np.clip(boxes[idx], 0, (w, h))
+    x0, y0 = np.floor(quads.reshape(-1, 2).min(axis=0)).astype(int)
+    x1, y1 = np.ceil(quads.reshape(-1, 2).max(axis=0)).astype(int)
+    region = hires(x0, y0, max(x1, x0 + 1), max(y1, y0 + 1))
+    # The rendered region may be a pixel off REOCR_SCALE x its size
+    scale  = (region.shape[1] / max(x1 - x0, 1), region.shape[0] / max(y1 - y0, 1))
+    crops  = []
+    for quad in quads:
+        quad   = ((quad - (x0, y0)) * scale).astype(np.float32)
+        lx, ly = np.floor(quad.min(axis=0)).astype(int)
+        hx, hy = np.ceil(quad.max(axis=0)).astype(int)
+        # Warp from the line's own patch (a view) — warping the whole region is slow
+        crops.append(get_rotate_crop_image(region[ly:hy + 1, lx:hx + 1],
+                                           (quad - (lx, ly)).astype(np.float32)))
+    improved = 0
+    for i, (text, score) in zip(idx, recognize(crops)):
+        if score > scores[i]:
+            texts[i], scores[i] = text, score
+            improved += 1
+    return {"lines": len(idx), "improved": improved}
+
 
 # ---------- SINGLE PAGE ----------
-def extract_single_page(image):
+def extract_single_page(image, hires=None):
 
+    """image: PIL image or an RGB array already OCR_WIDTH wide (imaging.load_image).
+
+    hires(x0, y0, x1, y1) returns that region (OCR pixels) at REOCR_SCALE for the
+    re-OCR band — a PDF page re-renders it; by default the image is upscaled.
+    """
     start = time.time()
-    image = image.resize((1200, int(image.height * 1200 / image.width)))
+    with stage("ocr_resize"):
+        arr = to_ocr_array(image)
 
-    result = ocr.ocr(np.array(image))
+    size  = (arr.shape[1], arr.shape[0])
+    boxes, texts, scores = run_ocr(arr)
+    with stage("ocr_reocr"):
+        reread = reocr_band(boxes, texts, scores, size, hires or upscaled(arr))
+    with stage("ocr_postprocess"):
+        lines = postprocess(boxes, texts, scores, size)
+    mean   = float(lines.confidence.mean()) if len(lines) else 0.0
+    report = None
+    if preprocess.enabled(mean):
+        lines, report = second_look(arr, lines)
+    result = page_result(lines, start)
+    if reread["lines"]:
+        result["reocr"] = reread
+    if report:
+        result["preprocess"] = report
+    return result
 
-    line_items = []
-    lines = []
-    confs = []
 
-    if result and result[0]:
-        for line in result[0]:
-            bbox = line[0]
-            text = line[1][0]
-            conf = line[1][1]
-
-            if conf > 0.5:
-                lines.append(text)
-                confs.append(conf)
-                line_items.append({
-                    "text": text,
-                    "confidence": float(conf),
-                    "bbox": [list(p) for p in bbox]
-                })
-
-    extracted_text = "\n".join(lines)
-    confidence = float(np.mean(confs)) if confs else 0.0
-    process_time = time.time() - start
+def ocr_lines(arr) -> OCRLines:
+    boxes, texts, scores = run_ocr(arr)
+    with stage("ocr_postprocess"):
+        return postprocess(boxes, texts, scores, (arr.shape[1], arr.shape[0]))
 
-    return {
-        "extracted_text": extracted_text,
-        "formatted_text": extracted_text,
-        "confidence_score": confidence,
-        "line_items": line_items,          # ← bbox data here
-        "processing_time_sec": round(process_time, 2)
+
+def second_look(arr, lines: OCRLines):
+    """Deskew / denoise / binarize a page that read badly and OCR it again.
+
+    The second reading wins only with more total line confidence (more lines read,
+    or the same lines read better). Returns (lines, report or None for a clean page).
+    """
+    start = time.time()
+    with stage("preprocess"):
+        stats = preprocess.image_stats(arr)
+        steps = preprocess.plan(stats)
+        fixed = preprocess.apply(arr, steps, stats) if steps else None
+    if fixed is None:
+        metrics.PREPROCESS_RUNS.inc("clean")
+        return lines, None
+    retry = ocr_lines(fixed)
+    kept  = float(retry.confidence.sum()) > float(lines.confidence.sum())
+    metrics.PREPROCESS_RUNS.inc("kept" if kept else "discarded")
+    before = float(lines.confidence.mean()) if len(lines) else 0.0
+    after  = float(retry.confidence.mean()) if len(retry) else 0.0
+    report = {
+        "steps":           steps,
+        "stats":           stats,
+        "kept":            kept,
+        "confidence_gain": round(after - before, 4),
+        "lines_gain":      len(retry) - len(lines),
+        "cost_sec":        round(time.time() - start, 3),
     }
+    return (retry if kept else lines), report
 
 
 # ---------- PDF ----------
@@ -58,14 +264,14 @@ def extract_pdf(pdf_path):
     pages = convert_from_path(pdf_path, poppler_path=POPPLER_PATH)
 
     all_text = []
-    all_line_items = []   # ← FIX: collect line_items across all pages
+    all_line_items = []   # ← FIX: collect line_items across all pages (OCRLines per page)
     confs = []
     total_time = 0
 
     for page in pages:
         res = extract_single_page(page)
         all_text.append(res["formatted_text"])
-        all_line_items.extend(res["line_items"])   # ← accumulate
+        all_line_items.append(res["line_items"])   # ← accumulate
         confs.append(res["confidence_score"])
         total_time += res["processing_time_sec"]
 
@@ -77,7 +283,7 @@ def extract_pdf(pdf_path):
         "extracted_text": raw_text,
         "formatted_text": raw_text,
         "confidence_score": avg_conf,
-        "line_items": all_line_items,       # ← FIX: now available for parser
+        "line_items": OCRLines.concat(all_line_items),   # ← FIX: now available for parser
         "metadata": {
             "pages": len(pages),
             "language_detected": "en",
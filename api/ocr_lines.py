@@ -0,0 +1,83 @@
+"""
+ocr_lines.py - Compact struct-of-arrays container for a page's OCR lines
+One joined text buffer + int offsets, float32 (n, 4, 2) quad boxes, float32 confidences.
+Dicts/lists are only built by to_dicts() at the API boundary.
+"""
+
+import numpy as np
+
+
+class OCRLines:
+    __slots__ = ("text", "offsets", "boxes", "confidence", "size")
+
+    def __init__(self, text: str, offsets, boxes, confidence, size=None):
+        self.text       = text          # lines joined by "\n" — the page's formatted_text
+        self.offsets    = offsets       # int32 (n + 1,): line i is text[offsets[i]:offsets[i+1] - 1]
+        self.boxes      = boxes         # float32 (n, 4, 2) corner points, image pixels
+        self.confidence = confidence    # float32 (n,)
+        self.size       = size          # (width, height) of the image the boxes refer to
+
+    @classmethod
+    def from_lines(cls, texts: list, boxes, confidence, size=None) -> "OCRLines":
+        lengths = np.fromiter((len(t) + 1 for t in texts), dtype=np.int32, count=len(texts))
+        offsets = np.zeros(len(texts) + 1, dtype=np.int32)
+        np.cumsum(lengths, out=offsets[1:])
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(len(texts), 4, 2)
+        return cls("\n".join(texts), offsets, boxes,
+                   np.asarray(confidence, dtype=np.float32).reshape(len(texts)), size)
+
+    @classmethod
+    def empty(cls, size=None) -> "OCRLines":
+        return cls.from_lines([], np.zeros((0, 4, 2)), [], size)
+
+    @classmethod
+    def concat(cls, parts: list) -> "OCRLines":
+        """Pages of one document back to back; boxes stay in each page's own pixels."""
+        if not parts:
+            return cls.empty()
+        texts = [p.text for p in parts if len(p)]
+        shift, offsets = 0, [np.zeros(1, dtype=np.int32)]
+        for p in parts:
+            if len(p):
+                offsets.append(p.offsets[1:] + shift)
+                shift += int(p.offsets[-1])
+        return cls("\n".join(texts), np.concatenate(offsets),
+                   np.concatenate([p.boxes for p in parts]),
+                   np.concatenate([p.confidence for p in parts]))
+
+    def __len__(self) -> int:
+        return len(self.confidence)
+
+    def line(self, i: int) -> str:
+        return self.text[self.offsets[i]:self.offsets[i + 1] - 1]
+
+    def lines(self) -> list:
+        return self.text.split("\n") if len(self) else []
+
+    def select(self, mask) -> "OCRLines":
+        """Subset by boolean mask or index array, order kept."""
+        idx = np.flatnonzero(mask) if np.asarray(mask).dtype == bool else np.asarray(mask)
+        texts = self.lines()
+        return OCRLines.from_lines([texts[i] for i in idx], self.boxes[idx],
+                                   self.confidence[idx], self.size)
+
+    def normalized(self) -> np.ndarray:
+        """Boxes as fractions of the image size, float32 (n, 4, 2)."""
+        return self.boxes / np.asarray(self.size, dtype=np.float32)
+
+    def find(self, value: str) -> int:
+        """Index of the first line containing value (case-insensitive), or -1."""
+        haystack, needle = self.text.lower(), str(value).lower()
+        pos = haystack.find(needle)
+        while pos != -1:
+            i = int(np.searchsorted(self.offsets, pos, side="right")) - 1
+            # A hit that spans the "\n" between two lines is not inside either
+            if pos + len(needle) < self.offsets[i + 1]:
+                return i
+            pos = haystack.find(needle, pos + 1)
+        return -1
+
+    def to_dicts(self) -> list:
+        """[{"text", "confidence", "bbox"}] — the JSON shape, built on demand."""
+        return [{"text": t, "confidence": float(c), "bbox": b}
+                for t, c, b in zip(self.lines(), self.confidence.tolist(), self.boxes.tolist())]
@@ -0,0 +1,155 @@
+"""
+orientation.py - Page orientation pre-pass: pick 0 / 90 / 180 / 270 once, before OCR
+PDF:   /Rotate set → already upright as rendered; native text direction when the page
+       has any; otherwise the image heuristic on a grey render
+Image: the same heuristic on a downscaled copy of the decoded image
+Mode:  OCR_ORIENTATION=auto (default) | off
+
+Angles are clockwise degrees to turn the page image by. PaddleOCR runs with
+use_angle_cls=False, so a landscape PO scanned sideways is only readable after this.
+"""
+
+import math, os
+import numpy as np
+
+from api import metrics
+from api.metrics import stage
+
+MODE       = os.getenv("OCR_ORIENTATION", "auto")
+THUMB      = 500       # long side of the thumbnail the line-axis check looks at, px
+DETAIL     = 1400      # long side the baseline check looks at — characters need a few px
+MIN_CHARS  = 10        # native characters needed to trust the text direction
+GAP_INK    = 0.005     # a row with less ink than this share is a gap between lines
+SIDEWAYS   = 1.5       # gap-column share must beat gap-row share by this much to turn 90
+FLIP_RATIO = 3         # upside-down lines must outvote upright ones this many times…
+FLIP_MIN   = 6         # …and by this many lines before a page is turned 180
+
+
+# ── Image heuristic ───────────────────────────────────────────────────────────
+def _ink(gray: np.ndarray, long_side: int) -> np.ndarray:
+    """0/1 ink mask at most long_side px, dark text on light (inverted screenshots flipped)."""
+    import cv2
+    scale = long_side / max(gray.shape)
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    _, ink = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    return 1 - ink if ink.mean() > 0.5 else ink
+
+
+def image_angle(gray: np.ndarray) -> int:
+    """Clockwise turn that makes a grey page upright.
+
+    Text lines leave empty rows between them but almost no empty columns, so the
+    axis with more gaps is the line direction. Which way up is read off the lines
+    themselves (_baseline_votes); a page is only turned 180 on a clear majority.
+    """
+    ink    = _ink(gray, THUMB)
+    ys, xs = np.nonzero(ink)
+    if len(ys) < 0.002 * ink.size:
+        return 0
+    ink = ink[ys.min():ys.max() + 1, xs.min():xs.max() + 1]
+    gap_rows = float((ink.mean(axis=1) < GAP_INK).mean())
+    gap_cols = float((ink.mean(axis=0) < GAP_INK).mean())
+
+    detail = _ink(gray, DETAIL)
+    if gap_cols > gap_rows * SIDEWAYS and gap_cols - gap_rows > 0.05:
+        # Sideways: whichever quarter turn leaves more lines reading upright
+        up, down = _baseline_votes(np.ascontiguousarray(np.rot90(detail, -1)))
+        return 90 if up >= down else 270
+    up, down = _baseline_votes(detail)
+    return 180 if down >= FLIP_RATIO * up and down - up >= FLIP_MIN else 0
+
+
+def _baseline_votes(ink: np.ndarray) -> tuple:
+    """(lines reading upright, lines reading upside down) in a 0/1 ink mask.
+
+    Latin characters sit on a common baseline while their tops vary (capitals,
+    ascenders, x-height), so in an upright line the character bottoms agree more
+    than the tops; turned 180 it is the other way round. Ruling lines are removed
+    first, and all-caps or numeric lines, where both agree, cast no vote.
+    """
+    import cv2
+    h, w  = ink.shape
+    rules = (cv2.morphologyEx(ink, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(h // 30, 8))))
+             | cv2.morphologyEx(ink, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (max(w // 15, 8), 1))))
+    ink   = ink & (1 - rules)
+    _, _, chars, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    smear = cv2.dilate(ink, cv2.getStructuringElement(cv2.MORPH_RECT, (max(w // 80, 3), 1)))
+    _, line_of, lines, _ = cv2.connectedComponentsWithStats(smear, connectivity=8)
+
+    x, y, cw, ch, area = chars[1:].T
+    keep  = (ch >= 3) & (area >= 4)
+    x, y, cw, ch = x[keep], y[keep], cw[keep], ch[keep]
+    line  = line_of[y + ch // 2, x + cw // 2]
+    up = down = 0
+    for label in np.unique(line):
+        sel = line == label
+        if sel.sum() < 4:
+            continue
+        tol     = 0.2 * lines[label, 3]
+        tops    = y[sel]
+        bottoms = tops + ch[sel]
+        ragged_tops    = int((np.abs(tops - np.median(tops)) > tol).sum())
+        ragged_bottoms = int((np.abs(bottoms - np.median(bottoms)) > tol).sum())
+        up   += ragged_tops > ragged_bottoms
+        down += ragged_bottoms > ragged_tops
+    return up, down
+
+
+# ── PDF pages ─────────────────────────────────────────────────────────────────
+def text_angle(page, textpage=None):
+    """Clockwise turn from the page's native text direction, or None if it has too little."""
+    weights = {}
+    for block in page.get_text("dict", textpage=textpage)["blocks"]:
+        for line in block.get("lines", ()):
+            chars = sum(len(s["text"].strip()) for s in line["spans"])
+            cos, sin = line["dir"]
+            # dir is in unrotated page space: (1, 0) reads left→right, (0, -1) bottom→top
+            angle = round(math.degrees(math.atan2(-sin, cos)) / 90) * 90 % 360
+            weights[angle] = weights.get(angle, 0) + chars
+    if sum(weights.values()) < MIN_CHARS:
+        return None
+    # The renderer turns the page by /Rotate clockwise on top of that
+    return (max(weights, key=weights.get) - page.rotation) % 360
+
+
+def page_angle(page, textpage=None) -> tuple:
+    """(clockwise angle, source) for a scanned PDF page — render it turned by angle.
+
+    textpage: the page's existing TextPage (native.NativePage), if any.
+    """
+    import fitz
+    if MODE == "off":
+        return 0, None
+    with stage("orientation"):
+        angle = text_angle(page, textpage)
+        if angle is not None:
+            source = "native_text"
+        elif page.rotation:
+            angle, source = 0, "rotate"
+        else:
+            zoom  = DETAIL / max(page.rect.width, page.rect.height)
+            pix   = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+            gray  = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+            angle, source = image_angle(gray), "image"
+    if angle:
+        metrics.ROTATIONS.inc(str(angle))
+    return angle, source
+
+
+# ── PIL images ────────────────────────────────────────────────────────────────
+def upright(img):
+    """RGB PIL image turned upright (after EXIF orientation, which comes first)."""
+    from PIL import Image
+    if MODE == "off":
+        return img
+    with stage("orientation"):
+        thumb = img.convert("L")
+        thumb.thumbnail((DETAIL, DETAIL))
+        angle = image_angle(np.asarray(thumb))
+    if not angle:
+        return img
+    metrics.ROTATIONS.inc(str(angle))
+    turn = {90: Image.Transpose.ROTATE_270, 180: Image.Transpose.ROTATE_180,
+            270: Image.Transpose.ROTATE_90}[angle]
+    return img.transpose(turn)
@@ -0,0 +1,177 @@
+"""
+page_store.py - Per-page results keyed by a PDF page's content fingerprint
+Enable: PAGE_STORE=on   Store: PAGE_STORE_DB (default models/page_store.sqlite)
+
+A re-uploaded PDF where only a page or two changed re-extracts just those
+pages: every other page's fingerprint matches a stored result. The fingerprint
+hashes the page object, its content streams and every resource it reaches
+(fonts, images, form XObjects, annotations) straight from the xref table —
+nothing is rendered or text-extracted. Object numbers are hashed out, so a
+re-saved file with renumbered objects still matches.
+"""
+
+import hashlib, json, os, re, sqlite3, threading, time
+
+from api import metrics
+
+MODEL_DIR      = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "models"))
+PAGE_STORE     = os.getenv("PAGE_STORE", "off").lower() == "on"
+PAGE_STORE_DB  = os.getenv("PAGE_STORE_DB", os.path.join(MODEL_DIR, "page_store.sqlite"))
+PAGE_STORE_MAX = int(os.getenv("PAGE_STORE_MAX", "50000"))     # pages kept, least recently used out
+SCHEMA_VERSION = 1       # bump when the page output shape or how a page is extracted changes
+EVICT_TO       = 0.9     # an over-full store is cut back to this share of PAGE_STORE_MAX
+
+_REF      = re.compile(rb"(\d+) (\d+) R")
+_BACKLINK = re.compile(rb"/(?:Parent|P)\s*\d+ \d+ R")     # up-links would pull in the whole tree
+_INHERIT  = ("Resources", "MediaBox", "CropBox", "Rotate")
+
+
+# ── Fingerprint ───────────────────────────────────────────────────────────────
+def _digest(doc, xref: int, memo: dict, active: set) -> bytes:
+    """Hash of an object with each reference replaced by its target's hash."""
+    if xref in memo:
+        return memo[xref]
+    if xref in active:
+        return b"cycle"
+    if not 0 < xref < doc.xref_length():
+        return b"missing"
+    if active and doc.xref_get_key(xref, "Type") == ("name", "/Page"):
+        return b"page"                  # a link to another page — that page is not this one's content
+    active.add(xref)
+    source = _BACKLINK.sub(b"", doc.xref_object(xref, compressed=True).encode())
+    h = hashlib.sha1(_REF.sub(lambda m: _digest(doc, int(m.group(1)), memo, active), source))
+    if doc.xref_is_stream(xref):
+        h.update(doc.xref_stream_raw(xref) or b"")
+    active.discard(xref)
+    memo[xref] = h.digest()
+    return memo[xref]
+
+
+def fingerprint(page, memo: dict = None) -> str:
+    """Content hash of a fitz.Page; memo (xref → hash) lets pages share font and image hashes."""
+    doc  = page.parent
+    memo = {} if memo is None else memo
+    h    = hashlib.sha1(_digest(doc, page.xref, memo, set()))
+    # Attributes a page may inherit from its page tree node instead of carrying them
+    for key in _INHERIT:
+        if doc.xref_get_key(page.xref, key)[0] != "null":
+            continue
+        node = page.xref
+        while True:
+            kind, parent = doc.xref_get_key(node, "Parent")
+            if kind != "xref":
+                break
+            node = int(parent.split()[0])
+            kind, value = doc.xref_get_key(node, key)
+            if kind == "xref":
+                h.update(_digest(doc, int(value.split()[0]), memo, set()))
+                break
+            if kind != "null":
+                h.update(value.encode())
+                break
+    return h.hexdigest()
+
+
+def scope(strategy: str, table_before: bool = False) -> str:
+    """Everything besides the page that decides its result: code schema, strategy, models,
+    native/scanned split, OCR size and settings, and whether an earlier page had items."""
+    from api import imaging, native, ocr_engine, orientation, preprocess
+    from api import ner_parser as ner
+    models = []
+    for doc_type in (None, *ner.DOC_TYPE_LABELS):
+        if doc_type and not ner.NER_ROUTING:
+            break
+        meta = os.path.join(ner.model_path(ner.MODEL_VARIANT, doc_type), "meta.json")
+        if os.path.exists(meta):
+            with open(meta) as f:
+                models.append(ner.model_version(os.path.dirname(meta), json.load(f)))
+    return json.dumps({
+        "schema":      SCHEMA_VERSION,
+        "strategy":    strategy or ner.EXTRACTION_STRATEGY,
+        "models":      models,
+        "scanned_min": native.SCANNED_THRESHOLD,
+        "ocr_width":   imaging.OCR_WIDTH,
+        "conf":        [ocr_engine.CONF_THRESHOLDS, ocr_engine.CONF_FLOOR],
+        "reocr":       [ocr_engine.REOCR_BAND, ocr_engine.REOCR_SCALE, ocr_engine.REOCR_MAX],
+        "preprocess":  [preprocess.MODE, preprocess.RETRY_BELOW],
+        "orientation": orientation.MODE,
+        "after_items": table_before,
+    }, sort_keys=True)
+
+
+# ── Store ─────────────────────────────────────────────────────────────────────
+class PageStore:
+    """sqlite table of (fingerprint, scope) → page output + confidence, shared by workers."""
+
+    def __init__(self, path: str = PAGE_STORE_DB, max_pages: int = PAGE_STORE_MAX,
+                 enabled: bool = PAGE_STORE):
+        self.path, self.max_pages, self.enabled = path, max_pages, enabled
+        self._lock = threading.Lock()
+        self._db   = None
+
+    def _conn(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS pages (fingerprint TEXT, scope TEXT, "
+                             "result TEXT, confidence REAL, last_used REAL, "
+                             "PRIMARY KEY (fingerprint, scope))")
+            self._db.execute("CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used)")
+        return self._db
+
+    def get(self, fingerprint: str, scope: str):
+        """(page output, confidence) stored for this page, or None."""
+        with self._lock:
+            try:
+                row = self._conn().execute("SELECT result, confidence FROM pages WHERE "
+                                           "fingerprint = ? AND scope = ?",
+                                           (fingerprint, scope)).fetchone()
+                if row:
+                    self._db.execute("UPDATE pages SET last_used = ? WHERE fingerprint = ? "
+                                     "AND scope = ?", (time.time(), fingerprint, scope))
+                    self._db.commit()
+            except sqlite3.OperationalError:
+                row = None
+        metrics.PAGE_STORE_HITS.inc("hit" if row else "miss")
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def put(self, fingerprint: str, scope: str, page_output: dict, confidence: float):
+        with self._lock:
+            try:
+                self._conn().execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                                     (fingerprint, scope, json.dumps(page_output), confidence,
+                                      time.time()))
+                self._evict()
+                self._db.commit()
+            except sqlite3.OperationalError:
+                pass   # locked by another worker — the page is simply extracted again next time
+
+    def _evict(self):
+        """Cut an over-full store back to EVICT_TO of max_pages, least recently used first.
+
+        The rowid span bounds the row count from above and costs two index probes, so
+        the exact COUNT only runs when the store may be full — whichever worker wrote.
+        """
+        lo, hi = self._db.execute("SELECT MIN(rowid), MAX(rowid) FROM pages").fetchone()
+        if hi is None or hi - lo + 1 <= self.max_pages:
+            return
+        count = self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        if count > self.max_pages:
+            self._db.execute("DELETE FROM pages WHERE rowid IN (SELECT rowid FROM pages "
+                             "ORDER BY last_used LIMIT ?)", (count - int(self.max_pages * EVICT_TO),))
+
+    def clear(self):
+        """Drop every stored page — a learned, deleted or evicted template changes page results."""
+        if not self.enabled or not os.path.exists(self.path):
+            return
+        with self._lock:
+            self._conn().execute("DELETE FROM pages")
+            self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn().execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+
+store = PageStore()
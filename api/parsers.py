@@ -1,9 +1,14 @@
 import re
 
+from api.ocr_lines import OCRLines
+
 
 def find_field_bbox(value, line_items):
     if not value or not line_items:
         return None
+    if isinstance(line_items, OCRLines):
+        i = line_items.find(value)
+        return line_items.boxes[i].tolist() if i >= 0 else None
     v = str(value).lower()
     for item in line_items:
         if v in item["text"].lower():
@@ -53,6 +58,26 @@ def _clean(t):
     return t.replace(",", "").strip()
 
 
+# ── Table rows → items ────────────────────────────────────────────────────────
+ITEM_HEADER_HINTS = ("description", "item", "hsn", "qty", "amount", "rate")
+
+
+def is_item_header(cells) -> bool:
+    """Two or more cells naming line-item columns — not a label/value or address grid."""
+    return sum(any(h in str(c).lower() for h in ITEM_HEADER_HINTS) for c in cells) >= 2
+
+
+def table_row_item(headers, values):
+    """One table row as {header: value}; None for an empty or repeated header row."""
+    item = {str(k).strip(): str(v).strip()
+            for k, v in zip(headers, values)
+            if str(v) not in ("nan", "None", "")}
+    vals_lower = str(list(item.values())).lower()
+    if any(h in vals_lower for h in ITEM_HEADER_HINTS):
+        return None
+    return item or None
+
+
 # ── Invoice table parser ──────────────────────────────────────────────────────
 
 def parse_invoice_table_text(text: str) -> list:
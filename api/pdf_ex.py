@@ -8,6 +8,9 @@ import re
 import fitz  # PyMuPDF
 import numpy as np
 
+from api.native import NativePage
+from api.orientation import page_angle
+
 SCANNED_THRESHOLD = 50
 
 
@@ -22,9 +25,9 @@ def clean_text(text: str) -> str:
     return "\n".join(lines)
 
 
-def page_to_image(page: fitz.Page, dpi: int = 150):
+def page_to_image(page: fitz.Page, dpi: int = 150, angle: int = 0):
     import cv2
-    mat = fitz.Matrix(dpi / 72, dpi / 72)
+    mat = fitz.Matrix(dpi / 72, dpi / 72).prerotate(angle)   # angle: clockwise turn to upright
     pix = page.get_pixmap(matrix=mat)
     arr = np.frombuffer(pix.tobytes("png"), dtype=np.uint8)
     return cv2.imdecode(arr, cv2.IMREAD_COLOR)
@@ -70,7 +73,8 @@ def extract_tables_native(page: fitz.Page) -> list:
 
 
 def extract_page(page: fitz.Page, page_num: int) -> dict:
-    native_text = page.get_text("text")
+    native      = NativePage(page)      # one TextPage for the text and any later reads
+    native_text = native.text()
     is_scanned  = len(native_text.strip()) < SCANNED_THRESHOLD
 
     if not is_scanned:
@@ -79,7 +83,8 @@ def extract_page(page: fitz.Page, page_num: int) -> dict:
         conf    = 1.0
         method  = "native"
     else:
-        img             = page_to_image(page)
+        angle, _        = page_angle(page, native.textpage)
+        img             = page_to_image(page, angle=angle)
         ocr_text, conf  = run_paddle_ocr(img)
         clean           = clean_text(ocr_text)
         tables          = []
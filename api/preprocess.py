@@ -0,0 +1,114 @@
+"""
+preprocess.py - Deskew / denoise / binarize for scans that OCR'd badly
+Mode:  OCR_PREPROCESS=auto (default) | always | off
+       auto re-checks pages whose mean line confidence is below OCR_PREPROCESS_BELOW
+
+Cheap statistics (skew angle, noise sigma, contrast) decide which fixes a page
+needs; a clean page gets none and costs only the statistics. ocr_engine keeps
+the fixed image's OCR only when it reads better than the first pass.
+"""
+
+import os
+import numpy as np
+
+MODE         = os.getenv("OCR_PREPROCESS", "auto")
+RETRY_BELOW  = float(os.getenv("OCR_PREPROCESS_BELOW", "0.85"))
+SKEW_MIN     = 0.3      # degrees — below this PaddleOCR's boxes cope fine
+SKEW_RANGE   = 10.0     # degrees searched either way
+NOISE_MAX    = 8.0      # estimated sigma of sensor / JPEG noise, grey levels
+NOISE_HEAVY  = 16.0     # above this a median filter is not enough — non-local means (~0.7 s)
+CONTRAST_MIN = 96       # paper - ink grey levels — faded print, grey photocopies
+STATS_WIDTH  = 400      # skew is measured on a thumbnail this wide
+
+
+def enabled(mean_confidence: float) -> bool:
+    if MODE == "off":
+        return False
+    return MODE == "always" or mean_confidence < RETRY_BELOW
+
+
+# ── Statistics ────────────────────────────────────────────────────────────────
+def image_stats(arr: np.ndarray) -> dict:
+    """{"skew", "noise", "contrast"} of an RGB uint8 page."""
+    import cv2
+    gray  = cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY)
+    scale = STATS_WIDTH / gray.shape[1]
+    small = cv2.resize(gray, (STATS_WIDTH, max(1, round(gray.shape[0] * scale))),
+                       interpolation=cv2.INTER_AREA)
+    return {"skew": round(skew_angle(small), 2), "noise": round(noise_sigma(gray), 2),
+            "contrast": contrast(gray)}
+
+
+def contrast(gray: np.ndarray) -> int:
+    """Paper minus ink grey level, split by Otsu — independent of how much text there is."""
+    import cv2
+    level, _ = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    ink, paper = gray[gray <= level], gray[gray > level]
+    if not len(ink) or not len(paper):
+        return 255
+    return int(paper.mean() - ink.mean())
+
+
+def noise_sigma(gray: np.ndarray) -> float:
+    """Immerkaer's fast estimate: a Laplacian-difference kernel cancels edges, leaves noise."""
+    import cv2
+    kernel = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+    resp   = np.abs(cv2.filter2D(gray.astype(np.float32), -1, kernel)[1:-1, 1:-1])
+    return float(resp.mean() * np.sqrt(np.pi / 2) / 6)
+
+
+def skew_angle(small: np.ndarray) -> float:
+    """Rotation (degrees, cv2 sign) that makes text rows horizontal — projection profile.
+
+    Rows of text give the sharpest row-sum profile (highest variance) when level.
+    """
+    import cv2
+    _, ink = cv2.threshold(small, 0, 1, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    if ink.mean() < 0.002:
+        return 0.0
+    ink    = ink.astype(np.float32)
+    h, w   = ink.shape
+    center = (w / 2, h / 2)
+
+    def sharpness(angle):
+        m = cv2.getRotationMatrix2D(center, angle, 1.0)
+        return float(cv2.warpAffine(ink, m, (w, h), flags=cv2.INTER_NEAREST).sum(axis=1).var())
+
+    best = max(np.arange(-SKEW_RANGE, SKEW_RANGE + 0.01, 1.0), key=sharpness)
+    return float(max(np.arange(best - 1, best + 1.01, 0.1), key=sharpness))
+
+
+def plan(stats: dict) -> list:
+    steps = []
+    if abs(stats["skew"]) >= SKEW_MIN:
+        steps.append("deskew")
+    if stats["noise"] > NOISE_MAX:
+        steps.append("denoise")
+    if stats["contrast"] < CONTRAST_MIN:
+        steps.append("binarize")
+    return steps
+
+
+# ── Fixes ─────────────────────────────────────────────────────────────────────
+def apply(arr: np.ndarray, steps: list, stats: dict) -> np.ndarray:
+    """The planned fixes, in order, on a copy; same size and RGB uint8 out."""
+    import cv2
+    out = arr
+    if "deskew" in steps:
+        h, w = out.shape[:2]
+        m    = cv2.getRotationMatrix2D((w / 2, h / 2), stats["skew"], 1.0)
+        out  = cv2.warpAffine(out, m, (w, h), flags=cv2.INTER_LINEAR,
+                              borderMode=cv2.BORDER_CONSTANT, borderValue=(255, 255, 255))
+    if "denoise" not in steps and "binarize" not in steps:
+        return out
+    gray = cv2.cvtColor(out, cv2.COLOR_RGB2GRAY)
+    if "denoise" in steps and stats["noise"] > NOISE_HEAVY:
+        gray = cv2.fastNlMeansDenoising(gray, None, h=min(stats["noise"], 30.0),
+                                        templateWindowSize=5, searchWindowSize=11)
+    elif "denoise" in steps:
+        gray = cv2.medianBlur(gray, 3)
+    if "binarize" in steps:
+        # Local threshold — uneven lighting and faded toner defeat a global one
+        gray = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                     cv2.THRESH_BINARY, 31, 15)
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB)
@@ -0,0 +1,403 @@
+"""
+templates.py - Vendor layout templates: fingerprint a page, extract fields from stored boxes
+Learn:  POST /templates/learn  (file + confirmed fields JSON + doc_type)
+Store:  TEMPLATE_DB (default models/templates.sqlite)
+
+A template is the set of static label lines of a vendor's layout (text + relative
+position) plus one relative box per confirmed field. A page whose label lines
+match a template gets its fields read straight from those boxes — no
+classification and no NER. Only label-like lines are anchors — "Label:" parts,
+known field labels, letterhead and footer lines — never the customer block or
+item rows, which change from one invoice to the next.
+"""
+
+import atexit, json, os, re, sqlite3, threading, time, uuid
+
+from api import metrics, page_store
+from api.metrics import stage
+
+MODEL_DIR    = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "models"))
+TEMPLATE_DB  = os.getenv("TEMPLATE_DB", os.path.join(MODEL_DIR, "templates.sqlite"))
+TEMPLATE_MAX = int(os.getenv("TEMPLATE_MAX", "2000"))        # templates kept, least recently used out
+TEMPLATE_TTL = float(os.getenv("TEMPLATE_TTL_DAYS", "180")) * 86400
+
+MATCH_MIN   = 0.8     # share of a template's anchors that must be found on the page
+MIN_ANCHORS = 3       # fewer static lines than this is not a layout
+POS_TOL     = 0.02    # anchor position tolerance, fraction of page size
+BOX_PAD     = 0.01    # field box tolerance, fraction of page size
+HEADER_BAND = 0.15    # lines above this (fraction of page height) are letterhead
+FOOTER_BAND = 0.9     # lines below this are footer — bank details, declarations
+LABEL_MAX   = 40      # chars — a known field label line longer than this is content
+HIT_FLUSH   = 30.0    # seconds between writing hit counts / last use back to sqlite
+
+_DIGIT = re.compile(r"\d")
+
+
+# ── Layout ────────────────────────────────────────────────────────────────────
+# A layout is a list of tokens (text, x0, y0, x1, y1, line key), coordinates
+# relative to the page so the same template fits any render size
+def native_layout(page, words: list = None) -> list:
+    """words: page.get_text("words") when the caller already has them (native.NativePage)."""
+    w, h = page.rect.width or 1, page.rect.height or 1
+    return [(t[4], t[0] / w, t[1] / h, t[2] / w, t[3] / h, (t[5], t[6]))
+            for t in (page.get_text("words") if words is None else words)]
+
+
+def ocr_layout(lines) -> list:
+    """OCRLines → layout; each OCR line is one token (it has no word boxes)."""
+    norm = lines.normalized()
+    lo   = norm.min(axis=1).tolist()
+    hi   = norm.max(axis=1).tolist()
+    return [(text, x0, y0, x1, y1, i)
+            for i, (text, (x0, y0), (x1, y1)) in enumerate(zip(lines.lines(), lo, hi))]
+
+
+def _lines(layout: list) -> list:
+    """Group tokens into lines: (text, x0, y0, x1, y1, tokens)."""
+    groups = {}
+    for tok in layout:
+        groups.setdefault(tok[5], []).append(tok)
+    lines = []
+    for toks in groups.values():
+        toks.sort(key=lambda t: t[1])
+        lines.append((" ".join(t[0] for t in toks), min(t[1] for t in toks), min(t[2] for t in toks),
+                      max(t[3] for t in toks), max(t[4] for t in toks), toks))
+    lines.sort(key=lambda l: (l[2], l[1]))
+    return lines
+
+
+def _norm(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _label(text: str):
+    """"invoice no:" of "invoice no: inv/2025/0118" — the label part of a normalized line."""
+    head, sep, _ = text.partition(":")
+    return head.strip() + ":" if sep and len(head.strip()) >= 3 and not _DIGIT.search(head) else None
+
+
+_field_labels = None
+
+
+def _known_label(text: str) -> bool:
+    global _field_labels
+    if _field_labels is None:
+        from api.ner_parser import FIELD_SPECS, HEAD
+        _field_labels = re.compile("|".join(sorted({f.near for specs in FIELD_SPECS.values()
+                                                    for f in specs if f.near not in (None, HEAD)})))
+    return len(text) <= LABEL_MAX and bool(_field_labels.search(text))
+
+
+def _anchors(lines: list, values=()) -> list:
+    """Static label lines as (text, x0, y0): "Label:" parts, field labels, letterhead, footer.
+
+    Lines with digits or a confirmed value are never static.
+    """
+    values = [_norm(v) for v in values if v]
+    out = []
+    for text, x0, y0, *_ in lines:
+        t     = _norm(text)
+        label = _label(t)
+        if label and not any(v in label for v in values):
+            out.append((label, round(x0, 4), round(y0, 4)))
+            continue
+        if len(t) < 3 or _DIGIT.search(t) or any(v in t for v in values):
+            continue
+        if y0 < HEADER_BAND or y0 > FOOTER_BAND or _known_label(t):
+            out.append((t, round(x0, 4), round(y0, 4)))
+    return out
+
+
+def _locate(lines: list, value: str):
+    """Smallest token run containing value → (box, prefix before the value)."""
+    target = _norm(value)
+    for _, _, _, _, _, toks in lines:
+        words = [_norm(t[0]) for t in toks]
+        if target not in " ".join(words):
+            continue
+        for i in range(len(toks)):
+            for j in range(i + 1, len(toks) + 1):
+                run = " ".join(words[i:j])
+                if target in run:
+                    run_toks = toks[i:j]
+                    box = [min(t[1] for t in run_toks), min(t[2] for t in run_toks),
+                           max(t[3] for t in run_toks), max(t[4] for t in run_toks)]
+                    return [round(v, 4) for v in box], run[:run.index(target)].strip()
+    return None, None
+
+
+# ── Template ──────────────────────────────────────────────────────────────────
+class Template:
+    __slots__ = ("id", "doc_type", "vendor", "anchors", "fields", "created", "last_used", "hits")
+
+    def __init__(self, id, doc_type, vendor, anchors, fields, created, last_used, hits=0):
+        self.id, self.doc_type, self.vendor = id, doc_type, vendor
+        self.anchors   = [tuple(a) for a in anchors]
+        self.fields    = fields          # name → {"box": [x0, y0, x1, y1], "prefix": str}
+        self.created   = created
+        self.last_used = last_used
+        self.hits      = hits
+
+    def score(self, index: dict) -> float:
+        """Share of anchors found on the page; index is normalized line text → [(x0, y0)]."""
+        found = 0
+        for text, x0, y0 in self.anchors:
+            if any(abs(x - x0) <= POS_TOL and abs(y - y0) <= POS_TOL for x, y in index.get(text, ())):
+                found += 1
+        return found / len(self.anchors)
+
+    def read(self, layout: list) -> dict:
+        """Field values from the stored boxes; None where the box is empty."""
+        out = {}
+        for name, spec in self.fields.items():
+            x0, y0, x1, y1 = spec["box"]
+            toks = [t for t in layout
+                    if y0 - BOX_PAD <= (t[2] + t[4]) / 2 <= y1 + BOX_PAD
+                    and x0 - BOX_PAD <= t[1] <= x1 + BOX_PAD]
+            text = " ".join(l[0] for l in _lines(toks)).strip()
+            prefix = spec.get("prefix")
+            if prefix and text.lower().startswith(prefix):
+                text = text[len(prefix):].strip()
+            out[name] = text or None
+        return out
+
+    def summary(self) -> dict:
+        return {"id": self.id, "doc_type": self.doc_type, "vendor": self.vendor,
+                "anchors": len(self.anchors), "fields": list(self.fields),
+                "hits": self.hits, "last_used": self.last_used}
+
+
+def check_fields(doc_type: str, confirmed: dict):
+    """Why doc_type / confirmed field names cannot make a template, or None.
+
+    Both must be FIELD_SPECS names: template_fields only reads a template's boxes
+    for its doc type's fields, so a misspelt one would be a dead required box.
+    """
+    from api.ner_parser import FIELD_SPECS
+    if doc_type not in FIELD_SPECS:
+        return f"Unknown doc_type {doc_type!r} (expected one of: {', '.join(FIELD_SPECS)})"
+    known   = [f.name for f in FIELD_SPECS[doc_type]]
+    unknown = [name for name in confirmed if name not in known]
+    if unknown:
+        return f"Unknown {doc_type} fields: {', '.join(unknown)} (expected: {', '.join(known)})"
+    return None
+
+
+# ── Store ─────────────────────────────────────────────────────────────────────
+class TemplateStore:
+    """sqlite-backed, held in memory; an inverted index on anchor text picks candidates.
+
+    Templates learned, deleted or evicted by another process (batch workers, other
+    uvicorn workers) are picked up on the next lookup: sqlite's data_version moves
+    whenever another connection commits, and the in-memory copy is then reloaded.
+    """
+
+    def __init__(self, path: str = TEMPLATE_DB, max_templates: int = TEMPLATE_MAX,
+                 ttl: float = TEMPLATE_TTL):
+        self.path, self.max_templates, self.ttl = path, max_templates, ttl
+        self._lock      = threading.Lock()
+        self._db        = None
+        self._templates = None     # id → Template, loaded on first use
+        self._index     = {}       # anchor text → {template id}
+        self._dirty     = set()    # ids whose hits / last_used are not in sqlite yet
+        self._flushed   = time.time()
+        self._version   = None     # PRAGMA data_version the in-memory copy was read at
+
+    def _load(self):
+        if self._templates is not None and not self._changed():
+            return
+        if self._dirty:
+            self._flush(time.time())     # keep this process's hits across the reload
+        self._templates, self._index = {}, {}
+        if not os.path.exists(self.path):
+            return
+        for row in self._conn().execute("SELECT id, doc_type, vendor, anchors, fields, created, "
+                                        "last_used, hits FROM templates"):
+            t = Template(row[0], row[1], row[2], json.loads(row[3]), json.loads(row[4]), *row[5:])
+            self._add(t)
+        self._version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        self._evict(time.time())
+
+    def _changed(self) -> bool:
+        """Another process committed since the last load (or created the store)."""
+        if self._db is None:
+            return os.path.exists(self.path)
+        return self._db.execute("PRAGMA data_version").fetchone()[0] != self._version
+
+    def _conn(self):
+        if self._db is None:
+            created = not os.path.exists(self.path)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS templates (id TEXT PRIMARY KEY, "
+                             "doc_type TEXT, vendor TEXT, anchors TEXT, fields TEXT, "
+                             "created REAL, last_used REAL, hits INTEGER)")
+            if created:      # a new, empty store — the in-memory copy is already current
+                self._version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        return self._db
+
+    def _add(self, t: Template):
+        self._templates[t.id] = t
+        for text, _, _ in t.anchors:
+            self._index.setdefault(text, set()).add(t.id)
+
+    def _drop(self, template_id: str):
+        t = self._templates.pop(template_id, None)
+        if t:
+            for text, _, _ in t.anchors:
+                self._index.get(text, set()).discard(template_id)
+            self._conn().execute("DELETE FROM templates WHERE id = ?", (template_id,))
+
+    def _save(self, t: Template):
+        self._conn().execute("INSERT OR REPLACE INTO templates VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (t.id, t.doc_type, t.vendor, json.dumps(t.anchors),
+                              json.dumps(t.fields), t.created, t.last_used, t.hits))
+        self._db.commit()
+
+    def _flush(self, now: float):
+        """Write pending hit counts back and evict — at most every HIT_FLUSH seconds on hits."""
+        rows = [(self._templates[tid].hits, self._templates[tid].last_used, tid)
+                for tid in self._dirty if tid in self._templates]
+        if rows:
+            self._conn().executemany("UPDATE templates SET hits = ?, last_used = ? WHERE id = ?", rows)
+            self._db.commit()
+        self._dirty.clear()
+        self._flushed = now
+        self._evict(now)
+
+    def flush(self):
+        with self._lock:
+            if self._templates is not None:
+                self._flush(time.time())
+
+    def active(self) -> bool:
+        with self._lock:
+            self._load()
+            return bool(self._templates)
+
+    def match(self, layout: list):
+        """Best template whose anchors are on this page, or None."""
+        index = {}
+        for text, x0, y0, *_ in _lines(layout):
+            t = _norm(text)
+            for key in {t, _label(t)} - {None}:
+                index.setdefault(key, []).append((x0, y0))
+        with self._lock:
+            self._load()
+            candidates = set()
+            for text in index:
+                candidates |= self._index.get(text, set())
+            best, best_score = None, MATCH_MIN
+            for tid in candidates:
+                score = self._templates[tid].score(index)
+                if score >= best_score:
+                    best, best_score = self._templates[tid], score
+        return best
+
+    def apply(self, layout: list):
+        """(template, fields) when a template matches and fills every box, else None."""
+        with stage("template_match"):
+            t = self.match(layout)
+            fields = t.read(layout) if t else None
+        if not t or not all(fields.values()):
+            metrics.TEMPLATE_LOOKUPS.inc("miss")
+            return None
+        metrics.TEMPLATE_LOOKUPS.inc("hit")
+        with self._lock:
+            t.hits     += 1
+            t.last_used = time.time()
+            self._dirty.add(t.id)
+            if t.last_used - self._flushed >= HIT_FLUSH:
+                self._flush(t.last_used)
+        return t, fields
+
+    def learn(self, layout: list, doc_type: str, confirmed: dict, vendor: str = None) -> dict:
+        """Template from a page plus its confirmed field values; replaces a matching one."""
+        error = check_fields(doc_type, confirmed)
+        if error:
+            return {"error": error}
+        lines   = _lines(layout)
+        anchors = _anchors(lines, confirmed.values())
+        if len(anchors) < MIN_ANCHORS:
+            return {"error": f"Only {len(anchors)} static label lines on the page — "
+                             f"need {MIN_ANCHORS} to fingerprint the layout"}
+        fields, missing = {}, []
+        for name, value in confirmed.items():
+            box, prefix = _locate(lines, str(value)) if value else (None, None)
+            if box is None:
+                missing.append(name)
+            else:
+                fields[name] = {"box": box, "prefix": prefix}
+        if not fields:
+            return {"error": f"None of the confirmed values were found on the page: {', '.join(missing)}"}
+
+        existing = self.match(layout)
+        now      = time.time()
+        with self._lock:
+            self._load()
+            if existing and existing.doc_type == doc_type:
+                self._drop(existing.id)
+                t = Template(existing.id, doc_type, vendor or existing.vendor, anchors, fields,
+                             existing.created, now, existing.hits)
+            else:
+                t = Template(uuid.uuid4().hex[:12], doc_type, vendor, anchors, fields, now, now)
+            self._add(t)
+            self._save(t)
+            self._flush(now)
+        page_store.store.clear()         # stored pages of this vendor predate the template
+        return {"status": "success", **t.summary(), "not_found": missing}
+
+    def _evict(self, now: float):
+        stale = [tid for tid, t in self._templates.items() if now - t.last_used > self.ttl]
+        by_age = sorted(self._templates.values(), key=lambda t: t.last_used)
+        stale += [t.id for t in by_age[:max(0, len(by_age) - self.max_templates)]]
+        for tid in set(stale):
+            self._drop(tid)
+        if stale:
+            self._db.commit()
+            page_store.store.clear()     # stored pages may carry a dropped template's id
+
+    def evict(self) -> int:
+        with self._lock:
+            self._load()
+            before = len(self._templates)
+            self._flush(time.time())
+            return before - len(self._templates)
+
+    def delete(self, template_id: str) -> bool:
+        with self._lock:
+            self._load()
+            if template_id not in self._templates:
+                return False
+            self._drop(template_id)
+            self._db.commit()
+        page_store.store.clear()
+        return True
+
+    def list(self) -> list:
+        with self._lock:
+            self._load()
+            return [t.summary() for t in sorted(self._templates.values(), key=lambda t: -t.hits)]
+
+
+store = TemplateStore()
+atexit.register(store.flush)
+
+
+def template_fields(template: Template, values: dict, text: str, sources: dict) -> dict:
+    """Template values in the doc type's usual field order; fields it has no box for use regex."""
+    from api.ner_parser import FIELD_SPECS
+    specs = FIELD_SPECS.get(template.doc_type)
+    if specs is None:
+        sources.update(dict.fromkeys(values, "template"))
+        return dict(values)
+    fields = {}
+    for f in specs:
+        if f.name in values:
+            fields[f.name], sources[f.name] = values[f.name], "template"
+        else:
+            value = f.fallback(text) if f.fallback else None
+            fields[f.name], sources[f.name] = value or ([] if f.many else None), "regex" if value else None
+    if template.doc_type in ("invoice", "purchase_order"):
+        fields["items"] = []
+    return fields
@@ -0,0 +1,193 @@
+"""
+word.py - Word documents: container detection, streaming DOCX reader, embedded images
+word/document.xml is parsed with iterparse straight out of the zip — paragraphs
+and table rows come out in reading order and each finished block is dropped, so
+memory stays flat on a 500-page contract.
+
+Legacy .doc (OLE) goes through antiword, or LibreOffice (soffice) converts it — and
+RTF — to DOCX; with neither installed they are rejected rather than guessed at.
+"""
+
+import io, os, shutil, subprocess, zipfile
+import xml.etree.ElementTree as ET
+
+from api.parsers import is_item_header, table_row_item
+
+CONVERT_TIMEOUT = 120     # seconds for antiword / soffice
+MEDIA_MAX       = int(os.getenv("WORD_MEDIA_MAX", "20"))   # embedded images OCR'd per document
+MEDIA_MIN_SIDE  = 200     # px — smaller images are logos, signatures, bullets
+MEDIA_EXTS      = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".gif", ".webp")
+WORD_EXTS       = (".docx", ".doc")
+
+_OLE = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+
+# ── Container ─────────────────────────────────────────────────────────────────
+def container(path: str):
+    """Container by content, not extension: "docx", "doc" (OLE compound file), "rtf" or None."""
+    with open(path, "rb") as f:
+        head = f.read(8)
+    if head.startswith(b"PK\x03\x04"):
+        try:
+            with zipfile.ZipFile(path) as zf:
+                return "docx" if "word/document.xml" in zf.namelist() else None
+        except zipfile.BadZipFile:
+            return None
+    if head == _OLE:
+        return "doc"
+    if head.startswith(b"{\\rtf"):
+        return "rtf"
+    return None
+
+
+def open_word(path: str, tmpdir: str) -> tuple:
+    """(DOCX path, None) or (None, plain text) for any Word upload; ValueError if unreadable."""
+    kind = container(path)
+    if kind == "docx":
+        return path, None
+    if kind is None:
+        raise ValueError("Not a Word document (no DOCX, DOC or RTF signature)")
+    failed = None
+    if kind == "doc" and shutil.which("antiword"):
+        try:
+            run = subprocess.run(["antiword", "-w", "0", path], capture_output=True,
+                                 timeout=CONVERT_TIMEOUT)
+            if run.returncode == 0:
+                return None, run.stdout.decode("utf-8", "replace")
+            failed = run.stderr.decode("utf-8", "replace").strip() or f"exit {run.returncode}"
+        except subprocess.TimeoutExpired:
+            failed = f"timed out after {CONVERT_TIMEOUT}s"
+        # Word 6/95 and fast-saved files defeat antiword — LibreOffice reads most of them
+    soffice = shutil.which("soffice") or shutil.which("libreoffice")
+    if soffice:
+        subprocess.run([soffice, "--headless", "--convert-to", "docx", "--outdir", tmpdir, path],
+                       capture_output=True, timeout=CONVERT_TIMEOUT, check=True)
+        converted = os.path.join(tmpdir, os.path.splitext(os.path.basename(path))[0] + ".docx")
+        if os.path.exists(converted):
+            return converted, None
+        raise ValueError(f"LibreOffice could not convert this {kind.upper()} file")
+    if failed:
+        raise ValueError(f"antiword could not read this DOC file ({failed}) and LibreOffice "
+                         f"(soffice) is not installed")
+    tools = "antiword or LibreOffice (soffice)" if kind == "doc" else "LibreOffice (soffice)"
+    raise ValueError(f"Legacy {kind.upper()} files need {tools} installed on the server")
+
+
+# ── DOCX ──────────────────────────────────────────────────────────────────────
+_W    = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_BODY = _W + "body"
+_P    = _W + "p"
+_T    = _W + "t"
+_TBL  = _W + "tbl"
+_TR   = _W + "tr"
+_TC   = _W + "tc"
+_GAPS = {_W + "tab", _W + "br", _W + "cr"}     # read as a space
+
+
+def iter_docx(path: str):
+    """("p", text) / ("table", None) / ("row", [cell texts]) in document order.
+
+    Nested tables are flattened into the text of the outer cell; deleted text
+    (tracked changes) and field codes are skipped, as Word shows them.
+    """
+    with zipfile.ZipFile(path) as zf, zf.open("word/document.xml") as xml:
+        body  = None
+        paras = []        # text of open paragraphs — text boxes nest them
+        depth = 0         # open w:tbl elements
+        row = cell = None
+        for event, el in ET.iterparse(xml, events=("start", "end")):
+            tag = el.tag
+            if event == "start":
+                if tag == _P:
+                    paras.append([])
+                elif tag == _TBL:
+                    depth += 1
+                    if depth == 1:
+                        yield "table", None
+                elif depth == 1 and tag == _TR:
+                    row = []
+                elif depth == 1 and tag == _TC:
+                    cell = []
+                elif tag == _BODY:
+                    body = el
+                continue
+
+            if tag == _T:
+                if paras:
+                    paras[-1].append(el.text or "")
+            elif tag in _GAPS:
+                if paras:
+                    paras[-1].append(" ")
+            elif tag == _P:
+                text = "".join(paras.pop()).strip()
+                if depth and cell is not None:
+                    if text:
+                        cell.append(text)
+                elif text:
+                    yield "p", text
+            elif depth == 1 and tag == _TC:
+                row.append(" ".join(cell))
+                cell = None
+            elif depth == 1 and tag == _TR:
+                yield "row", row
+                row = None
+            elif tag == _TBL:
+                depth -= 1
+
+            # A finished top-level block is never looked at again
+            if body is not None and not depth and not paras and tag in (_P, _TBL):
+                body.clear()
+
+
+def read_docx(path: str) -> tuple:
+    """(text, items): paragraphs and " | "-joined rows as lines; rows under an item header as items.
+
+    Only a table whose first row names item columns (parsers.is_item_header) gives items;
+    layout tables — label/value grids, address blocks — are text only.
+    """
+    lines, items, header = [], [], None
+    for kind, value in iter_docx(path):
+        if kind == "p":
+            lines.append(value)
+        elif kind == "table":
+            header = None
+        else:
+            row_text = " | ".join(c for c in value if c)
+            if row_text:
+                lines.append(row_text)
+            if header is None:
+                header = value if is_item_header(value) else False
+            elif header:
+                item = table_row_item(header, value)
+                if item:
+                    items.append(item)
+    return "\n".join(lines), items
+
+
+# ── Embedded images ───────────────────────────────────────────────────────────
+def media_images(path: str, skipped: list = None):
+    """(name, OCR array) for each page-sized image in word/media — scans pasted into Word.
+
+    An image that cannot be decoded is left out and reported in skipped as {"name", "error"}.
+    """
+    from PIL import Image
+    from api.imaging import load_image
+    with zipfile.ZipFile(path) as zf:
+        names = [n for n in zf.namelist()
+                 if n.startswith("word/media/") and n.lower().endswith(MEDIA_EXTS)]
+        taken = 0
+        for name in sorted(names):
+            if taken >= MEDIA_MAX:
+                break
+            data = io.BytesIO(zf.read(name))
+            try:
+                with Image.open(data) as img:   # header only — skip logos before decoding
+                    if min(img.size) < MEDIA_MIN_SIDE:
+                        continue
+                data.seek(0)
+                image = load_image(data)
+            except (OSError, ValueError, RuntimeError, Image.DecompressionBombError) as e:
+                if skipped is not None:
+                    skipped.append({"name": os.path.basename(name), "error": f"unreadable image: {e}"})
+                continue
+            taken += 1
+            yield os.path.basename(name), image
@@ -0,0 +1,18 @@
+"""
+tests/conftest.py — Fixtures shared across test modules
+"""
+import pytest
+
+
+@pytest.fixture
+def native_pdf():
+    """native_pdf(text) → bytes of a one-page PDF carrying text as native text."""
+    import fitz
+
+    def make(text: str) -> bytes:
+        doc = fitz.open()
+        doc.new_page().insert_text((72, 72), text)
+        data = doc.tobytes()
+        doc.close()
+        return data
+    return make
@@ -32,4 +32,108 @@ def test_invalid_image_type():
         files={"file": ("test.pdf", b"fake", "application/pdf")}
     )
     assert response.status_code == 200
-    assert "error" in response.json()
\ No newline at end of file
+    assert "error" in response.json()
+
+
+def test_metrics_endpoint():
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "# TYPE ocr_stage_duration_seconds histogram" in response.text
+    assert "ocr_queue_depth" in response.text
+    assert "ocr_requests_in_flight" in response.text
+
+
+def test_extract_timings(native_pdf):
+    pdf = native_pdf("Invoice No: INV/2025/0118\nInvoice Date: 05 Feb 2025\nGrand Total: Rs. 88,983.50")
+    response = client.post(
+        "/extract?timings=true",
+        files={"file": ("timings.pdf", pdf, "application/pdf")}
+    )
+    body = response.json()
+    assert body["status"] == "success"
+    for span in ("upload_write", "open", "native_text", "classify", "ner"):
+        assert span in body["meta"]["timings"]
+    assert 'stage="ner"' in client.get("/metrics").text
+
+
+def test_extract_batch_partial_failure(native_pdf):
+    import io, zipfile
+    pdf = native_pdf("Invoice No: INV/2025/0118\nGrand Total: Rs. 88,983.50")
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("zipped.pdf", pdf)
+        zf.writestr("readme.txt", b"not a document")
+    response = client.post(
+        "/extract/batch",
+        files=[("files", ("a.pdf", pdf, "application/pdf")),
+               ("files", ("broken.pdf", b"fake", "application/pdf")),
+               ("files", ("bundle.zip", buf.getvalue(), "application/zip"))]
+    )
+    body = response.json()
+    assert body["total_files"] == 4
+    assert body["succeeded"] == 2 and body["failed"] == 2
+    status = {r["file_name"]: r["status"] for r in body["results"]}
+    assert status == {"a.pdf": "success", "broken.pdf": "error",
+                      "zipped.pdf": "success", "readme.txt": "error"}
+
+
+def test_extract_batch_stream(native_pdf):
+    import json
+    pdf = native_pdf("Invoice No: INV/2025/0118\nGrand Total: Rs. 88,983.50")
+    response = client.post(
+        "/extract/batch?stream=true",
+        files=[("files", ("a.pdf", pdf, "application/pdf")),
+               ("files", ("b.pdf", pdf, "application/pdf"))]
+    )
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(l) for l in response.text.splitlines()]
+    assert [l["status"] for l in lines[:2]] == ["success", "success"]
+    assert lines[-1]["status"] == "done" and lines[-1]["succeeded"] == 2
+
+
+def test_extract_strategy(native_pdf):
+    pdf = native_pdf("Invoice No: INV/2025/0118\nInvoice Date: 05 Feb 2025\nGrand Total: Rs. 88,983.50")
+    body = client.post(
+        "/extract?strategy=regex_first",
+        files={"file": ("strategy.pdf", pdf, "application/pdf")}
+    ).json()
+    assert body["meta"]["extraction_strategy"] == "regex_first"
+    assert body["pages"][0]["field_sources"]["invoice_number"] == "regex"
+
+    response = client.post(
+        "/extract?strategy=fastest",
+        files={"file": ("strategy.pdf", pdf, "application/pdf")}
+    )
+    assert "error" in response.json()
+
+
+def test_select_pages():
+    from api.api import parse_pages, select_pages
+    assert parse_pages("1-3,10") == [(1, 3), (10, 10)]
+    assert select_pages(12, "10,1-3,2") == [0, 1, 2, 9]
+    assert select_pages(6, "5-", max_pages=1) == [4]
+    assert select_pages(3, "2-40") == [1, 2]
+    with pytest.raises(ValueError):
+        parse_pages("3-1")
+
+
+def test_extract_page_selection_and_stop_when():
+    import fitz
+    invoice = ("TAX INVOICE\nInvoice No: INV/2025/0118\nInvoice Date: 05 Feb 2025\nBill To:\n"
+               "Apex Traders Pvt Ltd.\nCGST @ 9%: Rs. 6,787.50\nGrand Total: Rs. 88,983.50")
+    doc = fitz.open()
+    for text in ("Cover letter for the attached documents, please find enclosed", invoice,
+                 invoice, "Annexure with terms and conditions of the delivery schedule"):
+        doc.new_page().insert_text((72, 72), text)
+    pdf = doc.tobytes()
+    doc.close()
+
+    body = client.post("/extract?pages=3-4", files={"file": ("bundle.pdf", pdf)}).json()
+    assert [p["page"] for p in body["pages"]] == [3, 4]
+    assert body["document_pages"] == 4
+
+    body = client.post("/extract?stop_when=invoice&strategy=regex_first",
+                       files={"file": ("bundle.pdf", pdf)}).json()
+    assert [p["page"] for p in body["pages"]] == [1, 2]
+
+    assert "error" in client.post("/extract?pages=x", files={"file": ("bundle.pdf", pdf)}).json()
@@ -0,0 +1,26 @@
+"""
+tests/test_batch.py — Bulk extraction CLI
+"""
+import json, zipfile
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from api.batch import run_batch
+
+
+def test_batch_zip_and_resume(tmp_path, native_pdf):
+    archive = tmp_path / "batch.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("inv.pdf", native_pdf("Invoice No: INV/2025/0118\nGrand Total: Rs. 88,983.50"))
+        zf.writestr("broken.pdf", b"not a pdf")
+        zf.writestr("notes.txt", b"skipped")
+    out = str(tmp_path / "out.jsonl")
+
+    summary = run_batch([str(archive)], out, workers=1)
+    assert (summary["success"], summary["error"]) == (1, 1)   # one bad file, batch continues
+    rows = {json.loads(l)["source"].split("!")[1]: json.loads(l) for l in open(out)}
+    assert rows["inv.pdf"]["result"]["pages"][0]["doc_type"] == "invoice"
+    assert rows["broken.pdf"]["status"] == "error"
+
+    summary = run_batch([str(archive)], out, workers=1, resume=True)
+    assert summary["skipped"] == 2 and summary["processed"] == 0
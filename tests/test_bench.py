@@ -0,0 +1,32 @@
+"""
+tests/test_bench.py — Benchmark harness helpers
+"""
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from api.bench import compare, synthetic_invoice_pdf
+
+
+def _result(p50, pps, rss=100.0):
+    return {"meta": {"commit": "x"},
+            "cases": {"a.pdf": {"p50_ms": p50, "p95_ms": p50, "pages_per_sec": pps,
+                                "peak_rss_mb": rss}}}
+
+
+def test_compare_flags_regression():
+    regressions = compare(_result(100, 10.0), _result(150, 6.0), threshold=0.15)
+    metrics = {metric for _, metric, _, _ in regressions}
+    assert metrics == {"p50_ms", "p95_ms", "pages_per_sec"}
+
+
+def test_compare_within_threshold():
+    assert compare(_result(100, 10.0), _result(110, 9.5), threshold=0.15) == []
+
+
+def test_synthetic_invoice_rows(tmp_path):
+    import fitz
+    path = str(tmp_path / "rows.pdf")
+    synthetic_invoice_pdf(path, n_rows=100, rows_per_page=45)
+    with fitz.open(path) as doc:
+        assert len(doc) == 3
+        assert "100" in doc[2].get_text("text")
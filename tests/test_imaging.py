@@ -0,0 +1,111 @@
+"""
+tests/test_imaging.py — Image ingestion for OCR
+"""
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from api.api import select_pages
+from api.imaging import (AVIF_SUPPORT, OCR_WIDTH, frame_count, iter_frames, load_image,
+                         prefetch, to_ocr_array)
+
+
+def test_jpeg_draft_decode_honours_exif_orientation(tmp_path):
+    img  = Image.new("RGB", (4000, 3000), (200, 30, 30))
+    exif = img.getexif()
+    exif[0x0112] = 6                              # stored landscape, shown portrait
+    path = str(tmp_path / "phone.jpg")
+    img.save(path, quality=90, exif=exif)
+
+    arr = load_image(path)
+    assert arr.dtype == np.uint8 and arr.shape == (1600, OCR_WIDTH, 3)
+    assert abs(int(arr[800, 600, 0]) - 200) < 8
+
+
+def test_mode_normalization(tmp_path):
+    deep = tmp_path / "scan16.png"
+    Image.fromarray(np.linspace(0, 4000, 600 * 400, dtype=np.uint16).reshape(400, 600)).save(deep)
+    arr = load_image(str(deep))
+    assert arr.shape == (800, OCR_WIDTH, 3) and arr.max() > 250
+
+    clear = Image.new("RGBA", (300, 100), (0, 0, 0, 0))
+    assert to_ocr_array(clear).min() == 255       # transparency → white, not black
+
+    palette = Image.new("P", (2400, 100), 3)
+    assert to_ocr_array(palette).shape == (50, OCR_WIDTH, 3)
+
+
+def test_multi_frame_tiff_selected_frames(tmp_path):
+    path   = str(tmp_path / "fax.tif")
+    frames = [Image.new("L", (600, 800), shade) for shade in (10, 120, 240)]
+    frames[0].save(path, save_all=True, append_images=frames[1:])
+
+    assert frame_count(path) == 3
+    got = list(prefetch(iter_frames(path, select_pages(3, "2-3"))))
+    assert [i for i, _ in got] == [1, 2]
+    assert got[0][1].shape == (1600, OCR_WIDTH, 3) and int(got[1][1][5, 5, 0]) == 240
+
+
+def test_phone_mpo_is_one_image(tmp_path, monkeypatch):
+    from api import api
+    path  = str(tmp_path / "camera.jpg")
+    photo = Image.new("RGB", (4000, 3000), (30, 200, 30))
+    photo.save(path, format="MPO", save_all=True, append_images=[photo.resize((640, 480))])
+    with Image.open(path) as img:
+        assert img.format == "MPO" and img.n_frames == 2
+    assert frame_count(path) == 1 and load_image(path).shape == (900, OCR_WIDTH, 3)
+
+    seen = []
+    monkeypatch.setattr(api, "extract_single_page", lambda image, hires=None: seen.append(image.shape) or {
+        "formatted_text": "", "confidence_score": 0.0, "confidence_stats": {}, "line_items": None})
+    monkeypatch.setattr(api, "extract_fields", lambda *a, **k: ("unknown", {}, None))
+    result = api.extract_file(path, ".jpg", "camera.jpg")
+    assert "pages" not in result and seen == [(900, OCR_WIDTH, 3)]
+
+
+def test_prefetch_propagates_errors_and_stops_early():
+    def frames():
+        yield 1
+        raise ValueError("corrupt frame")
+
+    with pytest.raises(ValueError):
+        list(prefetch(frames()))
+
+    walk = prefetch(iter(range(1000)), depth=2)
+    assert next(walk) == 0
+    walk.close()                                   # joins the helper thread
+
+
+def test_prefetch_starts_before_the_first_item_is_asked_for():
+    import threading
+    started = threading.Event()
+
+    def work():
+        started.set()
+        yield "page"
+
+    walk = prefetch(work())
+    assert started.wait(2)                         # running while the caller does other work
+    assert list(walk) == ["page"]
+
+    idle = prefetch(iter(range(1000)), depth=2)
+    idle.close()                                   # never iterated — still stopped and joined
+
+
+def test_webp_and_unreadable_avif(tmp_path):
+    webp = str(tmp_path / "scan.webp")
+    Image.new("RGB", (2400, 200), (255, 255, 255)).save(webp, lossless=True)
+    assert load_image(webp).shape == (100, OCR_WIDTH, 3)
+
+    if not AVIF_SUPPORT:
+        avif = tmp_path / "photo.avif"
+        avif.write_bytes(b"\x00\x00\x00\x1cftypavif" + b"\x00" * 64)
+        with pytest.raises(RuntimeError, match="AVIF"):
+            load_image(str(avif))
+    else:
+        sample = os.path.join(os.path.dirname(os.path.dirname(__file__)), "sample datas",
+                              "invoice sample.avif")
+        assert load_image(sample).shape[1] == OCR_WIDTH
@@ -0,0 +1,28 @@
+"""
+tests/test_loadtest.py — Load generator helpers
+"""
+import pytest
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from api.loadtest import Recorder, parse_mix, summarize
+
+
+def test_parse_mix():
+    assert parse_mix("pdf=6,image=2,docx") == {"pdf": 6.0, "image": 2.0, "docx": 1.0}
+    with pytest.raises(ValueError):
+        parse_mix("tiff=1")
+
+
+def test_summarize_reports_errors_and_saturation():
+    rec = Recorder()
+    rec.add("pdf", 0.2, True)
+    rec.add("pdf", 0.4, True)
+    rec.add("image", 1.0, False)
+    rec.gauges = [(0, 1, 2), (3, 2, 2)]
+    report = summarize(rec, elapsed=2.0)
+    assert report["requests"] == 3
+    assert report["error_rate"] == round(1 / 3, 4)
+    assert report["throughput_rps"] == 1.0
+    assert report["server"]["queue_depth_max"] == 3
+    assert report["server"]["saturated_frac"] == 0.5
@@ -0,0 +1,111 @@
+"""
+tests/test_memguard.py — Memory-bounded PDF extraction
+"""
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import tracemalloc
+import fitz
+from fastapi.testclient import TestClient
+
+from api import memguard
+from api.api import app, extract_pdf_pages
+
+client = TestClient(app)
+
+PAGE_TEXT = ("Annexure with terms and conditions of the delivery schedule\n"
+             "Payment within thirty days of receipt of goods at the warehouse\n") * 6
+
+
+def _long_pdf(path, n_pages: int) -> str:
+    doc = fitz.open()
+    for _ in range(n_pages):
+        doc.new_page().insert_text((72, 72), PAGE_TEXT)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def _peak(path: str, low_memory: bool) -> int:
+    tracemalloc.start()
+    pages, _, _ = extract_pdf_pages(path, strategy="ner_first", low_memory=low_memory)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    if low_memory:
+        pages.close()
+    return peak
+
+
+def test_low_memory_is_flat_across_page_counts(tmp_path):
+    small = _long_pdf(tmp_path / "small.pdf", 20)
+    large = _long_pdf(tmp_path / "large.pdf", 150)
+    _peak(small, True)                                   # warm model + caches
+
+    flat_small, flat_large = _peak(small, True), _peak(large, True)
+    grows = _peak(large, False)
+    assert flat_large < flat_small * 1.5 + 256 * 1024
+    assert grows > flat_large * 2
+
+
+def test_low_memory_response_streams_same_document(tmp_path):
+    with open(_long_pdf(tmp_path / "doc.pdf", 3), "rb") as f:
+        pdf = f.read()
+    normal = client.post("/extract", files={"file": ("doc.pdf", pdf)}).json()
+    spilled = client.post("/extract?low_memory=true", files={"file": ("doc.pdf", pdf)})
+    assert spilled.headers["content-type"] == "application/json"
+    body = spilled.json()
+    assert body["total_pages"] == 3
+    assert body["pages"] == normal["pages"]
+
+
+def test_over_ceiling_pages_wait_for_pages_in_flight_not_for_rss():
+    import threading, time
+    start = time.perf_counter()
+    memguard.wait_for_memory(ceiling_mb=1, timeout=5)     # always above 1 MB, nothing in flight
+    assert time.perf_counter() - start < 1
+
+    held, done = threading.Event(), threading.Event()
+
+    def page():
+        with memguard.page_slot():
+            held.set()
+            time.sleep(0.3)
+        done.set()
+
+    threading.Thread(target=page).start()
+    held.wait()
+    with memguard.page_slot(ceiling_mb=1, timeout=5):     # starts once the other page ends
+        assert done.is_set()
+
+
+def _scanned_pdf(path, n_pages: int) -> str:
+    # Image-only A4 pages at 150 DPI, each with its own embedded scan
+    doc = fitz.open()
+    for i in range(n_pages):
+        pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 1240, 1754), False)
+        pix.clear_with(200 + i)
+        doc.new_page().insert_image(fitz.Rect(0, 0, 595, 842), pixmap=pix)
+    doc.save(str(path), deflate=True)
+    doc.close()
+    return str(path)
+
+
+def test_scanned_low_memory_rss_is_flat(tmp_path, monkeypatch):
+    from api import api
+    rss, rendered = [], []
+
+    def ocr(image, hires=None):
+        rss.append(memguard.rss_bytes())                  # this page's render is live here
+        rendered.append(image.nbytes)
+        return {"formatted_text": "", "confidence_score": 0.0, "confidence_stats": {},
+                "line_items": None}
+
+    monkeypatch.setattr(api, "extract_single_page", ocr)
+    monkeypatch.setattr(api, "extract_fields", lambda *a, **k: ("unknown", {}, None))
+    monkeypatch.setattr(memguard, "RSS_CEILING_MB", 1)     # every page goes through the gate
+    pages, _, _ = extract_pdf_pages(_scanned_pdf(tmp_path / "scan.pdf", 40),
+                                    strategy="regex_first", low_memory=True)
+    pages.close()
+    assert len(rss) == 40 and sum(rendered) > 200 * 1024 * 1024
+    # Past the first few pages (allocator warm-up) RSS stays put — renders are not kept
+    assert max(rss[5:]) - rss[5] < sum(rendered) / 10
@@ -0,0 +1,108 @@
+"""
+tests/test_native.py — Structured native PDF text and label/value lookup
+"""
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import fitz
+
+from api.native import NativePage
+from api.ner_parser import extract_with_ner
+
+
+def _two_column_invoice():
+    # Labels are written first and the value column last, so the block-ordered
+    # plain text puts every value after every label
+    doc  = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 60), "TAX INVOICE", fontname="hebo", fontsize=16)
+    rows = [("Invoice No:", "INV/2025/0118"), ("Invoice Date:", "05 Feb 2025"),
+            ("Bill To:", "Apex Traders Pvt Ltd."), ("CGST @ 9%:", "Rs. 6,787.50")]
+    for i, (label, _) in enumerate(rows):
+        page.insert_text((72, 100 + i * 20), label, fontname="hebo", fontsize=10)
+    page.insert_text((72, 200), "Grand Total", fontname="hebo", fontsize=10)
+    for i, (_, value) in enumerate(rows):
+        page.insert_text((300, 100 + i * 20), value, fontsize=10)
+    page.insert_text((72, 214), "Rs. 88,983.50", fontsize=10)
+    return doc, page
+
+
+def test_lines_carry_boxes_and_fonts():
+    doc, page = _two_column_invoice()
+    lines = NativePage(page).lines()
+    assert lines[0].text == "TAX INVOICE" and lines[0].bold and lines[0].size == 16
+    value = next(l for l in lines if l.text == "05 Feb 2025")
+    assert not value.bold and value.x0 == 300
+
+
+def test_label_snippets_pair_labels_with_row_and_below_values():
+    doc, page = _two_column_invoice()
+    native = NativePage(page)
+    assert native.label_snippets(r"date") == "Invoice Date: 05 Feb 2025"
+    # a bold line under a bold label is the next label, not its value
+    assert native.label_snippets(r"invoice\s*no") == "Invoice No: INV/2025/0118"
+    assert native.label_snippets(r"total") == "Grand Total\nRs. 88,983.50"
+
+
+def test_layout_lookup_fills_fields_the_text_regex_missed():
+    doc, page = _two_column_invoice()
+    native  = NativePage(page)
+    sources = {}
+    fields  = extract_with_ner(native.text(), "invoice", "regex_first", sources,
+                               lookup=native.label_snippets)
+    assert fields["date"] == "05 Feb 2025" and sources["date"] == "layout"
+    assert fields["total_amount"] == "88,983.50"
+
+
+def test_item_table_gate_needs_a_header_row():
+    doc, page = _two_column_invoice()
+    assert not NativePage(page).has_item_table()
+    page.insert_text((72, 260), "S.No   Item Description          Qty     Amount (Rs.)", fontsize=10)
+    # "Amount" alone in a sentence is not a table header row
+    page.insert_text((72, 300), "Amount in words: Rupees Eighty Eight Thousand", fontsize=10)
+    assert NativePage(page).has_item_table()
+
+
+def _ruled_table(rows, widths):
+    doc, y = fitz.open(), 100
+    page   = doc.new_page()
+    for r, cells in enumerate(rows):
+        x = 50
+        for w, cell in zip(widths, cells):
+            page.draw_rect(fitz.Rect(x, y + r * 18, x + w, y + (r + 1) * 18), width=0.5)
+            page.insert_text((x + 3, y + r * 18 + 13), cell, fontsize=9)
+            x += w
+    return doc, page
+
+
+def test_tables_with_other_item_headings_still_give_items():
+    from api.api import pymupdf_table_to_items
+    for header in (["S.No", "Particulars", "Price", "Total"], ["Sl.", "Item", "Units", "Value"]):
+        doc, page = _ruled_table([header, ["1", "Steel rods", "3,100.00", "12,400.00"],
+                                  ["2", "Bolts", "40.00", "800.00"]], (40, 200, 80, 90))
+        items = pymupdf_table_to_items(page, NativePage(page))
+        assert [i[header[1]] for i in items] == ["Steel rods", "Bolts"], header
+
+
+def test_headerless_continuation_table_still_gives_items(tmp_path, monkeypatch):
+    from api import api
+    rows = [["1", "Steel rods", "4", "3,100.00", "12,400.00"],
+            ["2", "Bolts", "20", "40.00", "800.00"],
+            ["3", "Washers", "50", "2.00", "100.00"]]
+    doc, page = _ruled_table(rows, (40, 200, 40, 80, 90))
+    page.insert_text((50, 60), "TAX INVOICE No: INV/2025/0118 (continued)")
+    native = NativePage(page)
+    assert not native.has_item_table() and native.has_ruling() and native.has_number_columns()
+    ungated = len(api.pymupdf_table_to_items(page))
+    assert ungated and len(api.pymupdf_table_to_items(page, native)) == ungated
+
+    # Heading rows alone would skip page 2 — it is searched because page 1 gave line items
+    first = _ruled_table([["S.No", "Description", "Qty", "Rate", "Amount"]] + rows,
+                         (40, 200, 40, 80, 90))[0]
+    first[0].insert_text((50, 60), "TAX INVOICE No: INV/2025/0118")
+    first.insert_pdf(doc)
+    path = str(tmp_path / "invoice.pdf")
+    first.save(path)
+    monkeypatch.setattr(NativePage, "may_have_table", NativePage.has_item_table)
+    pages, _, _ = api.extract_pdf_pages(path, strategy="regex_first")
+    assert [len(p["fields"].get("items", [])) for p in pages] == [3, ungated]
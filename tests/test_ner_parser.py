@@ -0,0 +1,89 @@
+"""
+tests/test_ner_parser.py — Field mapping strategies
+"""
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+from api import metrics
+from api.ner_parser import _lines_near, FIELD_SPECS, extract_with_ner
+
+INVOICE = """TAX INVOICE
+Invoice No: INV/2025/0118
+Invoice Date: 05 Feb 2025
+Bill To:
+Apex Traders Pvt Ltd.
+CGST @ 9%: Rs. 6,787.50
+Grand Total: Rs. 88,983.50"""
+
+
+def test_regex_first_skips_ner_when_complete():
+    sources = {}
+    with metrics.collect() as spans:
+        fields = extract_with_ner(INVOICE, "invoice", "regex_first", sources)
+    assert fields["invoice_number"] == "INV/2025/0118"
+    assert fields["total_amount"] == "88,983.50"
+    assert fields["items"] == []
+    assert set(sources.values()) == {"regex"}
+    assert "ner" not in spans
+
+
+def test_regex_first_runs_ner_only_near_missing_labels():
+    text    = INVOICE.replace("Grand Total: Rs. 88,983.50", "Grand Total:\nEighty thousand")
+    lines   = [l for l in text.split("\n") if l]
+    missing = [f for f in FIELD_SPECS["invoice"] if f.name == "total_amount"]
+    assert _lines_near(lines, missing) == ["Grand Total:", "Eighty thousand"]
+
+    sources = {}
+    with metrics.collect() as spans:
+        extract_with_ner(text, "invoice", "regex_first", sources)
+    assert "ner" in spans
+    assert sources["invoice_number"] == "regex"
+    assert sources["total_amount"] in ("ner", None)
+
+
+def test_ner_first_keeps_field_order():
+    sources = {}
+    fields  = extract_with_ner(INVOICE, "invoice", "ner_first", sources)
+    assert list(fields) == ["invoice_number", "date", "vendor", "total_amount", "gst", "items"]
+    assert set(sources) == set(fields) - {"items"}
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError, match="Unknown strategy"):
+        extract_with_ner(INVOICE, "invoice", "fastest")
+
+
+def test_line_cache_hits_and_disk_tier(tmp_path, monkeypatch):
+    from api import ner_parser
+    db = str(tmp_path / "ner_cache.sqlite")
+    monkeypatch.setattr(ner_parser, "line_cache", ner_parser.LineCache(100, db))
+    nlp   = ner_parser.load_routed_model("invoice")
+    lines = INVOICE.split("\n")
+
+    first = ner_parser._ner_entities(nlp, lines)
+    hits  = metrics.NER_CACHE.get("hit")
+    assert ner_parser._ner_entities(nlp, lines) == first
+    assert metrics.NER_CACHE.get("hit") - hits == len(lines)
+
+    # A second worker process sees the shared sqlite tier
+    monkeypatch.setattr(ner_parser, "line_cache", ner_parser.LineCache(100, db))
+    disk = metrics.NER_CACHE.get("disk_hit")
+    assert ner_parser._ner_entities(nlp, lines) == first
+    assert metrics.NER_CACHE.get("disk_hit") - disk == len(lines)
+
+    # A retrained model gets a new version — nothing stale is served
+    monkeypatch.setitem(ner_parser._versions, id(nlp), "ocr_ner_model@retrained")
+    misses = metrics.NER_CACHE.get("miss")
+    ner_parser._ner_entities(nlp, lines)
+    assert metrics.NER_CACHE.get("miss") - misses == len(lines)
+
+
+def test_line_cache_is_bounded():
+    from api.ner_parser import LineCache
+    cache = LineCache(2)
+    for i in range(5):
+        cache.put("m@1", f"line {i}", ())
+    assert len(cache) == 2
+    assert cache.get("m@1", "line 0") is None
+    assert cache.get("m@1", "line 4") == ()
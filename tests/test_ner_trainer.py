@@ -0,0 +1,73 @@
+"""
+tests/test_ner_trainer.py — DocBin corpus + minibatch NER training
+"""
+import json
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import spacy
+from api.ner_trainer import TRAIN_DATA, build_docbins, read_docbins, train_ner_model
+
+
+def test_build_docbins_skips_misaligned(tmp_path):
+    nlp = spacy.blank("en")
+    examples = [("Invoice No: INV/2025/0118", {"entities": [(12, 25, "INVOICE_NO")]}),
+                ("Qty: 10", {"entities": [(5, 6, "QUANTITY")]})]      # inside the token "10"
+    stats = build_docbins(examples, nlp, str(tmp_path))
+    assert stats["train"] == 2 and stats["skipped_spans"] == 1
+    docs = [ex.reference for ex in read_docbins(nlp, str(tmp_path), "train")]
+    assert [(e.text, e.label_) for e in docs[0].ents] == [("INV/2025/0118", "INVOICE_NO")]
+
+
+def test_build_docbins_on_a_pool_keeps_order_and_kept_labels(tmp_path, monkeypatch):
+    from api import ner_trainer
+    monkeypatch.setattr(ner_trainer, "SHARD_SIZE", 10)
+    examples = list(TRAIN_DATA[:25])
+    examples.append(("Qty: 10 Roll", {"entities": [(0, 7, "QUANTITY"), (5, 12, "UNIT")]}))  # overlap
+    nlp   = spacy.blank("en")
+    stats = build_docbins(examples, nlp, str(tmp_path), workers=2)
+    assert stats["train"] == 25 and stats["skipped_spans"] == 2
+    assert "UNIT" not in stats["labels"] and "INVOICE_NO" in stats["labels"]
+    texts = [ex.reference.text for ex in read_docbins(nlp, str(tmp_path), "train")]
+    assert texts == [t for t, _ in TRAIN_DATA[:25]]
+
+
+def test_train_from_jsonl_with_early_stopping(tmp_path):
+    corpus = tmp_path / "train.jsonl"
+    with open(corpus, "w") as f:
+        for text, ann in TRAIN_DATA:
+            f.write(json.dumps({"text": text, "entities": ann["entities"]}) + "\n")
+    out = str(tmp_path / "model")
+    train_ner_model(out, n_iter=3, train_path=str(corpus), dev_path=str(corpus), patience=1)
+    assert os.path.exists(os.path.join(out + "_corpus", "train-0000.spacy"))
+    assert "INVOICE_NO" in spacy.load(out).get_pipe("ner").labels
+
+
+def test_fast_variant_drops_vectors_and_prunes_labels(tmp_path):
+    out = str(tmp_path / "fast_invoice")
+    train_ner_model(out, n_iter=1, variant="fast", doc_type="invoice")
+    nlp = spacy.load(out)
+    assert nlp.config["components"]["ner"]["model"]["tok2vec"]["width"] == 64
+    assert not os.path.exists(os.path.join(out, "vocab", "vectors"))
+    assert set(nlp.get_pipe("ner").labels) == {"INVOICE_NO", "DATE", "VENDOR",
+                                               "TOTAL_AMOUNT", "GST_AMOUNT"}
+
+
+def test_load_model_missing_variant():
+    import pytest
+    from api.ner_parser import load_model
+    with pytest.raises(FileNotFoundError, match="--variant nope"):
+        load_model("nope")
+
+
+def test_routing_prefers_doc_type_component(tmp_path, monkeypatch):
+    from api import ner_parser
+    monkeypatch.setattr(ner_parser, "MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(ner_parser, "_models", {})
+    train_ner_model(n_iter=1, variant="fast")
+    train_ner_model(n_iter=1, variant="fast", doc_type="id_card")
+
+    routed = ner_parser.load_routed_model("id_card", variant="fast")
+    assert set(routed.get_pipe("ner").labels) == set(ner_parser.DOC_TYPE_LABELS["id_card"])
+    # No invoice component trained → falls back to the all-label model
+    assert ner_parser.load_routed_model("invoice", variant="fast") is ner_parser.load_model("fast")
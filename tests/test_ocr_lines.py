@@ -0,0 +1,121 @@
+"""
+tests/test_ocr_lines.py — Struct-of-arrays OCR line container
+"""
+import pickle
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import numpy as np
+import pytest
+from api.ocr_lines import OCRLines
+from api.parsers import find_field_bbox
+from api.templates import ocr_layout
+
+
+def _box(x, y):
+    return [[x, y], [x + 100, y], [x + 100, y + 20], [x, y + 20]]
+
+
+def _page():
+    return OCRLines.from_lines(["Invoice No: INV/2025/0118", "Grand Total", "Rs. 88,983.50"],
+                               [_box(10, 10), _box(10, 50), _box(200, 50)], [0.99, 0.9, 0.8],
+                               size=(1200, 1600))
+
+
+def test_offsets_and_arrays():
+    lines = _page()
+    assert lines.text == "Invoice No: INV/2025/0118\nGrand Total\nRs. 88,983.50"
+    assert [lines.line(i) for i in range(len(lines))] == lines.lines()
+    assert lines.boxes.dtype == np.float32 and lines.boxes.shape == (3, 4, 2)
+    assert lines.confidence.dtype == np.float32
+    assert lines.to_dicts()[1] == {"text": "Grand Total", "confidence": float(np.float32(0.9)),
+                                   "bbox": [[10.0, 50.0], [110.0, 50.0], [110.0, 70.0], [10.0, 70.0]]}
+
+
+def test_find_and_field_bbox():
+    lines = _page()
+    assert lines.find("88,983.50") == 2
+    assert lines.find("total\nrs") == -1            # spans two lines
+    assert find_field_bbox("inv/2025/0118", lines) == _box(10, 10)
+    assert find_field_bbox("missing", lines) is None
+
+
+def test_concat_and_pickle():
+    a, b = _page(), OCRLines.from_lines(["Page two"], [_box(0, 0)], [0.7])
+    both = OCRLines.concat([a, OCRLines.empty(), b])
+    assert len(both) == 4 and both.line(3) == "Page two" and both.line(2) == "Rs. 88,983.50"
+    copy = pickle.loads(pickle.dumps(both))
+    assert copy.text == both.text and np.array_equal(copy.offsets, both.offsets)
+
+
+def test_ocr_layout_relative_coordinates():
+    layout = ocr_layout(_page())
+    text, x0, y0, x1, y1, key = layout[2]
+    assert text == "Rs. 88,983.50" and key == 2
+    assert (x0, y0, x1) == pytest.approx((200 / 1200, 50 / 1600, 300 / 1200))
+
+
+def test_postprocess_filters_dedups_and_clips():
+    from api.ocr_engine import postprocess
+    boxes  = np.array([_box(10, 10), _box(12, 11), _box(10, 300), _box(1150, 50)], dtype=np.float32)
+    texts  = ["TAX INVOICE", "TAX INVOICE", "TAX INVOICE", "faint"]
+    scores = np.array([0.8, 0.95, 0.9, 0.3], dtype=np.float32)
+    lines  = postprocess(boxes, texts, scores, (1200, 1600), threshold=0.5)
+    # The overlapping re-read keeps its better score; the same text lower down is a real line
+    assert lines.lines() == ["TAX INVOICE", "TAX INVOICE"]
+    assert lines.confidence.tolist() == pytest.approx([0.95, 0.9])
+    assert lines.boxes[:, :, 0].max() <= 1200
+
+
+def test_doc_type_threshold_refilters(monkeypatch):
+    from api import ocr_engine
+    monkeypatch.setitem(ocr_engine.CONF_THRESHOLDS, "id_card", 0.85)
+    result = ocr_engine.page_result(_page(), 0.0)
+    assert result["confidence_stats"]["min"] == pytest.approx(0.8)
+    ocr_engine.apply_doc_type_threshold(result, "id_card")
+    assert result["formatted_text"] == "Invoice No: INV/2025/0118\nGrand Total"
+    assert len(result["line_items"]) == 2
+
+
+def test_reocr_band_rereads_only_weak_lines(monkeypatch):
+    from api import ocr_engine
+    regions = []
+    crops   = []
+
+    def hires(x0, y0, x1, y1):
+        regions.append((x0, y0, x1, y1))
+        return np.full(((y1 - y0) * 2, (x1 - x0) * 2, 3), 255, np.uint8)
+
+    def recognize(batch):
+        crops.extend(batch)
+        return [("Grand Total", 0.97)]
+
+    monkeypatch.setattr(ocr_engine, "recognize", recognize)
+    boxes  = np.array([_box(10, 10), _box(10, 50), _box(200, 50)], dtype=np.float32)
+    texts  = ["Invoice", "Grand TotaI", "faint"]
+    scores = np.array([0.99, 0.6, 0.1], dtype=np.float32)
+    report = ocr_engine.reocr_band(boxes, texts, scores, (1200, 1600), hires)
+
+    assert report == {"lines": 1, "improved": 1}
+    assert regions == [(10, 50, 110, 70)] and crops[0].shape[:2] == (40, 200)
+    assert texts[1] == "Grand Total" and scores[1] == pytest.approx(0.97)
+
+
+def test_reocr_band_renders_one_region_per_page(monkeypatch, tmp_path):
+    import fitz
+    from api import api, ocr_engine
+    monkeypatch.setattr(ocr_engine, "recognize", lambda batch: [("x", 0.1)] * len(batch))
+    scan = np.full((1100, 850, 3), 255, np.uint8)
+    doc  = fitz.open()
+    doc.new_page().insert_image(fitz.Rect(0, 0, 595, 842), stream=fitz.Pixmap(
+        fitz.csRGB, 850, 1100, scan.tobytes(), False).tobytes())
+    page    = doc[0]
+    renders = []
+    real    = fitz.Page.get_pixmap
+    monkeypatch.setattr(fitz.Page, "get_pixmap", lambda self, **kw: renders.append(kw) or real(self, **kw))
+
+    boxes  = np.array([_box(40, 60 + 30 * i) for i in range(ocr_engine.REOCR_MAX)], dtype=np.float32)
+    scores = np.full(len(boxes), 0.5, dtype=np.float32)
+    report = ocr_engine.reocr_band(boxes, ["x"] * len(boxes), scores, (1200, 1698),
+                                   api.page_region(page))
+    assert report["lines"] == ocr_engine.REOCR_MAX and len(renders) == 1
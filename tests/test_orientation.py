@@ -0,0 +1,65 @@
+"""
+tests/test_orientation.py — Orientation pre-pass on synthetic and real sample pages
+"""
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import cv2
+import fitz
+import numpy as np
+import pytest
+from PIL import Image
+
+from api import orientation
+
+SAMPLES = os.path.join(os.path.dirname(os.path.dirname(__file__)), "sample datas")
+UPRIGHT = ["sample_invoice.pdf", "sample_invoice_2.pdf", "sample_purchase_order.pdf",
+           "sample_id_card.pdf", "sample_resume.pdf"]
+
+
+def _scan(name: str, turn: int = 0):
+    """Image-only copy of a sample PDF's first page, content turned clockwise by turn."""
+    pix = fitz.open(os.path.join(SAMPLES, name))[0].get_pixmap(dpi=150)
+    return Image.frombytes("RGB", (pix.width, pix.height), pix.samples).rotate(-turn, expand=True)
+
+
+def test_orientation_turns_sideways_and_upside_down_pages():
+    from api.orientation import image_angle
+    words = "Invoice Total Amount Rs. 1,234.50 Apex Traders GSTIN Date Qty Rate Bill To".split()
+    rng   = np.random.default_rng(0)
+    gray  = np.full((1600, 1200), 255, np.uint8)
+    for i in range(28):                             # left-aligned, ragged right
+        line = " ".join(rng.choice(words, rng.integers(2, 7)))
+        cv2.putText(gray, line, (70, 90 + i * 50), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2)
+    # content turned clockwise by 90 * k needs the rest of the full turn
+    assert [image_angle(np.ascontiguousarray(np.rot90(gray, -k))) for k in range(4)] == [0, 270, 180, 90]
+
+
+def test_orientation_from_native_text_and_rotate():
+    from api.orientation import text_angle
+    doc  = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 400), "Purchase Order PO-2025-0042 Apex Traders", rotate=90)
+    assert text_angle(page) == 90               # runs bottom → top: turn clockwise
+    page.set_rotation(90)
+    assert text_angle(page) == 0                # /Rotate already turns it upright
+
+
+@pytest.mark.parametrize("name", UPRIGHT)
+def test_upright_sample_scans_are_left_alone(name, tmp_path):
+    # Right-aligned amount columns and totals must not read as an upside-down page
+    png = tmp_path / "scan.png"
+    _scan(name).save(png)
+    doc = fitz.open()
+    doc.new_page().insert_image(fitz.Rect(0, 0, 595, 842), filename=str(png))
+    assert orientation.page_angle(doc[0]) == (0, "image")
+
+    img = Image.open(png).convert("RGB")
+    assert orientation.upright(img) is img
+
+
+@pytest.mark.parametrize("name", ["sample_invoice.pdf", "sample_purchase_order.pdf"])
+def test_turned_sample_scans_come_back_upright(name):
+    for turn, angle in ((90, 270), (180, 180), (270, 90)):
+        gray = np.asarray(_scan(name, turn).convert("L"))
+        assert orientation.image_angle(gray) == angle, turn
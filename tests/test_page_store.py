@@ -0,0 +1,106 @@
+"""
+tests/test_page_store.py — Page fingerprints and incremental re-extraction
+"""
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import fitz
+import pytest
+
+from api import api, metrics, page_store
+
+PAGES = [
+    "TAX INVOICE\nInvoice No: INV/2025/0118\nInvoice Date: 05 Feb 2025\nGrand Total: Rs. 88,983.50",
+    "PURCHASE ORDER\nPO Number: PO-2025-0088\nDelivery Date: 05 Mar 2025\nPayment Terms: 30 Days",
+    "Terms and conditions\nGoods once sold will not be taken back\nSubject to Chennai jurisdiction",
+]
+
+
+def _po(path, texts=PAGES):
+    doc = fitz.open()
+    for text in texts:
+        doc.new_page().insert_text((72, 72), text, fontsize=11)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    s = page_store.PageStore(str(tmp_path / "pages.sqlite"), enabled=True)
+    monkeypatch.setattr(page_store, "store", s)
+    return s
+
+
+def test_fingerprint_follows_content_not_object_numbers(tmp_path):
+    a = fitz.open(_po(tmp_path / "a.pdf"))
+    b = fitz.open(_po(tmp_path / "b.pdf", PAGES[::-1]))
+    a.save(str(tmp_path / "resaved.pdf"), garbage=4, deflate=True)    # renumbers every object
+    resaved = fitz.open(str(tmp_path / "resaved.pdf"))
+
+    prints = [page_store.fingerprint(p) for p in a]
+    assert len(set(prints)) == 3
+    assert [page_store.fingerprint(p) for p in resaved] == prints
+    assert [page_store.fingerprint(p) for p in b] == prints[::-1]
+
+    a[1].insert_image(fitz.Rect(300, 300, 340, 340), stream=a[0].get_pixmap(dpi=10).tobytes())
+    assert page_store.fingerprint(a[1]) != prints[1]
+    a[2].set_rotation(90)
+    assert page_store.fingerprint(a[2]) != prints[2]
+
+
+def test_only_changed_pages_are_extracted_again(store, tmp_path):
+    first, _, _ = api.extract_pdf_pages(_po(tmp_path / "v1.pdf"), strategy="regex_first")
+    assert len(store) == 3
+
+    hits   = metrics.PAGE_STORE_HITS.get("hit")
+    update = PAGES[:1] + [PAGES[1].replace("0088", "0089")] + PAGES[2:]
+    second, _, _ = api.extract_pdf_pages(_po(tmp_path / "v2.pdf", update), strategy="regex_first")
+    assert metrics.PAGE_STORE_HITS.get("hit") == hits + 2 and len(store) == 4
+    assert second[0] == first[0] and second[2] == first[2]
+    assert "PO-2025-0089" in second[1]["text"]
+
+    # A stored page lands at its new position; another strategy is a separate entry
+    moved, _, _ = api.extract_pdf_pages(_po(tmp_path / "v3.pdf", PAGES[2:]), strategy="regex_first")
+    assert moved[0]["page"] == 1 and moved[0]["text"] == first[2]["text"]
+    api.extract_pdf_pages(_po(tmp_path / "v3.pdf", PAGES[2:]), strategy="ner_missing")
+    assert len(store) == 5
+
+
+def test_store_is_bounded_across_workers(tmp_path):
+    # Two processes' stores on one file — the size check sees both workers' rows
+    a, b = (page_store.PageStore(str(tmp_path / "pages.sqlite"), max_pages=10, enabled=True)
+            for _ in range(2))
+    for i in range(300):
+        (a if i % 2 else b).put(f"page-{i}", "scope", {"page": 1}, 1.0)
+    assert len(a) <= 10 and a.get("page-299", "scope") == ({"page": 1}, 1.0)
+    assert b.get("page-0", "scope") is None
+    a.clear()
+    assert len(b) == 0
+
+
+def test_scope_covers_ocr_settings_and_schema(monkeypatch):
+    from api import imaging, native, ocr_engine
+    base = page_store.scope("regex_first")
+    assert page_store.scope("ner_first") != base
+    monkeypatch.setitem(ocr_engine.CONF_THRESHOLDS, "invoice", 0.7)
+    assert page_store.scope("regex_first") != base
+    monkeypatch.undo()
+    for module, name, value in ((imaging, "OCR_WIDTH", 1600), (ocr_engine, "REOCR_SCALE", 3.0),
+                                (native, "SCANNED_THRESHOLD", 10), (page_store, "SCHEMA_VERSION", 99)):
+        monkeypatch.setattr(module, name, value)
+        assert page_store.scope("regex_first") != base, name
+        monkeypatch.undo()
+    assert page_store.scope("regex_first") == base
+
+
+def test_evicted_template_clears_stored_pages(store, tmp_path):
+    from api import templates
+    t   = templates.TemplateStore(str(tmp_path / "templates.sqlite"))
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "APEX TRADERS\nInvoice No: INV/1\nBill To:\nGrand Total:")
+    learned = t.learn(templates.native_layout(doc[0]), "invoice", {"invoice_number": "INV/1"})
+    store.put("page", "scope", {"page": 1, "template_id": learned["id"]}, 1.0)
+    assert t.evict() == 0 and len(store) == 1     # nothing dropped, nothing cleared
+    t.ttl = -1
+    assert t.evict() == 1 and len(store) == 0
@@ -0,0 +1,56 @@
+"""
+tests/test_preprocess.py — Deskew / denoise / binarize gating
+"""
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import cv2
+import numpy as np
+import pytest
+
+from api import preprocess
+from api.ocr_lines import OCRLines
+
+
+def _page():
+    img = np.full((1600, 1200, 3), 255, np.uint8)
+    for i in range(30):
+        cv2.putText(img, f"Invoice line {i}  Rs. 1,234.50 total", (60, 80 + i * 48),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 2)
+    return img
+
+
+def test_clean_page_needs_nothing():
+    assert preprocess.plan(preprocess.image_stats(_page())) == []
+
+
+def test_stats_flag_skew_noise_and_faded_print():
+    m       = cv2.getRotationMatrix2D((600, 800), 4, 1.0)
+    skewed  = cv2.warpAffine(_page(), m, (1200, 1600), borderValue=(255, 255, 255))
+    stats   = preprocess.image_stats(skewed)
+    assert preprocess.plan(stats) == ["deskew"] and stats["skew"] == pytest.approx(-4, abs=0.3)
+    assert abs(preprocess.image_stats(preprocess.apply(skewed, ["deskew"], stats))["skew"]) < 0.3
+
+    noise = np.random.default_rng(0).normal(0, 20, (1600, 1200, 1))
+    noisy = np.clip(_page() + noise, 0, 255).astype(np.uint8)
+    assert preprocess.plan(preprocess.image_stats(noisy)) == ["denoise"]
+
+    faded = (_page() * 0.3 + 150).astype(np.uint8)
+    stats = preprocess.image_stats(faded)
+    assert preprocess.plan(stats) == ["binarize"]
+    assert preprocess.apply(faded, ["binarize"], stats).shape == faded.shape
+
+
+def test_second_look_keeps_the_better_reading(monkeypatch):
+    from api import ocr_engine
+    box   = [[0, 0], [100, 0], [100, 20], [0, 20]]
+    first = OCRLines.from_lines(["Inv0ice"], [box], [0.55], (1200, 1600))
+    retry = OCRLines.from_lines(["Invoice", "Total"], [box, box], [0.9, 0.8], (1200, 1600))
+    monkeypatch.setattr(ocr_engine, "ocr_lines", lambda arr: retry)
+
+    faded = (_page() * 0.3 + 150).astype(np.uint8)
+    lines, report = ocr_engine.second_look(faded, first)
+    assert lines is retry and report["kept"] and report["steps"] == ["binarize"]
+    assert report["confidence_gain"] == pytest.approx(0.3, abs=1e-3) and report["lines_gain"] == 1
+
+    assert ocr_engine.second_look(_page(), first) == (first, None)   # clean: no second pass
@@ -0,0 +1,161 @@
+"""
+tests/test_templates.py — Vendor layout templates
+"""
+import json
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import fitz
+import pytest
+from fastapi.testclient import TestClient
+
+from api import metrics, templates
+from api.api import app
+
+client = TestClient(app)
+
+
+def _vendor_pdf(invoice_no: str, total: str, date: str = "05 Feb 2025",
+                customer: str = "Nova Systems Pvt Ltd.", items=("Cotton Fabric - White",)) -> bytes:
+    doc  = fitz.open()
+    page = doc.new_page()
+    for y, text in ((60, "APEX TRADERS PVT LTD"), (80, "Industrial Estate, Coimbatore"),
+                    (120, "TAX INVOICE"), (160, f"Invoice No: {invoice_no}"),
+                    (180, f"Invoice Date: {date}"), (220, "Bill To:"), (240, customer),
+                    (255, "Anna Salai, Chennai"),
+                    *((300 + 15 * i, item) for i, item in enumerate(items)),
+                    (400, f"Grand Total: Rs. {total}"), (440, "Thank you for your business")):
+        page.insert_text((72, y), text)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    s = templates.TemplateStore(str(tmp_path / "templates.sqlite"))
+    monkeypatch.setattr(templates, "store", s)
+    return s
+
+
+def test_learn_then_extract_skips_classify_and_ner(store):
+    learned = client.post(
+        "/templates/learn",
+        files={"file": ("apex.pdf", _vendor_pdf("INV/2025/0118", "88,983.50"), "application/pdf")},
+        data={"doc_type": "invoice", "vendor": "Apex Traders",
+              "fields": json.dumps({"invoice_number": "INV/2025/0118", "total_amount": "88,983.50"})},
+    ).json()
+    assert learned["status"] == "success" and learned["anchors"] >= 3
+
+    body = client.post(
+        "/extract?timings=true",
+        files={"file": ("apex2.pdf", _vendor_pdf("INV/2025/0242", "1,204,310.00"), "application/pdf")},
+    ).json()
+    page = body["pages"][0]
+    assert page["template_id"] == learned["id"]
+    assert page["fields"]["invoice_number"] == "INV/2025/0242"
+    assert page["fields"]["total_amount"] == "1,204,310.00"
+    assert page["field_sources"]["invoice_number"] == "template"
+    assert page["field_sources"]["date"] == "regex"
+    assert "classify" not in body["meta"]["timings"] and "ner" not in body["meta"]["timings"]
+    assert store.list()[0]["hits"] == 1
+
+
+def test_learn_rejects_unknown_doc_types_and_fields(store):
+    def learn(doc_type, fields):
+        return client.post("/templates/learn",
+                           files={"file": ("apex.pdf", _vendor_pdf("INV/1", "100.00"), "application/pdf")},
+                           data={"doc_type": doc_type, "fields": json.dumps(fields)})
+
+    typo = learn("invoice", {"invoice_no": "INV/1", "total_amount": "100.00"})
+    assert typo.status_code == 400 and "invoice_no" in typo.json()["error"]
+    assert learn("invoce", {"invoice_number": "INV/1"}).status_code == 400
+    assert "error" in store.learn([], "invoice", {"invoice_no": "INV/1"})
+    assert store.list() == []
+
+
+def test_templates_learned_by_another_worker_are_picked_up(store):
+    doc   = fitz.open(stream=_vendor_pdf("INV/1", "100.00"), filetype="pdf")
+    other = templates.TemplateStore(store.path)          # another process on the same file
+    assert not store.active()
+    learned = other.learn(templates.native_layout(doc[0]), "invoice", {"invoice_number": "INV/1"})
+    hit = store.apply(templates.native_layout(doc[0]))
+    assert hit and hit[0].id == learned["id"]
+
+    other.delete(learned["id"])
+    assert store.apply(templates.native_layout(doc[0])) is None and store.list() == []
+
+
+def test_same_vendor_other_customer_and_items_still_matches(store):
+    doc = fitz.open(stream=_vendor_pdf("INV/1", "100.00"), filetype="pdf")
+    store.learn(templates.native_layout(doc[0]), "invoice", {"invoice_number": "INV/1"})
+    anchors = {a[0] for a in store._templates[store.list()[0]["id"]].anchors}
+    assert {"apex traders pvt ltd", "bill to:", "grand total:"} <= anchors
+    assert not {"nova systems pvt ltd.", "anna salai, chennai", "cotton fabric - white"} & anchors
+
+    other = fitz.open(stream=_vendor_pdf("INV/2", "9,100.00", customer="Priya Textiles Ltd.",
+                                         items=("Silk Lining - Maroon", "Denim Roll - Indigo")),
+                      filetype="pdf")
+    hit = store.apply(templates.native_layout(other[0]))
+    assert hit and hit[1]["invoice_number"] == "INV/2"
+
+
+def test_hits_are_written_back_in_batches(store):
+    doc = fitz.open(stream=_vendor_pdf("INV/1", "100.00"), filetype="pdf")
+    store.learn(templates.native_layout(doc[0]), "invoice", {"invoice_number": "INV/1"})
+    layout = templates.native_layout(doc[0])
+    for _ in range(3):
+        store.apply(layout)
+    assert store.list()[0]["hits"] == 3
+    assert templates.TemplateStore(store.path).list()[0]["hits"] == 0     # not written yet
+    store.flush()
+    assert templates.TemplateStore(store.path).list()[0]["hits"] == 3
+
+
+def test_other_layout_misses(store):
+    doc   = fitz.open(stream=_vendor_pdf("INV/1", "100.00"), filetype="pdf")
+    store.learn(templates.native_layout(doc[0]), "invoice", {"invoice_number": "INV/1"})
+    other = fitz.open()
+    page  = other.new_page()
+    page.insert_text((72, 300), "Purchase Order\nPO Number: PO-2025-0088\nVendor:\nNova Systems")
+    misses = metrics.TEMPLATE_LOOKUPS.get("miss")
+    assert store.apply(templates.native_layout(page)) is None
+    assert metrics.TEMPLATE_LOOKUPS.get("miss") == misses + 1
+
+
+def test_stale_templates_evicted(store):
+    doc = fitz.open(stream=_vendor_pdf("INV/1", "100.00"), filetype="pdf")
+    store.learn(templates.native_layout(doc[0]), "invoice", {"invoice_number": "INV/1"})
+    store.ttl = -1
+    assert store.evict() == 1
+    assert store.list() == []
+
+
+def test_learn_from_sideways_scan_reads_it_upright(store, tmp_path, monkeypatch):
+    from api import api
+    from api.ocr_engine import page_result
+    from api.ocr_lines import OCRLines
+
+    doc  = fitz.open()
+    page = doc.new_page(width=842, height=595)                  # landscape scan, no native text
+    scan = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 84, 60), 0)
+    scan.clear_with(255)
+    page.insert_image(page.rect, pixmap=scan)
+    path = str(tmp_path / "scan.pdf")
+    doc.save(path)
+
+    seen = {}
+
+    def ocr(image, hires=None):
+        seen["shape"], seen["hires"] = image.shape, hires
+        texts = ["APEX TRADERS PVT LTD", "Invoice No: INV/1", "Bill To:", "Grand Total: Rs. 100.00"]
+        boxes = [[[50, 40 + 60 * i], [500, 40 + 60 * i], [500, 70 + 60 * i], [50, 70 + 60 * i]]
+                 for i in range(len(texts))]
+        return page_result(OCRLines.from_lines(texts, boxes, [0.99] * 4, size=image.shape[1::-1]), 0.0)
+
+    monkeypatch.setattr(api.orientation, "page_angle", lambda page, textpage=None: (90, "image"))
+    monkeypatch.setattr(api, "extract_single_page", ocr)
+    learned = api.learn_template(path, ".pdf", "invoice", {"invoice_number": "INV/1"})
+    assert learned["status"] == "success"
+    h, w = seen["shape"][:2]
+    assert h > w and seen["hires"] is not None                   # rendered turned upright
@@ -0,0 +1,128 @@
+"""
+tests/test_word.py — Streaming DOCX reader
+"""
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import io, zipfile
+
+import pytest
+
+from api.word import iter_docx, media_images, read_docx
+
+_NS = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+
+def _p(text):
+    return f"<w:p><w:r><w:t xml:space=\"preserve\">{text}</w:t></w:r></w:p>"
+
+
+def _row(*cells):
+    return "<w:tr>" + "".join(f"<w:tc>{_p(c) if c else '<w:p/>'}</w:tc>" for c in cells) + "</w:tr>"
+
+
+def _docx(tmp_path, body: str) -> str:
+    path = str(tmp_path / "doc.docx")
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("word/document.xml", f"<w:document {_NS}><w:body>{body}</w:body></w:document>")
+    return path
+
+
+def test_paragraphs_and_rows_in_reading_order(tmp_path):
+    path = _docx(tmp_path,
+        _p("TAX INVOICE") + _p("Invoice No: INV/2025/0118")
+        + "<w:tbl>" + _row("Description", "Qty", "Amount") + _row("Steel rods", "4", "12,400.00")
+        + _row("Bolts", "", "800.00") + "</w:tbl>"
+        + "<w:p><w:r><w:t>Grand</w:t><w:tab/><w:t>Total: Rs. 13,200.00</w:t>"
+          "<w:delText>old</w:delText></w:r></w:p>")
+    text, items = read_docx(path)
+    assert text.split("\n") == ["TAX INVOICE", "Invoice No: INV/2025/0118",
+                                "Description | Qty | Amount", "Steel rods | 4 | 12,400.00",
+                                "Bolts | 800.00", "Grand Total: Rs. 13,200.00"]
+    assert items == [{"Description": "Steel rods", "Qty": "4", "Amount": "12,400.00"},
+                     {"Description": "Bolts", "Amount": "800.00"}]
+
+
+def test_layout_tables_give_no_items(tmp_path):
+    path = _docx(tmp_path,
+        "<w:tbl>" + _row("Invoice No:", "INV/2025/0118") + _row("Bill To:", "Apex Traders")
+        + _row("Amount Due:", "Rs. 13,200.00") + "</w:tbl>"
+        + "<w:tbl>" + _row("Apex Traders Pvt Ltd", "Nova Systems") + _row("Coimbatore", "Chennai")
+        + "</w:tbl>"
+        + "<w:tbl>" + _row("S.No", "Item", "Qty", "Amount") + _row("1", "Steel rods", "4", "12,400.00")
+        + "</w:tbl>")
+    text, items = read_docx(path)
+    assert "Bill To: | Apex Traders" in text.split("\n")
+    assert items == [{"S.No": "1", "Item": "Steel rods", "Qty": "4", "Amount": "12,400.00"}]
+
+
+def test_nested_table_flattens_into_cell(tmp_path):
+    inner = "<w:tbl>" + _row("a", "b") + "</w:tbl>"
+    path  = _docx(tmp_path, "<w:tbl><w:tr><w:tc>" + _p("Terms") + inner + "</w:tc>"
+                            "<w:tc>" + _p("x") + "</w:tc></w:tr></w:tbl>" + _p("After"))
+    assert list(iter_docx(path)) == [("table", None), ("row", ["Terms a b", "x"]), ("p", "After")]
+
+
+def test_container_detection_and_legacy_doc(tmp_path, monkeypatch):
+    from api import word
+    docx = _docx(tmp_path, _p("Hello"))
+    ole  = tmp_path / "old.doc"
+    ole.write_bytes(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1" + b"\x00" * 504)
+    rtf  = tmp_path / "memo.doc"
+    rtf.write_bytes(b"{\\rtf1\\ansi Hello}")
+    junk = tmp_path / "fake.docx"
+    junk.write_bytes(b"hello")
+    assert [word.container(p) for p in (docx, str(ole), str(rtf), str(junk))] == ["docx", "doc", "rtf", None]
+
+    monkeypatch.setattr(word.shutil, "which", lambda name: None)
+    with pytest.raises(ValueError, match="antiword"):
+        word.open_word(str(ole), str(tmp_path))
+    with pytest.raises(ValueError, match="Not a Word document"):
+        word.open_word(str(junk), str(tmp_path))
+
+
+def test_media_images_skip_logos(tmp_path):
+    from PIL import Image
+    path = _docx(tmp_path, _p("See attached scan"))
+    scan, logo = io.BytesIO(), io.BytesIO()
+    Image.new("RGB", (1700, 2200), "white").save(scan, "PNG")
+    Image.new("RGB", (120, 60), "navy").save(logo, "PNG")
+    with zipfile.ZipFile(path, "a") as zf:
+        zf.writestr("word/media/image1.png", logo.getvalue())
+        zf.writestr("word/media/image2.png", scan.getvalue())
+        zf.writestr("word/media/image3.emf", b"\x01\x00\x00\x00")
+        zf.writestr("word/media/image4.png", scan.getvalue()[:200])        # truncated upload
+    skipped = []
+    got = list(media_images(path, skipped))
+    assert [name for name, _ in got] == ["image2.png"] and got[0][1].shape[1] == 1200
+    assert [s["name"] for s in skipped] == ["image4.png"] and "unreadable" in skipped[0]["error"]
+
+
+def test_failed_antiword_falls_back_to_libreoffice(tmp_path, monkeypatch):
+    import subprocess
+    from api import word
+    ole = tmp_path / "old.doc"
+    ole.write_bytes(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1" + b"\x00" * 504)
+    out = tmp_path / "out"
+    out.mkdir()
+
+    def run(cmd, **kw):
+        if cmd[0] == "antiword":
+            return subprocess.CompletedProcess(cmd, 1, b"", b"old.doc is not a Word Document.")
+        (out / "old.docx").write_bytes(b"PK")
+        return subprocess.CompletedProcess(cmd, 0, b"", b"")
+
+    monkeypatch.setattr(word.subprocess, "run", run)
+    monkeypatch.setattr(word.shutil, "which", lambda name: name)
+    assert word.open_word(str(ole), str(out)) == (str(out / "old.docx"), None)
+
+    monkeypatch.setattr(word.shutil, "which", lambda name: name if name == "antiword" else None)
+    with pytest.raises(ValueError, match="not a Word Document"):
+        word.open_word(str(ole), str(out))
+
+
+def test_unreadable_word_upload_is_an_error():
+    from fastapi.testclient import TestClient
+    from api.api import app
+    body = TestClient(app).post("/extract", files={"file": ("contract.docx", b"not a zip")}).json()
+    assert "Not a Word document" in body["error"]